@@ -7,7 +7,6 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.utils.timezone import now
-from datetime import timedelta
 from django.db import connection
 from django.views.decorators.csrf import csrf_exempt
 from .models import User
@@ -147,14 +146,10 @@ def user_profile_api(request):
     try:
         user = request.user
         current_time = now()
-        months_in_days = 30 * user.check_in_interval_months
-        next_check_in_due = user.last_check_in + timedelta(days=months_in_days)
+        next_check_in_due = user.next_check_in_due
         is_overdue = current_time > next_check_in_due
-        in_grace_period = False
-        grace_period_end = None
-        if user.notification_sent_at:
-            grace_period_end = user.notification_sent_at + timedelta(days=user.grace_period_days)
-            in_grace_period = current_time < grace_period_end
+        grace_period_end = user.grace_deadline
+        in_grace_period = grace_period_end is not None and current_time < grace_period_end
         return Response({
             'user': {
                 'id': user.id,
@@ -187,13 +182,9 @@ def dashboard_stats_api(request):
     try:
         user = request.user
         current_time = now()
-        months_in_days = 30 * user.check_in_interval_months
-        next_check_in_due = user.last_check_in + timedelta(days=months_in_days)
+        next_check_in_due = user.next_check_in_due
         is_overdue = current_time > next_check_in_due
-        in_grace_period = False
-        if user.notification_sent_at:
-            grace_period_end = user.notification_sent_at + timedelta(days=user.grace_period_days)
-            in_grace_period = current_time < grace_period_end
+        in_grace_period = user.grace_deadline is not None and current_time < user.grace_deadline
         try:
             from legacy.models import LegacyMessage
             scheduled_messages = LegacyMessage.objects.filter(user=user, status='scheduled').count()
@@ -279,6 +270,11 @@ def system_status_api(request):
                     queue_info['queued_jobs'] = total_active
         except Exception as e:
             pass
+        try:
+            from .sweeps import sweep_progress
+            inactivity_sweep = sweep_progress()
+        except Exception:
+            inactivity_sweep = None
         health_score = 100
         if not db_connected:
             health_score -= 50
@@ -313,6 +309,7 @@ def system_status_api(request):
                     'status': 'active' if celery_workers > 0 else 'inactive'
                 }
             },
+            'inactivity_sweep': inactivity_sweep,
             'timestamp': now().isoformat()
         }, status=status.HTTP_200_OK)
     except Exception as e:
@@ -375,14 +372,10 @@ def job_status_api(request, job_id):
 def api_check_in_status(request):
     user = request.user
     current_time = now()
-    months_in_days = 30 * getattr(user, 'check_in_interval_months', 6)
-    next_check_in_due = user.last_check_in + timedelta(days=months_in_days)
-    is_overdue = current_time > next_check_in_due
-    in_grace_period = False
-    grace_period_end = None
-    if user.notification_sent_at:
-        grace_period_end = user.notification_sent_at + timedelta(days=getattr(user, 'grace_period_days', 10))
-        in_grace_period = current_time < grace_period_end
+    next_check_in_due = user.next_check_in_due
+    is_overdue = next_check_in_due is not None and current_time > next_check_in_due
+    grace_period_end = user.grace_deadline
+    in_grace_period = grace_period_end is not None and current_time < grace_period_end
     return Response({
         'last_check_in': user.last_check_in.isoformat() if user.last_check_in else None,
         'next_check_in_due': next_check_in_due.isoformat() if next_check_in_due else None,
@@ -401,11 +394,10 @@ def api_check_in(request):
     user = request.user
     user.last_check_in = now()
     user.notification_sent_at = None
-    user.save()
-    months_in_days = 30 * getattr(user, 'check_in_interval_months', 6)
+    user.save()  # Recomputes next_check_in_due and clears grace_deadline
     return Response({
         'success': True,
         'message': 'Check-in successful! Your timer has been reset.',
         'last_check_in': user.last_check_in.isoformat(),
-        'next_check_in_due': (now() + timedelta(days=months_in_days)).isoformat()
+        'next_check_in_due': user.next_check_in_due.isoformat()
     })
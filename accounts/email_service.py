@@ -1,14 +1,13 @@
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
+from django.core.mail import EmailMultiAlternatives
 from django.conf import settings
-from django.utils.html import strip_tags
+from afteryou.email_templates import renderer
 
 class DeadMansSwitchEmailService:
     """Service for sending dead man's switch related emails"""
     
     @staticmethod
-    def send_check_in_reminder(user):
-        """Send reminder email to user to check in"""
+    def build_check_in_reminder(user, connection=None):
+        """Render the check-in reminder for a user without sending it"""
         subject = f"AfterYou - Check-in Reminder for {user.first_name or user.username}"
         
         context = {
@@ -17,19 +16,55 @@ class DeadMansSwitchEmailService:
             'grace_period_days': user.grace_period_days,
         }
         
-        # Render HTML email
-        html_message = render_to_string('emails/check_in_reminder.html', context)
-        plain_message = strip_tags(html_message)
+        # Render HTML and plain-text parts from cached templates
+        html_message, plain_message = renderer.render_email(
+            'emails/check_in_reminder.html', 'emails/check_in_reminder.txt', context
+        )
+        return DeadMansSwitchEmailService._build_email(user, subject, html_message, plain_message, connection)
+    
+    @staticmethod
+    def build_final_warning(user, message_count=None, connection=None):
+        """
+        Render the final warning for a user without sending it
+        
+        Args:
+            message_count: Number of scheduled legacy messages; counted if not given
+        """
+        subject = f"AfterYou - FINAL WARNING: Legacy Messages Will Be Delivered Soon"
+        
+        if message_count is None:
+            from legacy.models import LegacyMessage
+            message_count = LegacyMessage.objects.filter(user_id=str(user.id), status='scheduled').count()
         
+        context = {
+            'user': user,
+            'check_in_url': f"{settings.FRONTEND_URL}/dashboard",
+            'message_count': message_count,
+        }
+        
+        # Render HTML and plain-text parts from cached templates
+        html_message, plain_message = renderer.render_email(
+            'emails/final_warning.html', 'emails/final_warning.txt', context
+        )
+        return DeadMansSwitchEmailService._build_email(user, subject, html_message, plain_message, connection)
+    
+    @staticmethod
+    def _build_email(user, subject, html_message, plain_message, connection=None):
+        email = EmailMultiAlternatives(
+            subject=subject,
+            body=plain_message,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[user.email],
+            connection=connection,
+        )
+        email.attach_alternative(html_message, 'text/html')
+        return email
+    
+    @staticmethod
+    def send_check_in_reminder(user):
+        """Send reminder email to user to check in"""
         try:
-            send_mail(
-                subject=subject,
-                message=plain_message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[user.email],
-                html_message=html_message,
-                fail_silently=False,
-            )
+            DeadMansSwitchEmailService.build_check_in_reminder(user).send(fail_silently=False)
             return True
         except Exception as e:
             print(f"Failed to send check-in reminder to {user.email}: {str(e)}")
@@ -38,27 +73,8 @@ class DeadMansSwitchEmailService:
     @staticmethod
     def send_final_warning(user):
         """Send final warning before message delivery begins"""
-        subject = f"AfterYou - FINAL WARNING: Legacy Messages Will Be Delivered Soon"
-        
-        context = {
-            'user': user,
-            'check_in_url': f"{settings.FRONTEND_URL}/dashboard",
-            'message_count': user.legacymessage_set.filter(status='scheduled').count(),
-        }
-        
-        # Render HTML email
-        html_message = render_to_string('emails/final_warning.html', context)
-        plain_message = strip_tags(html_message)
-        
         try:
-            send_mail(
-                subject=subject,
-                message=plain_message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[user.email],
-                html_message=html_message,
-                fail_silently=False,
-            )
+            DeadMansSwitchEmailService.build_final_warning(user).send(fail_silently=False)
             return True
         except Exception as e:
             print(f"Failed to send final warning to {user.email}: {str(e)}")
@@ -0,0 +1,285 @@
+"""
+Dead man's switch evaluation, shared by trigger_inactive_users and the
+QStash process_inactive_users, send_check_in_reminders and
+send_final_warnings tasks.
+Each stage is one query over the whole cohort, range-scanning the indexed
+next_check_in_due and grace_deadline columns instead of looping over users.
+"""
+import logging
+from datetime import timedelta
+from django.db.models import DateTimeField, DurationField, ExpressionWrapper, F, Value
+from django.utils.timezone import now
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 5000  # Users evaluated per chunk of the QStash tasks
+FETCH_SIZE = 500  # Users loaded per round trip when triggering deliveries
+
+GRACE_PERIOD = ExpressionWrapper(F('grace_period_days') * Value(timedelta(days=1)), output_field=DurationField())
+
+
+def overdue_users(current_time, users=None):
+    """Users whose check-in interval has run out"""
+    users = User.objects.all() if users is None else users
+    return users.filter(next_check_in_due__lt=current_time)
+
+
+def users_to_notify(current_time, users=None):
+    """Overdue users who have not been sent the inactivity notification yet"""
+    return overdue_users(current_time, users).filter(notification_sent_at__isnull=True)
+
+
+def grace_expired_users(current_time, users=None):
+    """Overdue, notified users whose grace period has run out"""
+    return overdue_users(current_time, users).filter(grace_deadline__lte=current_time)
+
+
+def stamp_notifications(current_time, users=None):
+    """
+    Mark every overdue, unnotified user as notified with one UPDATE
+
+    The UPDATE only touches rows whose notification_sent_at is still NULL,
+    so repeating it (or racing another run) never stamps anyone twice. The
+    stamped cohort is exactly the users whose notification_sent_at equals
+    ``current_time``. grace_deadline is set in the same statement.
+
+    Returns:
+        QuerySet: The users stamped by this call
+    """
+    users = User.objects.all() if users is None else users
+    stamped = users_to_notify(current_time, users).update(
+        notification_sent_at=current_time,
+        grace_deadline=Value(current_time, output_field=DateTimeField()) + GRACE_PERIOD
+    )
+    if stamped:
+        logger.info(f"Stamped inactivity notification for {stamped} users")
+    return users.filter(notification_sent_at=current_time)
+
+
+def send_reminders(stamped, current_time):
+    """
+    Email the check-in reminder to a cohort stamped at ``current_time``
+
+    Users whose reminder could not be sent are unstamped in bulk, so their
+    grace period does not run without them being told and the next run
+    tries again.
+
+    Returns:
+        tuple: (number sent, number failed)
+    """
+    from .reminder_campaign import ReminderCampaign
+
+    def record(sent_ids, failed_ids):
+        if failed_ids:
+            User.objects.filter(pk__in=failed_ids, notification_sent_at=current_time).update(
+                notification_sent_at=None, grace_deadline=None
+            )
+
+    results = ReminderCampaign('check_in_reminder').send(stamped, record=record)
+    return results['sent'], results['failed']
+
+
+def users_due_final_warning(current_time, users=None):
+    """Users in their grace period, close to its end, who have not had the final warning"""
+    from .reminder_campaign import campaign_setting
+
+    warn_before = current_time + timedelta(days=campaign_setting('FINAL_WARNING_DAYS'))
+    return overdue_users(current_time, users).filter(
+        grace_deadline__gt=current_time,
+        grace_deadline__lte=warn_before,
+        final_warning_sent_at__isnull=True
+    )
+
+
+def send_final_warnings_to(current_time=None, users=None):
+    """
+    Stamp and email the final warning for every user due one
+
+    Like notifications, the cohort is claimed with one conditional UPDATE
+    before anything is sent, and failures are unstamped in bulk afterwards.
+
+    Returns:
+        dict: Counters for the run
+    """
+    from .reminder_campaign import ReminderCampaign
+
+    current_time = current_time or now()
+    users = User.objects.all() if users is None else users
+
+    claimed = users_due_final_warning(current_time, users).update(final_warning_sent_at=current_time)
+    if not claimed:
+        return {'warnings_sent': 0, 'warnings_failed': 0}
+
+    def record(sent_ids, failed_ids):
+        if failed_ids:
+            User.objects.filter(pk__in=failed_ids, final_warning_sent_at=current_time).update(
+                final_warning_sent_at=None
+            )
+
+    results = ReminderCampaign('final_warning').send(
+        users.filter(final_warning_sent_at=current_time), record=record
+    )
+    return {'warnings_sent': results['sent'], 'warnings_failed': results['failed']}
+
+
+def trigger_users_messages(user_ids, current_time):
+    """
+    Queue delivery of every scheduled message of a cohort of grace-expired users
+
+    The messages of the whole cohort are queued and moved to 'pending' in
+    bulk (legacy.tasks.trigger_scheduled_messages). Only users whose
+    messages were all queued have their notification reset, with one
+    UPDATE; the rest stay grace expired and are tried again on the next run.
+
+    Returns:
+        tuple: (number of users triggered, number of deliveries queued)
+    """
+    from legacy.tasks import trigger_scheduled_messages
+
+    triggered, queued = trigger_scheduled_messages(user_ids)
+
+    # Reset notification status for future cycles, unless a user checked in meanwhile
+    if triggered:
+        grace_expired_users(current_time, User.objects.filter(pk__in=triggered)).update(
+            notification_sent_at=None, grace_deadline=None, final_warning_sent_at=None
+        )
+    return len(triggered), queued
+
+
+def trigger_grace_expired(current_time, users=None):
+    """
+    Trigger delivery for every grace-expired user, FETCH_SIZE users at a time
+
+    Returns:
+        tuple: (number of users triggered, number of deliveries queued)
+    """
+    triggered = messages = 0
+    expired = grace_expired_users(current_time, users).order_by('pk').values_list('pk', flat=True)
+    after_id = None
+    while True:
+        page = expired if after_id is None else expired.filter(pk__gt=after_id)
+        user_ids = list(page[:FETCH_SIZE])
+        if not user_ids:
+            break
+        users_triggered, queued = trigger_users_messages(user_ids, current_time)
+        triggered += users_triggered
+        messages += queued
+        after_id = user_ids[-1]
+    return triggered, messages
+
+
+def evaluate_users(current_time=None, users=None, send_emails=True):
+    """
+    Run both stages of the switch over a set of users
+
+    Notifications are stamped first: a freshly stamped user cannot be grace
+    expired, and a user whose delivery is triggered gets notified again on
+    the next run rather than this one.
+
+    Returns:
+        dict: Counters for the run
+    """
+    current_time = current_time or now()
+
+    stamped = stamp_notifications(current_time, users)
+    triggered, messages_triggered = trigger_grace_expired(current_time, users)
+
+    counters = {
+        'notified': stamped.count(),
+        'reminders_sent': 0,
+        'reminders_failed': 0,
+        'triggered': triggered,
+        'messages_triggered': messages_triggered,
+    }
+    if send_emails and counters['notified']:
+        counters['reminders_sent'], counters['reminders_failed'] = send_reminders(stamped, current_time)
+    return counters
+
+
+def next_user_range(after_id=None, limit=None, users=None):
+    """
+    The next primary-key range of up to ``limit`` users after ``after_id``
+
+    Args:
+        users (QuerySet): Restrict the range to these users, e.g. one shard
+
+    Returns:
+        tuple: (QuerySet of the range or None, last user ID of the range, number of users)
+    """
+    limit = limit or DEFAULT_CHUNK_SIZE
+    users = User.objects.all() if users is None else users
+
+    ids = users.order_by('pk')
+    if after_id is not None:
+        ids = ids.filter(pk__gt=after_id)
+    ids = list(ids.values_list('pk', flat=True)[:limit])
+    if not ids:
+        return None, after_id, 0
+    return users.filter(pk__gte=ids[0], pk__lte=ids[-1]), ids[-1], len(ids)
+
+
+def chunked(evaluate, limit=None, users=None):
+    """
+    Turn ``evaluate(users)`` into a continuation step over primary-key ranges
+
+    Every stage is a conditional, set-based update, so a chunk that runs
+    twice neither notifies, warns nor triggers anyone twice.
+    """
+    limit = limit or DEFAULT_CHUNK_SIZE
+
+    def step(after_id):
+        chunk, last_id, count = next_user_range(after_id, limit, users)
+        if chunk is None:
+            return after_id, {'users_checked': 0}, True
+        counters = evaluate(chunk)
+        counters['users_checked'] = count
+        return last_id, counters, count < limit
+
+    return step
+
+
+def process_user_chunk(after_id=None, limit=None, send_emails=True):
+    """
+    Evaluate the next primary-key range of users after ``after_id``
+
+    Returns:
+        tuple: (last user ID of the range, dict of counters, whether all users are done)
+    """
+    return chunked(lambda users: evaluate_users(users=users, send_emails=send_emails), limit)(after_id)
+
+
+def process_inactive_users(payload=None):
+    """
+    QStash entry point: evaluate all users in self-continuing chunks
+
+    Args:
+        payload (dict): Continuation payload from afteryou.task_continuation
+    """
+    from afteryou.task_continuation import run_with_continuation
+
+    return run_with_continuation('process_inactive_users', payload or {}, process_user_chunk)
+
+
+def send_check_in_reminders(payload=None):
+    """QStash entry point: notify newly overdue users, without triggering deliveries"""
+    from afteryou.task_continuation import run_with_continuation
+
+    def notify(users):
+        current_time = now()
+        stamped = stamp_notifications(current_time, users)
+        counters = {'notified': stamped.count()}
+        if counters['notified']:
+            counters['reminders_sent'], counters['reminders_failed'] = send_reminders(stamped, current_time)
+        return counters
+
+    return run_with_continuation('send_check_in_reminders', payload or {}, chunked(notify))
+
+
+def send_final_warnings(payload=None):
+    """QStash entry point: send final warnings to users whose grace period ends soon"""
+    from afteryou.task_continuation import run_with_continuation
+
+    return run_with_continuation(
+        'send_final_warnings', payload or {}, chunked(lambda users: send_final_warnings_to(users=users))
+    )
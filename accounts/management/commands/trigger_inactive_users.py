@@ -1,9 +1,8 @@
-from django.core.management.base import BaseCommand
+import zlib
+from django.core.management.base import BaseCommand, CommandError
 from django.utils.timezone import now
-from datetime import timedelta
-from accounts.models import User
-from accounts.email_service import DeadMansSwitchEmailService
-from legacy.models import LegacyMessage
+from accounts.inactivity import grace_expired_users, overdue_users, users_to_notify
+from accounts.sweeps import ShardLease, parse_shard, shard_users, sweep_shard
 
 class Command(BaseCommand):
     help = 'Dead mans switch: Check for inactive users and trigger notifications or message delivery.'
@@ -19,98 +18,106 @@ class Command(BaseCommand):
             action='store_true',
             help='Actually send notification emails (default: false for safety)'
         )
+        parser.add_argument(
+            '--shard',
+            type=str,
+            help='Only sweep shard i of N (e.g. 0/4): users whose id modulo N is i'
+        )
+        parser.add_argument(
+            '--shards',
+            type=int,
+            help='Split users into N shards and sweep every shard no other node holds or recently finished'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Start from the first user instead of resuming an interrupted sweep'
+        )
 
     def handle(self, *args, **options):
         dry_run = options['dry_run']
         send_emails = options['send_emails']
-        
+
+        if options['shard'] and options['shards']:
+            raise CommandError('Use either --shard or --shards, not both')
+        if options['shard']:
+            try:
+                index, count = parse_shard(options['shard'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            shards = [index]
+        else:
+            count = options['shards'] or 1
+            if count < 1:
+                raise CommandError('--shards must be at least 1')
+            # Nodes start at different shards so they rarely contend for the same lease
+            start = zlib.crc32(ShardLease(0, count).owner.encode()) % count
+            shards = [(start + offset) % count for offset in range(count)]
+        auto = bool(options['shards'])
+
         self.stdout.write("=== Dead Man's Switch Check ===")
-        
+
         if dry_run:
             self.stdout.write(self.style.WARNING("DRY RUN MODE - No changes will be made"))
         if not send_emails:
             self.stdout.write(self.style.WARNING("EMAIL SENDING DISABLED - Use --send-emails to enable"))
-        
-        # Get all users
-        all_users = User.objects.all()
-        self.stdout.write(f"Checking {all_users.count()} users...")
-        
-        # Process each user
-        for user in all_users:
-            self._process_user(user, dry_run, send_emails)
-    
-    def _process_user(self, user, dry_run, send_emails):
-        """Process individual user for dead man's switch logic"""
+
+        for index in shards:
+            label = f"shard {index}/{count}" if count > 1 else "all users"
+            if dry_run:
+                self._report_dry_run(label, shard_users(index, count))
+                continue
+
+            lease = ShardLease(index, count)
+            if not lease.acquire(skip_recently_finished=auto):
+                self.stdout.write(f"   ⏭  Skipping {label}: held by another node or recently swept")
+                continue
+
+            self.stdout.write(f"\n📋 Sweeping {label}...")
+            finished = False
+            try:
+                run, finished = sweep_shard(
+                    index, count,
+                    lease=lease,
+                    send_emails=send_emails,
+                    restart=options['restart'],
+                    progress=self._report_progress
+                )
+            finally:
+                lease.release(finished=finished)
+            self._report(run.counters, send_emails)
+            if not finished:
+                self.stdout.write(self.style.WARNING(f"   Lease on {label} was lost; another node takes over"))
+
+        self.stdout.write(self.style.SUCCESS("Dead man's switch check completed"))
+
+    def _report_dry_run(self, label, users):
+        # Deadlines are evaluated by the database over whole cohorts
+        # (see accounts/inactivity.py), not user by user
         current_time = now()
-        
-        # Calculate when user should have checked in (based on their interval)
-        months_ago = 30 * user.check_in_interval_months  # Approximate months to days
-        check_in_deadline = current_time - timedelta(days=months_ago)
-        
-        # Check if user is past their check-in deadline
-        if user.last_check_in >= check_in_deadline:
-            # User is active, no action needed
-            return
-        
-        self.stdout.write(f"\n📋 Processing user: {user.username}")
-        self.stdout.write(f"   Last check-in: {user.last_check_in}")
-        self.stdout.write(f"   Should check in every: {user.check_in_interval_months} months")
-        self.stdout.write(f"   Grace period: {user.grace_period_days} days")
-        
-        # Check if notification has been sent
-        if user.notification_sent_at is None:
-            # First stage: Send notification
-            self._handle_first_notification(user, dry_run, send_emails)
-        else:
-            # Check if grace period has expired
-            grace_deadline = user.notification_sent_at + timedelta(days=user.grace_period_days)
-            
-            if current_time >= grace_deadline:
-                # Grace period expired: Trigger delivery
-                self._handle_delivery_trigger(user, dry_run)
-            else:
-                # Still in grace period
-                remaining_days = (grace_deadline - current_time).days
-                self.stdout.write(f"   📧 Notification sent, {remaining_days} days remaining in grace period")
-    
-    def _handle_first_notification(self, user, dry_run, send_emails):
-        """Send first inactivity notification"""
-        self.stdout.write(f"   📧 Sending first inactivity notification...")
-        
-        if not dry_run:
-            user.notification_sent_at = now()
-            user.save()
-            self.stdout.write(f"   ✓ Marked notification as sent")
-            
-            if send_emails:
-                success = DeadMansSwitchEmailService.send_check_in_reminder(user)
-                if success:
-                    self.stdout.write(f"   ✓ Email sent successfully to {user.email}")
-                else:
-                    self.stdout.write(f"   ❌ Failed to send email to {user.email}")
-            else:
-                self.stdout.write(f"   📧 [EMAIL DISABLED] Would send reminder to {user.email}")
-        else:
-            self.stdout.write(f"   [DRY RUN] Would send notification to {user.email}")
-    
-    def _handle_delivery_trigger(self, user, dry_run):
-        """Trigger message delivery for user"""
-        messages = LegacyMessage.objects.filter(user=user, status='scheduled')
-        message_count = messages.count()
-        
-        self.stdout.write(f"   🚨 Grace period expired! Triggering delivery of {message_count} messages...")
-        
-        if not dry_run and message_count > 0:
-            # Update all scheduled messages to pending
-            updated = messages.update(status='pending')
-            self.stdout.write(f"   ✓ {updated} messages set to pending for delivery")
-            
-            # Reset user's notification status for future cycles
-            user.notification_sent_at = None
-            user.save()
-            self.stdout.write(f"   ✓ User notification status reset")
-        else:
-            if message_count > 0:
-                self.stdout.write(f"   [DRY RUN] Would trigger delivery of {message_count} messages")
-            else:
-                self.stdout.write(f"   ℹ️  No scheduled messages to deliver")
+        self.stdout.write(f"\n📋 {label}: {users.count()} users, {overdue_users(current_time, users).count()} overdue")
+        self.stdout.write(f"   [DRY RUN] Would notify {users_to_notify(current_time, users).count()} users")
+        self.stdout.write(
+            f"   [DRY RUN] Would trigger delivery for {grace_expired_users(current_time, users).count()} users"
+        )
+
+    def _report_progress(self, run):
+        self.stdout.write(
+            f"   … {run.users_checked}/{run.users_total} users ({run.progress:.0%}), "
+            f"checkpoint at user {run.last_user_id}"
+        )
+
+    def _report(self, results, send_emails):
+        self.stdout.write(f"   Checked {results.get('users_checked', 0)} users")
+        self.stdout.write(f"   📧 Marked {results.get('notified', 0)} users as notified")
+        if send_emails:
+            self.stdout.write(
+                f"   ✓ {results.get('reminders_sent', 0)} reminder emails sent, "
+                f"{results.get('reminders_failed', 0)} failed"
+            )
+        elif results.get('notified'):
+            self.stdout.write(f"   📧 [EMAIL DISABLED] Would send {results['notified']} reminders")
+        self.stdout.write(
+            f"   🚨 Grace period expired for {results.get('triggered', 0)} users: "
+            f"{results.get('messages_triggered', 0)} messages queued for delivery"
+        )
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:54
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import DurationField, ExpressionWrapper, F, Value
+
+
+def backfill_deadlines(apps, schema_editor):
+    # Set-based, so existing users are backfilled with two UPDATEs
+    User = apps.get_model('accounts', 'User')
+    User.objects.filter(last_check_in__isnull=False).update(
+        next_check_in_due=F('last_check_in') + ExpressionWrapper(
+            F('check_in_interval_months') * Value(timedelta(days=30)), output_field=DurationField()
+        )
+    )
+    User.objects.filter(notification_sent_at__isnull=False).update(
+        grace_deadline=F('notification_sent_at') + ExpressionWrapper(
+            F('grace_period_days') * Value(timedelta(days=1)), output_field=DurationField()
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_remove_unused_otp_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='grace_deadline',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='When delivery triggers: notification_sent_at + grace_period_days', null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='next_check_in_due',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='When the user is overdue: last_check_in + check_in_interval_months (30-day months)', null=True),
+        ),
+        migrations.RunPython(backfill_deadlines, migrations.RunPython.noop),
+    ]
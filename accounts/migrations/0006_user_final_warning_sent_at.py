@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_user_escalation_deadlines'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='final_warning_sent_at',
+            field=models.DateTimeField(blank=True, help_text='When the final warning of the current notification cycle was sent', null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_user_final_warning_sent_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SweepLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('shard_index', models.PositiveIntegerField()),
+                ('shard_count', models.PositiveIntegerField()),
+                ('owner', models.CharField(blank=True, max_length=255)),
+                ('acquired_at', models.DateTimeField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField(blank=True, help_text='The lease is free once this has passed', null=True)),
+                ('finished_at', models.DateTimeField(blank=True, help_text='When the shard was last swept to the end', null=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='sweeplease',
+            constraint=models.UniqueConstraint(fields=('name', 'shard_count', 'shard_index'), name='unique_sweep_shard'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_sweeplease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SweepRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('shard_index', models.PositiveIntegerField(default=0)),
+                ('shard_count', models.PositiveIntegerField(default=1)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed'), ('abandoned', 'Abandoned')], default='running', max_length=10)),
+                ('owner', models.CharField(blank=True, max_length=255)),
+                ('last_user_id', models.BigIntegerField(blank=True, help_text='Checkpoint: users up to this ID are done', null=True)),
+                ('users_total', models.PositiveIntegerField(default=0, help_text='Users in the shard when the run started')),
+                ('counters', models.JSONField(blank=True, default=dict)),
+                ('error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['name', 'shard_count', 'shard_index', 'status'], name='accounts_sw_name_77b7ce_idx')],
+            },
+        ),
+    ]
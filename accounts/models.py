@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils.timezone import now
+from datetime import timedelta
 
 class User(AbstractUser):
     email = models.EmailField(unique=True)
@@ -29,7 +30,125 @@ class User(AbstractUser):
         default=10,
         help_text="Days after notification before triggering delivery"
     )
+    final_warning_sent_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the final warning of the current notification cycle was sent"
+    )
+    
+    # Escalation deadlines derived from the fields above, so the scheduler can
+    # range-scan them and status endpoints can read them directly
+    next_check_in_due = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text="When the user is overdue: last_check_in + check_in_interval_months (30-day months)"
+    )
+    grace_deadline = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text="When delivery triggers: notification_sent_at + grace_period_days"
+    )
+    
+    DEADLINE_SOURCE_FIELDS = frozenset(
+        ['last_check_in', 'check_in_interval_months', 'notification_sent_at', 'grace_period_days']
+    )
+    
+    def refresh_deadlines(self):
+        """Recompute next_check_in_due and grace_deadline from the switch settings"""
+        if self.notification_sent_at is None:
+            # A final warning belongs to the notification cycle a check-in ends
+            self.final_warning_sent_at = None
+        self.next_check_in_due = (
+            self.last_check_in + timedelta(days=30 * self.check_in_interval_months) if self.last_check_in else None
+        )
+        self.grace_deadline = (
+            self.notification_sent_at + timedelta(days=self.grace_period_days) if self.notification_sent_at else None
+        )
+    
+    def save(self, *args, **kwargs):
+        # Every check-in, settings change and notification goes through save();
+        # bulk UPDATEs in accounts/inactivity.py set the deadlines themselves
+        self.refresh_deadlines()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and self.DEADLINE_SOURCE_FIELDS.intersection(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'next_check_in_due', 'grace_deadline', 'final_warning_sent_at'}
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return self.username
 
+
+
+class SweepLease(models.Model):
+    """
+    Lease on one shard of a periodic sweep over users
+
+    Nodes running trigger_inactive_users at the same time each hold the
+    lease of a different shard, so they sweep disjoint slices of users.
+    """
+    name = models.CharField(max_length=50)
+    shard_index = models.PositiveIntegerField()
+    shard_count = models.PositiveIntegerField()
+    owner = models.CharField(max_length=255, blank=True)
+    acquired_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True, help_text="The lease is free once this has passed")
+    finished_at = models.DateTimeField(null=True, blank=True, help_text="When the shard was last swept to the end")
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'shard_count', 'shard_index'], name='unique_sweep_shard'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} {self.shard_index}/{self.shard_count}"
+
+
+class SweepRun(models.Model):
+    """
+    Progress of one sweep over a shard of users
+
+    The checkpoint (last user ID processed) and counters are written after
+    every chunk, so a run interrupted by a crash or a lost lease is picked up
+    where it stopped instead of starting over.
+    """
+    STATUS_CHOICES = (
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('abandoned', 'Abandoned'),
+    )
+    name = models.CharField(max_length=50)
+    shard_index = models.PositiveIntegerField(default=0)
+    shard_count = models.PositiveIntegerField(default=1)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running')
+    owner = models.CharField(max_length=255, blank=True)
+    last_user_id = models.BigIntegerField(null=True, blank=True, help_text="Checkpoint: users up to this ID are done")
+    users_total = models.PositiveIntegerField(default=0, help_text="Users in the shard when the run started")
+    counters = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(default=now)
+    updated_at = models.DateTimeField(default=now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['name', 'shard_count', 'shard_index', 'status']),
+        ]
+    
+    @property
+    def users_checked(self):
+        return self.counters.get('users_checked', 0)
+    
+    @property
+    def progress(self):
+        """Share of the shard's users processed, from 0 to 1"""
+        if self.status == 'completed':
+            return 1.0
+        if not self.users_total:
+            return 0.0
+        return min(self.users_checked / self.users_total, 1.0)
+    
+    def __str__(self):
+        return f"{self.name} {self.shard_index}/{self.shard_count} ({self.status})"
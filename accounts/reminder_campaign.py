@@ -0,0 +1,154 @@
+"""
+Campaign engine for dead man's switch emails (check-in reminders and final
+warnings).
+A cohort is rendered in batches and fanned out over pooled SMTP connections
+by a bounded number of sender threads; results are handed back per batch so
+callers record them with one UPDATE instead of one save per user.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from afteryou.smtp_pool import send_with_reconnect, smtp_pool
+from .email_service import DeadMansSwitchEmailService
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAMPAIGN_SETTINGS = {
+    'CONCURRENCY': 4,  # Sender threads, each on its own pooled SMTP connection
+    'BATCH_SIZE': 200,  # Users loaded and rendered per batch
+    'CHUNK_SIZE': 25,  # Emails handed to a sender thread at a time
+    'FINAL_WARNING_DAYS': 3,  # Final warnings go out this many days before the grace deadline
+}
+
+# Every field the reminder and warning emails read (accounts/email_service.py
+# and templates/emails/); any other field would cost a query per user
+CAMPAIGN_FIELDS = ('id', 'username', 'email', 'first_name', 'grace_period_days', 'check_in_interval_months')
+
+
+def campaign_setting(name):
+    return getattr(settings, 'REMINDER_CAMPAIGN_SETTINGS', {}).get(name, DEFAULT_CAMPAIGN_SETTINGS[name])
+
+
+def scheduled_message_counts(user_ids):
+    """Scheduled legacy messages per user, for a whole batch in one aggregation"""
+    from legacy.models import LegacyMessage
+
+    pipeline = [
+        {'$match': {'user_id': {'$in': [str(user_id) for user_id in user_ids]}, 'status': 'scheduled'}},
+        {'$group': {'_id': '$user_id', 'count': {'$sum': 1}}},
+    ]
+    return {row['_id']: row['count'] for row in LegacyMessage._get_collection().aggregate(pipeline)}
+
+
+class ReminderCampaign:
+    """
+    Sends one kind of dead man's switch email to a cohort of users
+
+    Usage:
+        campaign = ReminderCampaign('final_warning')
+        results = campaign.send(users, record=lambda sent_ids, failed_ids: ...)
+
+    The main thread renders batch after batch while up to ``concurrency``
+    sender threads work through the previous ones, so rendering and SMTP
+    round trips overlap and memory stays bounded by the batches in flight.
+    """
+
+    KINDS = ('check_in_reminder', 'final_warning')
+
+    def __init__(self, kind, concurrency=None, batch_size=None, chunk_size=None):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown campaign kind: {kind}")
+        self.kind = kind
+        self.concurrency = concurrency or campaign_setting('CONCURRENCY')
+        self.batch_size = batch_size or campaign_setting('BATCH_SIZE')
+        self.chunk_size = chunk_size or campaign_setting('CHUNK_SIZE')
+
+    def send(self, users, record=None):
+        """
+        Email every user of the cohort
+
+        Args:
+            users (QuerySet): The cohort
+            record (callable): Called from this thread with (sent user IDs,
+                failed user IDs) after each batch, to write results in bulk
+
+        Returns:
+            dict: Number of emails sent and failed
+        """
+        results = {'sent': 0, 'failed': 0}
+        pending_sent = []
+        pending_failed = []
+        lock = threading.Lock()
+        in_flight = threading.BoundedSemaphore(self.concurrency)
+
+        def run_chunk(chunk):
+            try:
+                sent, failed = self._send_chunk(chunk)
+            except Exception as e:
+                logger.error(f"Error sending chunk of {len(chunk)} {self.kind} emails: {str(e)}")
+                sent, failed = [], [user_id for user_id, _ in chunk]
+            finally:
+                in_flight.release()
+
+            with lock:
+                pending_sent.extend(sent)
+                pending_failed.extend(failed)
+
+        def flush():
+            with lock:
+                sent, failed = pending_sent[:], pending_failed[:]
+                del pending_sent[:], pending_failed[:]
+            results['sent'] += len(sent)
+            results['failed'] += len(failed)
+            if record and (sent or failed):
+                record(sent, failed)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f'campaign-{self.kind}') as executor:
+            for batch in self._batches(users):
+                emails = self._render(batch)
+                for start in range(0, len(emails), self.chunk_size):
+                    in_flight.acquire()
+                    executor.submit(run_chunk, emails[start:start + self.chunk_size])
+                flush()
+
+        flush()
+        logger.info(f"Campaign {self.kind}: {results['sent']} sent, {results['failed']} failed")
+        return results
+
+    def _batches(self, users):
+        batch = []
+        for user in users.only(*CAMPAIGN_FIELDS).order_by('pk').iterator(chunk_size=self.batch_size):
+            batch.append(user)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _render(self, batch):
+        """Render a batch of users into (user ID, email) pairs"""
+        if self.kind == 'final_warning':
+            counts = scheduled_message_counts(user.id for user in batch)
+            return [
+                (user.id, DeadMansSwitchEmailService.build_final_warning(user, counts.get(str(user.id), 0)))
+                for user in batch
+            ]
+        return [(user.id, DeadMansSwitchEmailService.build_check_in_reminder(user)) for user in batch]
+
+    def _send_chunk(self, chunk):
+        """Send a chunk over one pooled connection; returns (sent user IDs, failed user IDs)"""
+        sent = []
+        failed = []
+        with smtp_pool.connection() as connection:
+            for user_id, email in chunk:
+                try:
+                    if send_with_reconnect(connection, email):
+                        sent.append(user_id)
+                    else:
+                        failed.append(user_id)
+                        logger.error(f"Failed to send {self.kind} email to user {user_id}")
+                except Exception as e:
+                    failed.append(user_id)
+                    logger.error(f"Error sending {self.kind} email to user {user_id}: {str(e)}")
+        return sent, failed
@@ -0,0 +1,241 @@
+"""
+Sharded inactivity sweeps
+Users are partitioned by user ID modulo the shard count. A node sweeps a
+shard only while it holds that shard's lease (SweepLease), renewed after
+every chunk, so N nodes running trigger_inactive_users sweep disjoint
+slices in parallel and a node that dies frees its shard within seconds.
+Each sweep checkpoints into a SweepRun, so an interrupted run resumes after
+the last user it processed.
+"""
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import IntegerField, Q
+from django.db.models.functions import Mod
+from django.utils.timezone import now
+from .inactivity import chunked, evaluate_users
+from .models import SweepLease, SweepRun, User
+
+logger = logging.getLogger(__name__)
+
+INACTIVITY_SWEEP = 'inactivity'
+
+DEFAULT_SWEEP_SETTINGS = {
+    'LEASE_SECONDS': 120,  # A shard whose lease is not renewed for this long can be taken over
+    'RESWEEP_AFTER': 3600,  # With --shards, skip shards another node finished less than this many seconds ago
+    'CHUNK_SIZE': 5000,  # Users per chunk; the lease is renewed between chunks
+}
+
+
+def sweep_setting(name):
+    return getattr(settings, 'INACTIVITY_SWEEP_SETTINGS', {}).get(name, DEFAULT_SWEEP_SETTINGS[name])
+
+
+def parse_shard(value):
+    """Parse 'i/N' into (i, N); shards are numbered from 0"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N, got {value!r}")
+    if count < 1:
+        raise ValueError(f"Shard count must be at least 1, got {value!r}")
+    if not 0 <= index < count:
+        raise ValueError(f"Shard index must be between 0 and {count - 1}, got {value!r}")
+    return index, count
+
+
+def shard_users(index, count, users=None):
+    """The users of one shard: those whose ID modulo ``count`` is ``index``"""
+    users = User.objects.all() if users is None else users
+    if count == 1:
+        return users
+    return users.alias(shard=Mod('id', count, output_field=IntegerField())).filter(shard=index)
+
+
+class ShardLease:
+    """
+    Short, renewable lease on one shard, stored in SweepLease
+
+    Acquiring and renewing are single conditional UPDATEs, so two nodes
+    racing for the same shard cannot both win.
+    """
+
+    def __init__(self, index, count, owner=None, name=INACTIVITY_SWEEP, lease_seconds=None):
+        from legacy.leases import default_lease_owner
+
+        self.index = index
+        self.count = count
+        self.name = name
+        self.owner = owner or default_lease_owner()
+        self.lease_seconds = lease_seconds or sweep_setting('LEASE_SECONDS')
+        self.record_id = None
+
+    def acquire(self, skip_recently_finished=False):
+        """
+        Take the lease if it is free (or already ours)
+
+        Args:
+            skip_recently_finished: Leave the shard alone if it was swept to
+                the end within RESWEEP_AFTER seconds
+
+        Returns:
+            bool: Whether this node now holds the shard
+        """
+        current_time = now()
+        record, _ = SweepLease.objects.get_or_create(
+            name=self.name, shard_count=self.count, shard_index=self.index
+        )
+
+        claimable = Q(expires_at__isnull=True) | Q(expires_at__lte=current_time) | Q(owner=self.owner)
+        if skip_recently_finished:
+            resweep_after = current_time - timedelta(seconds=sweep_setting('RESWEEP_AFTER'))
+            claimable &= Q(finished_at__isnull=True) | Q(finished_at__lte=resweep_after)
+
+        acquired = SweepLease.objects.filter(claimable, pk=record.pk).update(
+            owner=self.owner,
+            acquired_at=current_time,
+            expires_at=current_time + timedelta(seconds=self.lease_seconds)
+        )
+        if acquired:
+            self.record_id = record.pk
+        return bool(acquired)
+
+    def renew(self):
+        """Extend the lease; False if another node has taken the shard over"""
+        return bool(SweepLease.objects.filter(pk=self.record_id, owner=self.owner).update(
+            expires_at=now() + timedelta(seconds=self.lease_seconds)
+        ))
+
+    def release(self, finished=False):
+        """Free the shard, recording whether it was swept to the end"""
+        updates = {'owner': '', 'expires_at': None}
+        if finished:
+            updates['finished_at'] = now()
+        SweepLease.objects.filter(pk=self.record_id, owner=self.owner).update(**updates)
+        self.record_id = None
+
+
+def start_run(index, count, owner='', name=INACTIVITY_SWEEP, restart=False):
+    """
+    Resume the shard's unfinished run, or start a new one
+
+    Args:
+        restart: Abandon any unfinished run and start from the first user
+
+    Returns:
+        tuple: (SweepRun, whether it was resumed)
+    """
+    current_time = now()
+    unfinished = SweepRun.objects.filter(
+        name=name, shard_count=count, shard_index=index, status__in=('running', 'failed')
+    )
+    if restart:
+        unfinished.update(status='abandoned', finished_at=current_time, updated_at=current_time)
+    else:
+        run = unfinished.order_by('-started_at').first()
+        if run is not None:
+            run.status = 'running'
+            run.owner = owner
+            run.error = ''
+            run.updated_at = current_time
+            run.save(update_fields=['status', 'owner', 'error', 'updated_at'])
+            return run, True
+
+    run = SweepRun.objects.create(
+        name=name,
+        shard_index=index,
+        shard_count=count,
+        owner=owner,
+        users_total=shard_users(index, count).count(),
+        started_at=current_time,
+        updated_at=current_time
+    )
+    return run, False
+
+
+def sweep_shard(index, count, lease=None, send_emails=True, chunk_size=None, restart=False, progress=None):
+    """
+    Run the dead man's switch over one shard, chunk by chunk
+
+    Every chunk is followed by a checkpoint of the run; a chunk interrupted
+    before its checkpoint is evaluated again on resume, which is safe since
+    every stage only updates users still matching its conditions.
+
+    Args:
+        restart: Ignore the checkpoint of an unfinished run
+        progress (callable): Called with the SweepRun after every chunk
+
+    Returns:
+        tuple: (SweepRun, whether the shard was swept to the end)
+    """
+    owner = lease.owner if lease is not None else ''
+    run, resumed = start_run(index, count, owner, restart=restart)
+    if resumed:
+        logger.info(f"Resuming sweep of shard {index}/{count} after user {run.last_user_id}")
+
+    step = chunked(
+        lambda chunk: evaluate_users(users=chunk, send_emails=send_emails),
+        chunk_size or sweep_setting('CHUNK_SIZE'),
+        shard_users(index, count)
+    )
+
+    cursor = run.last_user_id
+    while True:
+        try:
+            cursor, counters, done = step(cursor)
+        except Exception as e:
+            SweepRun.objects.filter(pk=run.pk, owner=owner).update(status='failed', error=str(e), updated_at=now())
+            raise
+
+        for key, value in counters.items():
+            run.counters[key] = run.counters.get(key, 0) + value
+        run.last_user_id = cursor
+        run.updated_at = now()
+        updates = {'last_user_id': cursor, 'counters': run.counters, 'updated_at': run.updated_at}
+        if done:
+            run.status = 'completed'
+            run.finished_at = run.updated_at
+            updates.update(status='completed', finished_at=run.finished_at)
+
+        # Checkpoints are conditional on the owner, so a node whose lease
+        # lapsed cannot move a run another node has resumed
+        if not SweepRun.objects.filter(pk=run.pk, owner=owner).update(**updates):
+            logger.warning(f"Sweep of shard {index}/{count} was resumed by another node; stopping")
+            return run, False
+        if progress:
+            progress(run)
+        if done:
+            return run, True
+        if lease is not None and not lease.renew():
+            logger.warning(f"Lost the lease on shard {index}/{count} after user {cursor}; stopping")
+            return run, False
+
+
+def describe_run(run):
+    return {
+        'id': run.id,
+        'shard': f"{run.shard_index}/{run.shard_count}",
+        'status': run.status,
+        'progress': round(run.progress * 100, 1),
+        'users_checked': run.users_checked,
+        'users_total': run.users_total,
+        'last_user_id': run.last_user_id,
+        'counters': run.counters,
+        'started_at': run.started_at.isoformat(),
+        'updated_at': run.updated_at.isoformat(),
+        'finished_at': run.finished_at.isoformat() if run.finished_at else None,
+        'error': run.error or None,
+    }
+
+
+def sweep_progress(name=INACTIVITY_SWEEP):
+    """Unfinished runs and the latest completed one, for status endpoints"""
+    runs = SweepRun.objects.filter(name=name)
+    last_completed = runs.filter(status='completed').order_by('-finished_at').first()
+    return {
+        'active': [
+            describe_run(run)
+            for run in runs.filter(status__in=('running', 'failed')).order_by('shard_count', 'shard_index', '-started_at')
+        ],
+        'last_completed': describe_run(last_completed) if last_completed else None,
+    }
@@ -6,16 +6,26 @@ import logging
 logger = logging.getLogger(__name__)
 
 @shared_task
-def check_dead_mans_switch():
+def check_dead_mans_switch(shard=None, shards=None):
     """
     Celery task to check for inactive users and trigger dead man's switch logic.
     This task runs daily and handles both notifications and message delivery.
+    
+    Args:
+        shard (str): Only sweep this shard, as 'i/N'
+        shards (int): Sweep every free shard out of this many; run the task on
+            several nodes at once to split the sweep between them
     """
     try:
         logger.info("Starting dead man's switch check...")
         
         # Call the management command with email sending enabled
-        call_command('trigger_inactive_users', '--send-emails')
+        args = ['--send-emails']
+        if shard:
+            args += ['--shard', shard]
+        elif shards:
+            args += ['--shards', str(shards)]
+        call_command('trigger_inactive_users', *args)
         
         logger.info("Dead man's switch check completed successfully")
         return "Dead man's switch check completed"
@@ -59,24 +69,25 @@ def trigger_user_message_delivery(user_id):
     Task to trigger message delivery for a specific user.
     """
     from accounts.models import User
-    from legacy.models import LegacyMessage
+    from legacy.tasks import trigger_scheduled_messages
     
     try:
         user = User.objects.get(id=user_id)
-        messages = LegacyMessage.objects.filter(user=user, status='scheduled')
         
-        if messages.exists():
-            updated = messages.update(status='pending')
-            
-            # Reset user's notification status for future cycles
-            user.notification_sent_at = None
-            user.save()
-            
-            logger.info(f"Triggered delivery of {updated} messages for user {user.username}")
-            return updated
-        else:
-            logger.info(f"No scheduled messages found for user {user.username}")
+        # Same path as the dead man's switch sweep; LegacyMessage stores the
+        # user as a string ID
+        triggered, queued = trigger_scheduled_messages([user.id])
+        if user.id not in triggered:
+            # Keep the user notified so the next run tries again
+            logger.error(f"Could not queue every message for user {user.username}")
             return 0
+        
+        # Reset user's notification status for future cycles
+        user.notification_sent_at = None
+        user.save(update_fields=['notification_sent_at'])
+        
+        logger.info(f"Triggered delivery of {queued} messages for user {user.username}")
+        return queued
             
     except User.DoesNotExist:
         logger.error(f"User with ID {user_id} not found")
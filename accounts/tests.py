@@ -1,3 +1,153 @@
+from datetime import timedelta
+from unittest import mock
 from django.test import TestCase
+from django.utils.timezone import now
+from legacy.models import LegacyMessage
+from legacy.tests import MongoDatabaseMixin
+from .inactivity import send_reminders, stamp_notifications, trigger_grace_expired, users_to_notify
+from .models import User
+from .reminder_campaign import ReminderCampaign
 
-# Create your tests here.
+
+def create_user(username, checked_in_days_ago=40, **fields):
+    """A user with a one-month check-in interval and a 7-day grace period"""
+    return User.objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        password='secret-password',
+        last_check_in=now() - timedelta(days=checked_in_days_ago),
+        check_in_interval_months=1,
+        grace_period_days=7,
+        **fields
+    )
+
+
+def notify_in_the_past(user, days_ago):
+    """Stamp the user's notification as if it had been sent ``days_ago`` days ago"""
+    user.notification_sent_at = now() - timedelta(days=days_ago)
+    user.save(update_fields=['notification_sent_at'])
+    return user
+
+
+class DeadlineTests(TestCase):
+    def test_save_computes_deadlines(self):
+        user = create_user('alice')
+
+        user.refresh_from_db()
+        self.assertEqual(user.next_check_in_due, user.last_check_in + timedelta(days=30))
+        self.assertIsNone(user.grace_deadline)
+
+    def test_save_with_update_fields_writes_the_deadlines(self):
+        user = create_user('alice')
+
+        user.last_check_in = now()
+        user.save(update_fields=['last_check_in'])
+
+        user.refresh_from_db()
+        self.assertEqual(user.next_check_in_due, user.last_check_in + timedelta(days=30))
+
+    def test_notification_sets_and_clears_the_grace_deadline(self):
+        user = notify_in_the_past(create_user('alice'), days_ago=2)
+        user.final_warning_sent_at = now()
+        user.save(update_fields=['final_warning_sent_at'])
+
+        user.refresh_from_db()
+        self.assertEqual(user.grace_deadline, user.notification_sent_at + timedelta(days=7))
+
+        user.notification_sent_at = None
+        user.save(update_fields=['notification_sent_at'])
+
+        user.refresh_from_db()
+        self.assertIsNone(user.grace_deadline)
+        self.assertIsNone(user.final_warning_sent_at)
+
+
+class NotificationTests(TestCase):
+    def test_only_overdue_users_are_stamped_once(self):
+        overdue = create_user('alice')
+        create_user('bob', checked_in_days_ago=1)
+        current_time = now()
+
+        stamped = stamp_notifications(current_time)
+
+        self.assertEqual(list(stamped), [overdue])
+        overdue.refresh_from_db()
+        self.assertEqual(overdue.grace_deadline, current_time + timedelta(days=7))
+        self.assertFalse(stamp_notifications(now()).exists())
+
+    def test_failed_reminders_are_unstamped(self):
+        delivered = create_user('alice')
+        undelivered = create_user('bob')
+        current_time = now()
+
+        def send_chunk(campaign, chunk):
+            return (
+                [user_id for user_id, _ in chunk if user_id != undelivered.pk],
+                [user_id for user_id, _ in chunk if user_id == undelivered.pk],
+            )
+
+        with mock.patch.object(ReminderCampaign, '_render', lambda campaign, batch: [(user.pk, None) for user in batch]), \
+                mock.patch.object(ReminderCampaign, '_send_chunk', send_chunk):
+            sent, failed = send_reminders(stamp_notifications(current_time), current_time)
+
+        self.assertEqual((sent, failed), (1, 1))
+        delivered.refresh_from_db()
+        undelivered.refresh_from_db()
+        self.assertEqual(delivered.notification_sent_at, current_time)
+        self.assertIsNone(undelivered.notification_sent_at)
+        self.assertIsNone(undelivered.grace_deadline)
+        self.assertEqual(list(users_to_notify(now())), [undelivered])
+
+    def test_user_who_checks_in_after_the_notification_is_not_triggered(self):
+        checked_in = notify_in_the_past(create_user('alice'), days_ago=8)
+        silent = notify_in_the_past(create_user('bob'), days_ago=8)
+
+        checked_in.last_check_in = now()
+        checked_in.notification_sent_at = None
+        checked_in.save()
+
+        with mock.patch('legacy.tasks.trigger_scheduled_messages', return_value=({silent.pk}, 2)) as trigger:
+            self.assertEqual(trigger_grace_expired(now()), (1, 2))
+
+        trigger.assert_called_once_with([silent.pk])
+        silent.refresh_from_db()
+        self.assertIsNone(silent.notification_sent_at)
+
+
+class GraceExpiryTests(MongoDatabaseMixin, TestCase):
+    def test_user_without_scheduled_messages_is_reset(self):
+        user = notify_in_the_past(create_user('alice'), days_ago=8)
+        self.create_message(user_id=str(user.pk), status='sent')
+
+        self.assertEqual(trigger_grace_expired(now()), (1, 0))
+
+        user.refresh_from_db()
+        self.assertIsNone(user.notification_sent_at)
+        self.assertIsNone(user.grace_deadline)
+
+    def test_queued_messages_move_to_pending(self):
+        user = notify_in_the_past(create_user('alice'), days_ago=8)
+        message = self.create_message(user_id=str(user.pk))
+
+        with mock.patch(
+            'legacy.simple_tasks.schedule_message_deliveries',
+            side_effect=lambda deliveries: {message_id: f'deliver_message_{message_id}' for message_id, _ in deliveries}
+        ):
+            self.assertEqual(trigger_grace_expired(now()), (1, 1))
+
+        message.reload()
+        self.assertEqual(message.status, 'pending')
+        self.assertEqual(message.job_id, f'deliver_message_{message.id}')
+        user.refresh_from_db()
+        self.assertIsNone(user.notification_sent_at)
+
+    def test_user_whose_messages_could_not_be_queued_stays_notified(self):
+        user = notify_in_the_past(create_user('alice'), days_ago=8)
+        message = self.create_message(user_id=str(user.pk))
+
+        with mock.patch('legacy.simple_tasks.schedule_message_deliveries', return_value={}):
+            self.assertEqual(trigger_grace_expired(now()), (0, 0))
+
+        self.assertEqual(LegacyMessage.objects.get(id=message.id).status, 'scheduled')
+        user.refresh_from_db()
+        self.assertIsNotNone(user.notification_sent_at)
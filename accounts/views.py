@@ -5,7 +5,6 @@ from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
 from django.utils.timezone import now
 from django.views.decorators.http import require_http_methods
-from datetime import timedelta
 from .forms import RegisterForm, LoginForm
 
 def register_view(request):
@@ -43,13 +42,13 @@ def check_in_view(request):
         user = request.user
         user.last_check_in = now()
         user.notification_sent_at = None  # Reset notification status
-        user.save()
+        user.save()  # Recomputes next_check_in_due and clears grace_deadline
         
         return JsonResponse({
             'success': True,
             'message': 'Check-in successful! Your timer has been reset.',
             'last_check_in': user.last_check_in.isoformat(),
-            'next_check_in_due': (now() + timedelta(days=30 * user.check_in_interval_months)).isoformat()
+            'next_check_in_due': user.next_check_in_due.isoformat()
         })
     except Exception as e:
         return JsonResponse({
@@ -63,19 +62,13 @@ def check_in_status_view(request):
     user = request.user
     current_time = now()
     
-    # Calculate when user should check in next
-    months_in_days = 30 * user.check_in_interval_months
-    next_check_in_due = user.last_check_in + timedelta(days=months_in_days)
-    
-    # Calculate if user is overdue
+    # Deadlines are stored on the user (see User.refresh_deadlines)
+    next_check_in_due = user.next_check_in_due
     is_overdue = current_time > next_check_in_due
     
     # Check if in grace period
-    in_grace_period = False
-    grace_period_end = None
-    if user.notification_sent_at:
-        grace_period_end = user.notification_sent_at + timedelta(days=user.grace_period_days)
-        in_grace_period = current_time < grace_period_end
+    grace_period_end = user.grace_deadline
+    in_grace_period = grace_period_end is not None and current_time < grace_period_end
     
     return JsonResponse({
         'last_check_in': user.last_check_in.isoformat(),
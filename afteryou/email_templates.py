@@ -0,0 +1,71 @@
+"""
+Cached email template rendering shared by all email services.
+Each template is compiled once per process and reused for every message, and
+plain-text parts come from their own .txt templates instead of strip_tags.
+"""
+import logging
+import threading
+from django.template import TemplateDoesNotExist, engines
+from django.template.loader import get_template
+
+logger = logging.getLogger(__name__)
+
+
+class EmailTemplateRenderer:
+    """Per-process cache of compiled email templates."""
+
+    def __init__(self):
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def get_template(self, template_name, fallback_source=None):
+        """
+        Return the compiled template, loading it on first use.
+
+        Args:
+            template_name: Template path, e.g. 'emails/check_in_reminder.html'
+            fallback_source: Template source compiled instead if the file doesn't exist
+
+        Returns:
+            Compiled Django template
+        """
+        template = self._templates.get(template_name)
+        if template is not None:
+            return template
+
+        try:
+            template = get_template(template_name)
+        except TemplateDoesNotExist:
+            if fallback_source is None:
+                raise
+            logger.info(f"Template {template_name} not found, using built-in fallback")
+            template = engines['django'].from_string(fallback_source)
+
+        with self._lock:
+            # Another thread may have compiled it meanwhile; keep the first one
+            return self._templates.setdefault(template_name, template)
+
+    def render(self, template_name, context, fallback_source=None):
+        """Render a cached template with the given context dict."""
+        return self.get_template(template_name, fallback_source).render(context)
+
+    def render_email(self, html_template_name, text_template_name, context):
+        """
+        Render the HTML and plain-text parts of an email.
+
+        Returns:
+            Tuple of (html_message, plain_message)
+        """
+        return (
+            self.render(html_template_name, context),
+            self.render(text_template_name, context),
+        )
+
+    def clear(self):
+        """Drop all compiled templates (e.g. after editing templates in development)."""
+        with self._lock:
+            self._templates.clear()
+
+
+# Singleton instance
+renderer = EmailTemplateRenderer()
@@ -11,11 +11,19 @@ from qstash import QStash
 class QStashService:
     """Wrapper for QStash client with helper methods for task publishing."""
     
+    # Most messages the batch endpoint accepts per request
+    BATCH_LIMIT = 100
+    
     def __init__(self):
-        self.client = QStash(config('QSTASH_TOKEN'))
+        # QSTASH_URL points the client at a local stand-in instead of Upstash
+        base_url = config('QSTASH_URL', default='')
+        if base_url:
+            self.client = QStash(config('QSTASH_TOKEN', default='local'), base_url=base_url)
+        else:
+            self.client = QStash(config('QSTASH_TOKEN'))
         self.backend_url = config('BACKEND_URL', default='http://localhost:8000')
     
-    def publish_task(self, task_name, payload=None, delay_seconds=0):
+    def publish_task(self, task_name, payload=None, delay_seconds=0, deduplication_id=None):
         """
         Publish a task to QStash for immediate or delayed execution.
         
@@ -23,6 +31,7 @@ class QStashService:
             task_name: Name of the task (corresponds to URL endpoint)
             payload: Dictionary of data to send to the task
             delay_seconds: Optional delay before execution
+            deduplication_id: Optional ID; QStash drops later publishes with the same ID
         
         Returns:
             Response from QStash with message ID
@@ -37,15 +46,66 @@ class QStashService:
         
         if delay_seconds > 0:
             params["delay"] = f"{delay_seconds}s"
+        if deduplication_id:
+            params["deduplication_id"] = deduplication_id
         
         try:
             response = self.client.message.publish(**params)
-            print(f"✓ Task '{task_name}' published to QStash. Message ID: {response['messageId']}")
+            print(f"✓ Task '{task_name}' published to QStash. Message ID: {self._message_id(response)}")
             return response
         except Exception as e:
             print(f"✗ Failed to publish task '{task_name}': {str(e)}")
             raise
     
+    def publish_batch(self, tasks):
+        """
+        Publish many tasks with the batch API, up to BATCH_LIMIT per request.
+        
+        Args:
+            tasks: List of dicts with 'task_name' and optionally 'payload',
+                'not_before' (Unix timestamp) and 'deduplication_id'
+        
+        Returns:
+            List of QStash message IDs, in the same order as tasks
+        """
+        message_ids = []
+        for start in range(0, len(tasks), self.BATCH_LIMIT):
+            requests = []
+            for task in tasks[start:start + self.BATCH_LIMIT]:
+                request = {
+                    "url": f"{self.backend_url}/api/tasks/{task['task_name']}/",
+                    "body": task.get('payload') or {},
+                }
+                if task.get('not_before'):
+                    request["not_before"] = int(task['not_before'])
+                if task.get('deduplication_id'):
+                    request["deduplication_id"] = task['deduplication_id']
+                requests.append(request)
+            
+            try:
+                responses = self.client.message.batch_json(requests)
+            except Exception as e:
+                print(f"✗ Failed to publish batch of {len(requests)} tasks: {str(e)}")
+                raise
+            message_ids.extend(self._message_id(response) for response in responses)
+        
+        return message_ids
+    
+    def cancel_message(self, message_id):
+        """Cancel a published message that has not been delivered yet."""
+        try:
+            self.client.message.cancel(message_id)
+            return True
+        except Exception as e:
+            print(f"✗ Failed to cancel message {message_id}: {str(e)}")
+            return False
+    
+    @staticmethod
+    def _message_id(response):
+        if isinstance(response, dict):
+            return response.get('messageId')
+        return getattr(response, 'message_id', None)
+    
     def schedule_recurring_task(self, task_name, cron_expression, payload=None):
         """
         Schedule a recurring task with cron expression.
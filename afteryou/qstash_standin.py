@@ -0,0 +1,305 @@
+"""
+Local stand-in for Upstash QStash.
+Implements the parts of the QStash v2 HTTP API this project uses (publish,
+batch, cancel, schedules) and calls the task endpoints itself, signed the way
+task_views.verify_qstash_signature expects, so the whole delayed-delivery
+flow can run offline. Start it with `python manage.py run_qstash_standin`
+and set QSTASH_URL to its address.
+"""
+import base64
+import hashlib
+import heapq
+import hmac
+import itertools
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRIES = 3
+DEDUPLICATION_WINDOW = 3600  # Seconds a deduplication ID is remembered
+FORWARD_PREFIX = 'upstash-forward-'
+
+
+def _parse_delay(value):
+    """Parse an Upstash-Delay header such as '30s', '5m', '2h' or '1d'"""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    value = value.strip()
+    if value and value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+def _cron_field_matches(field, value, low):
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/')
+            step = int(step)
+        if part == '*':
+            start, end = low, None
+        elif '-' in part:
+            start, end = (int(bound) for bound in part.split('-'))
+        else:
+            start = end = int(part)
+        if value >= start and (end is None or value <= end) and (value - start) % step == 0:
+            return True
+    return False
+
+
+def cron_matches(expression, moment):
+    """Whether a 5-field cron expression fires at the given UTC minute"""
+    minute, hour, day, month, weekday = expression.split()
+    return (
+        _cron_field_matches(minute, moment.minute, 0)
+        and _cron_field_matches(hour, moment.hour, 0)
+        and _cron_field_matches(day, moment.day, 1)
+        and _cron_field_matches(month, moment.month, 1)
+        and _cron_field_matches(weekday, (moment.weekday() + 1) % 7, 0)
+    )
+
+
+class QStashStandIn:
+    """In-memory QStash: delayed messages, deduplication, retries and cron schedules."""
+
+    def __init__(self, signing_key, concurrency=4):
+        self.signing_key = signing_key
+        self.messages = {}  # message ID -> message dict
+        self.schedules = {}  # schedule ID -> schedule dict
+        self._deduplication = {}  # deduplication ID -> (message ID, expires at)
+        self._due = []  # Heap of (deliver_at, sequence, message ID)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='qstash-standin')
+        self.running = False
+
+    def publish(self, destination, body, headers):
+        """Accept a message; returns (message ID, deduplicated)"""
+        headers = {name.lower(): value for name, value in headers.items()}
+        now = time.time()
+
+        deliver_at = now
+        if 'upstash-not-before' in headers:
+            deliver_at = float(headers['upstash-not-before'])
+        elif 'upstash-delay' in headers:
+            deliver_at = now + _parse_delay(headers['upstash-delay'])
+
+        with self._condition:
+            deduplication_id = headers.get('upstash-deduplication-id')
+            if deduplication_id:
+                existing = self._deduplication.get(deduplication_id)
+                if existing and existing[1] > now:
+                    return existing[0], True
+
+            message_id = f"msg_{uuid.uuid4().hex}"
+            forwarded = {
+                name[len(FORWARD_PREFIX):]: value for name, value in headers.items() if name.startswith(FORWARD_PREFIX)
+            }
+            if 'content-type' in headers:
+                forwarded.setdefault('content-type', headers['content-type'])
+            self.messages[message_id] = {
+                'messageId': message_id,
+                'url': destination,
+                'body': body,
+                'headers': forwarded,
+                'notBefore': int(deliver_at),
+                'state': 'CREATED',
+                'retried': 0,
+            }
+            if deduplication_id:
+                self._deduplication[deduplication_id] = (message_id, now + DEDUPLICATION_WINDOW)
+
+            self._push(deliver_at, message_id)
+
+        logger.info(f"Accepted {message_id} for {destination} at {datetime.fromtimestamp(deliver_at)}")
+        return message_id, False
+
+    def cancel(self, message_id):
+        with self._condition:
+            message = self.messages.get(message_id)
+            if message is None or message['state'] in ('DELIVERED', 'FAILED'):
+                return False
+            message['state'] = 'CANCELLED'
+            return True
+
+    def create_schedule(self, destination, cron, body, headers):
+        schedule_id = f"scd_{uuid.uuid4().hex}"
+        with self._condition:
+            self.schedules[schedule_id] = {
+                'scheduleId': schedule_id,
+                'cron': cron,
+                'destination': destination,
+                'body': body,
+                'headers': headers,
+                'createdAt': int(time.time() * 1000),
+            }
+        return schedule_id
+
+    def delete_schedule(self, schedule_id):
+        with self._condition:
+            return self.schedules.pop(schedule_id, None) is not None
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._dispatch_loop, name='qstash-standin-dispatch', daemon=True).start()
+        threading.Thread(target=self._cron_loop, name='qstash-standin-cron', daemon=True).start()
+
+    def stop(self):
+        with self._condition:
+            self.running = False
+            self._condition.notify_all()
+        self._executor.shutdown(wait=False)
+
+    def _push(self, deliver_at, message_id):
+        """Caller holds the condition"""
+        entry = (deliver_at, next(self._sequence), message_id)
+        heapq.heappush(self._due, entry)
+        if self._due[0] is entry:
+            self._condition.notify()
+
+    def _dispatch_loop(self):
+        with self._condition:
+            while self.running:
+                now = time.time()
+                while self._due and self._due[0][0] <= now:
+                    message_id = heapq.heappop(self._due)[2]
+                    if self.messages[message_id]['state'] != 'CANCELLED':
+                        self.messages[message_id]['state'] = 'ACTIVE'
+                        self._executor.submit(self._deliver, message_id)
+                timeout = self._due[0][0] - now if self._due else None
+                self._condition.wait(timeout)
+
+    def _deliver(self, message_id):
+        message = self.messages[message_id]
+        body = message['body']
+        signature = base64.b64encode(hmac.new(self.signing_key.encode(), body, hashlib.sha256).digest()).decode()
+        request = urllib.request.Request(message['url'], data=body, method='POST')
+        for name, value in message['headers'].items():
+            request.add_header(name, value)
+        request.add_header('Upstash-Signature', signature)
+        request.add_header('Upstash-Message-Id', message_id)
+        request.add_header('Upstash-Retried', str(message['retried']))
+
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except Exception as e:
+            logger.warning(f"Delivering {message_id} to {message['url']} failed: {str(e)}")
+            status = None
+
+        with self._condition:
+            if status is not None and 200 <= status < 300:
+                message['state'] = 'DELIVERED'
+                logger.info(f"Delivered {message_id} to {message['url']} ({status})")
+            elif message['retried'] < MAX_RETRIES:
+                message['retried'] += 1
+                message['state'] = 'RETRY'
+                self._push(time.time() + 2 ** message['retried'], message_id)
+                logger.warning(f"Retrying {message_id} (status {status}), attempt {message['retried']}")
+            else:
+                message['state'] = 'FAILED'
+                logger.error(f"Giving up on {message_id} after {MAX_RETRIES} retries")
+
+    def _cron_loop(self):
+        while self.running:
+            # Wake at the start of every minute
+            time.sleep(60 - time.time() % 60)
+            moment = datetime.now(dt_timezone.utc).replace(second=0, microsecond=0)
+            with self._condition:
+                schedules = list(self.schedules.values())
+            for schedule in schedules:
+                try:
+                    if cron_matches(schedule['cron'], moment):
+                        self.publish(schedule['destination'], schedule['body'], schedule['headers'])
+                except ValueError:
+                    logger.error(f"Invalid cron expression {schedule['cron']!r} in {schedule['scheduleId']}")
+
+
+class QStashRequestHandler(BaseHTTPRequestHandler):
+    """HTTP front end; ``server.qstash`` is the QStashStandIn"""
+
+    def do_POST(self):
+        qstash = self.server.qstash
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        headers = dict(self.headers.items())
+
+        if self.path.startswith('/v2/publish/'):
+            message_id, deduplicated = qstash.publish(self.path[len('/v2/publish/'):], body, headers)
+            response = {'messageId': message_id}
+            if deduplicated:
+                response['deduplicated'] = True
+            return self._json(201 if not deduplicated else 202, response)
+
+        if self.path == '/v2/batch':
+            responses = []
+            for item in json.loads(body or b'[]'):
+                item_body = item.get('body') or ''
+                if not isinstance(item_body, str):
+                    item_body = json.dumps(item_body)
+                message_id, deduplicated = qstash.publish(
+                    item['destination'], item_body.encode(), item.get('headers') or {}
+                )
+                responses.append({'messageId': message_id, 'deduplicated': deduplicated})
+            return self._json(201, responses)
+
+        if self.path.startswith('/v2/schedules/'):
+            cron = self.headers.get('Upstash-Cron')
+            if not cron:
+                return self._json(400, {'error': 'Upstash-Cron header is required'})
+            schedule_id = qstash.create_schedule(self.path[len('/v2/schedules/'):], cron, body, headers)
+            return self._json(201, {'scheduleId': schedule_id})
+
+        return self._json(404, {'error': f'Unsupported endpoint {self.path}'})
+
+    def do_GET(self):
+        qstash = self.server.qstash
+        if self.path.startswith('/v2/messages/'):
+            message = qstash.messages.get(self.path[len('/v2/messages/'):])
+            if message is None:
+                return self._json(404, {'error': 'message not found'})
+            return self._json(200, {key: value for key, value in message.items() if key != 'body'})
+        if self.path.rstrip('/') == '/v2/schedules':
+            return self._json(200, [
+                {key: value for key, value in schedule.items() if key not in ('body', 'headers')}
+                for schedule in qstash.schedules.values()
+            ])
+        return self._json(404, {'error': f'Unsupported endpoint {self.path}'})
+
+    def do_DELETE(self):
+        qstash = self.server.qstash
+        if self.path.startswith('/v2/messages/'):
+            if qstash.cancel(self.path[len('/v2/messages/'):]):
+                return self._json(202, {})
+            return self._json(404, {'error': 'message not found or already delivered'})
+        if self.path.startswith('/v2/schedules/'):
+            if qstash.delete_schedule(self.path[len('/v2/schedules/'):]):
+                return self._json(200, {})
+            return self._json(404, {'error': 'schedule not found'})
+        return self._json(404, {'error': f'Unsupported endpoint {self.path}'})
+
+    def _json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def make_server(host, port, signing_key):
+    server = ThreadingHTTPServer((host, port), QStashRequestHandler)
+    server.qstash = QStashStandIn(signing_key)
+    return server
@@ -248,6 +248,29 @@ EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = 'AfterYou Legacy <noreply@afteryou.com>'
 EMAIL_SUBJECT_PREFIX = '[AfterYou] '
 
+# Process-wide SMTP connection pool (afteryou/smtp_pool.py)
+SMTP_POOL_SETTINGS = {
+    'MAX_IDLE_CONNECTIONS': 4,  # Warm connections kept per worker process
+    'IDLE_TIMEOUT': 120,  # Close connections unused for 2 minutes
+    'HEALTH_CHECK_INTERVAL': 30,  # NOOP connections idle for more than 30 seconds before reuse
+    'MAX_MESSAGES_PER_CONNECTION': 100,
+}
+
+# Check-in reminder and final warning campaigns (accounts/reminder_campaign.py)
+REMINDER_CAMPAIGN_SETTINGS = {
+    'CONCURRENCY': config('REMINDER_CAMPAIGN_CONCURRENCY', default=4, cast=int),  # Parallel SMTP senders
+    'BATCH_SIZE': 200,  # Users rendered per batch
+    'CHUNK_SIZE': 25,  # Emails handed to each sender thread at a time
+    'FINAL_WARNING_DAYS': 3,  # Send the final warning this many days before the grace period ends
+}
+
+# Sharded dead man's switch sweeps (accounts/sweeps.py)
+INACTIVITY_SWEEP_SETTINGS = {
+    'LEASE_SECONDS': 120,  # A node's shard lease, renewed after every chunk
+    'RESWEEP_AFTER': 3600,  # --shards skips shards another node finished within this many seconds
+    'CHUNK_SIZE': 5000,  # Users evaluated per chunk
+}
+
 # Django-RQ Configuration
 # RQ_QUEUES = {
 #     'default': {
@@ -308,7 +331,33 @@ RQ_SHOW_ADMIN_LINK = True
 LEGACY_MESSAGE_SETTINGS = {
     'DELIVERY_CHECK_INTERVAL': 300,  # Check every 5 minutes
     'MAX_RETRY_ATTEMPTS': 3,
-    'RETRY_DELAY': 3600,  # 1 hour between retries
+    'RETRY_DELAY': 3600,  # 1 hour before the first retry, doubling after each failure
+    'RETRY_MAX_DELAY': 86400,  # Backoff never waits longer than a day
+    'DELIVERY_BATCH_SIZE': 100,  # Messages sent per SMTP connection chunk
+    'DELIVERY_CONCURRENCY': config('DELIVERY_CONCURRENCY', default=8, cast=int),  # Parallel SMTP senders
+    'DELIVERY_CHUNK_SIZE': 25,  # Messages handed to each sender thread at a time
+    'DELIVERY_CLAIM_BATCH_SIZE': 500,  # Messages claimed per lease round
+    'DELIVERY_FETCH_BATCH_SIZE': 100,  # Documents per MongoDB cursor batch
+    'DELIVERY_LEASE_SECONDS': 600,  # Claimed messages are reclaimable after this
+    'DEFAULT_DOMAIN_RATE': 20,  # Messages per second to any single recipient domain, per worker process
+    'DOMAIN_RATE_LIMITS': {  # Stricter per-second limits for the big providers, per worker process
+        'gmail.com': 10,
+        'googlemail.com': 10,
+        'outlook.com': 5,
+        'hotmail.com': 5,
+        'live.com': 5,
+        'yahoo.com': 5,
+    },
+    'QUEUE_STATUS_TTL': 5,  # Seconds the cached Redis queue status is served before refreshing
+    'QUEUE_STATUS_CLEANUP_INTERVAL': 60,  # Seconds between prunes of dead workers and expired failed jobs
+    'SIMPLE_QUEUE_WORKERS': 4,  # Worker threads of the in-memory fallback queue
+    'SIMPLE_QUEUE_JOURNAL': config('SIMPLE_QUEUE_JOURNAL', default=str(BASE_DIR / 'simple_tasks_journal.sqlite3')),  # Empty disables; processes sharing it each replay only the tasks of stopped ones
+    'SIMPLE_QUEUE_JOURNAL_COMPACT_THRESHOLD': 10000,  # Journal records between compactions
+    'WORKER_SAMPLE_INTERVAL': 5,  # Seconds between queue samples of the worker supervisor
+    'WORKER_JOBS_PER_WORKER': 50,  # Queued jobs per supervised worker before scaling up
+    'WORKER_TARGET_LATENCY': 30,  # Add a worker while the oldest queued job has waited longer (seconds)
+    'WORKER_SCALE_DOWN_SAMPLES': 6,  # Consecutive low samples before removing a worker
+    'WORKER_DRAIN_TIMEOUT': 600,  # Seconds workers get to finish in-flight jobs on shutdown
 }
 
 
@@ -318,6 +367,9 @@ QSTASH_TOKEN = config('QSTASH_TOKEN', default='')
 QSTASH_CURRENT_SIGNING_KEY = config('QSTASH_CURRENT_SIGNING_KEY', default='')
 QSTASH_NEXT_SIGNING_KEY = config('QSTASH_NEXT_SIGNING_KEY', default='')
 BACKEND_URL = config('BACKEND_URL', default='http://localhost:8000')
+QSTASH_URL = config('QSTASH_URL', default='')  # e.g. http://localhost:8080 for `manage.py run_qstash_standin`
+QSTASH_PER_MESSAGE_DELIVERY = config('QSTASH_PER_MESSAGE_DELIVERY', default=False, cast=bool)  # Exact-time delivery per message
+QSTASH_TASK_TIME_BUDGET = config('QSTASH_TASK_TIME_BUDGET', default=25, cast=int)  # Seconds a chunked task works before continuing in a new request
 
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = '/static/'
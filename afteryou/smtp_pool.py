@@ -0,0 +1,211 @@
+"""
+Process-wide pool of authenticated SMTP connections.
+Workers keep a few connections open between jobs, so sending an email does
+not pay for the TCP/TLS handshake and AUTH every time.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from smtplib import SMTPServerDisconnected
+from django.conf import settings
+from django.core.mail import get_connection
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SETTINGS = {
+    'MAX_IDLE_CONNECTIONS': 4,  # Warm connections kept per backend configuration
+    'IDLE_TIMEOUT': 120,  # Close connections unused for this many seconds
+    'HEALTH_CHECK_INTERVAL': 30,  # NOOP a connection idle for longer than this before reuse
+    'MAX_MESSAGES_PER_CONNECTION': 100,  # Recycle connections after this many messages
+}
+
+
+def _pool_setting(name):
+    return getattr(settings, 'SMTP_POOL_SETTINGS', {}).get(name, DEFAULT_POOL_SETTINGS[name])
+
+
+def _backend_key():
+    """Connections are only shared between identical backend configurations."""
+    return (
+        settings.EMAIL_BACKEND,
+        getattr(settings, 'EMAIL_HOST', None),
+        getattr(settings, 'EMAIL_PORT', None),
+        getattr(settings, 'EMAIL_HOST_USER', None),
+        getattr(settings, 'EMAIL_USE_TLS', False),
+        getattr(settings, 'EMAIL_USE_SSL', False),
+    )
+
+
+class PooledConnection:
+    """
+    Email backend checked out of the pool.
+
+    Behaves like a Django email backend (open, close, send_messages), so it
+    can be passed as ``connection=`` to EmailMessage, and counts the messages
+    it sends so the pool can recycle it.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.backend = get_connection(fail_silently=False)
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+
+    def open(self):
+        return self.backend.open()
+
+    def close(self):
+        self.backend.close()
+
+    def send_messages(self, email_messages):
+        if self.messages_sent >= _pool_setting('MAX_MESSAGES_PER_CONNECTION'):
+            # Long batches recycle the connection in place
+            self.close()
+            self.open()
+            self.messages_sent = 0
+        sent = self.backend.send_messages(email_messages)
+        self.messages_sent += sent or 0
+        self.last_used = time.monotonic()
+        return sent
+
+    @property
+    def is_open(self):
+        # Non-SMTP backends (console, locmem) have no connection to lose
+        return getattr(self.backend, 'connection', True) is not None
+
+    def is_healthy(self):
+        """Check a connection that sat idle with an SMTP NOOP."""
+        smtp = getattr(self.backend, 'connection', None)
+        if smtp is None:
+            return self.is_open
+        try:
+            return smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+
+def send_with_reconnect(connection, email):
+    """
+    Send one email on an open connection
+
+    A pooled connection may have been closed by the server while it sat
+    idle; it is then reopened and the email sent once more.
+
+    Returns:
+        int: Number of emails the backend reports as sent
+    """
+    try:
+        return connection.send_messages([email])
+    except SMTPServerDisconnected:
+        logger.warning("SMTP server closed the connection, reconnecting...")
+        connection.close()
+        connection.open()
+        return connection.send_messages([email])
+
+
+class SMTPConnectionPool:
+    """Thread-safe pool of open SMTP connections, keyed by backend settings."""
+
+    def __init__(self):
+        self._idle = {}  # backend key -> list of PooledConnection, most recently used last
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out an open connection for the duration of the block.
+
+        Usage:
+            with smtp_pool.connection() as connection:
+                connection.send_messages([email])
+
+        The connection goes back to the pool afterwards unless the block
+        raised, the server dropped it, or it reached its message limit.
+        """
+        pooled = self.acquire()
+        try:
+            yield pooled
+        except Exception:
+            self.discard(pooled)
+            raise
+        self.release(pooled)
+
+    def acquire(self):
+        key = _backend_key()
+        now = time.monotonic()
+
+        with self._lock:
+            self._check_fork()
+            idle = self._idle.get(key, [])
+            pooled = idle.pop() if idle else None
+
+        while pooled is not None:
+            if now - pooled.last_used > _pool_setting('IDLE_TIMEOUT'):
+                self.discard(pooled)
+            elif now - pooled.last_used > _pool_setting('HEALTH_CHECK_INTERVAL') and not pooled.is_healthy():
+                logger.info("Dropping pooled SMTP connection that failed its health check")
+                self.discard(pooled)
+            else:
+                return pooled
+
+            with self._lock:
+                idle = self._idle.get(key, [])
+                pooled = idle.pop() if idle else None
+
+        pooled = PooledConnection(key)
+        pooled.open()
+        return pooled
+
+    def release(self, pooled):
+        if not pooled.is_open or pooled.messages_sent >= _pool_setting('MAX_MESSAGES_PER_CONNECTION'):
+            self.discard(pooled)
+            return
+
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            self._check_fork()
+            idle = self._idle.setdefault(pooled.key, [])
+            if pooled.key == _backend_key() and len(idle) < _pool_setting('MAX_IDLE_CONNECTIONS'):
+                idle.append(pooled)
+                return
+
+        self.discard(pooled)
+
+    def discard(self, pooled):
+        try:
+            pooled.close()
+        except Exception as e:
+            logger.debug(f"Error closing SMTP connection: {str(e)}")
+
+    def warm(self, count=1):
+        """Open connections ahead of the first job (best effort)."""
+        connections = []
+        try:
+            for _ in range(count):
+                connections.append(self.acquire())
+        except Exception as e:
+            logger.warning(f"Could not pre-open SMTP connections: {str(e)}")
+        for pooled in connections:
+            self.release(pooled)
+        return len(connections)
+
+    def close_all(self):
+        with self._lock:
+            pooled_connections = [pooled for idle in self._idle.values() for pooled in idle]
+            self._idle.clear()
+        for pooled in pooled_connections:
+            self.discard(pooled)
+
+    def _check_fork(self):
+        # A forked child must not talk over its parent's sockets; forget them
+        # without sending QUIT. Caller holds the lock.
+        if self._pid != os.getpid():
+            self._idle = {}
+            self._pid = os.getpid()
+
+
+# Singleton instance
+smtp_pool = SMTPConnectionPool()
@@ -0,0 +1,65 @@
+"""
+Chunked, self-continuing QStash tasks.
+A long task processes work in chunks until its time budget runs out, then
+publishes itself again with a cursor saying where to pick up, so no single
+request runs into gunicorn or QStash timeouts however large the data set.
+"""
+import logging
+import time
+import uuid
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIME_BUDGET = 25  # Seconds of work per invocation
+
+
+def run_with_continuation(task_name, payload, step, time_budget=None):
+    """
+    Run chunks of a task until it is done or the time budget is spent.
+
+    Args:
+        task_name: Registered task name, used to republish the continuation
+        payload: Task payload; continuations carry 'run_id', 'cursor',
+            'chunk' and the running 'totals'
+        step: Callable taking the cursor and returning
+            (next cursor, dict of counters, done). Each chunk must be
+            idempotent: a retried invocation repeats its chunks from the
+            same cursor.
+        time_budget: Seconds per invocation, defaults to QSTASH_TASK_TIME_BUDGET
+
+    Returns:
+        dict: Counters summed over the whole run so far, the run ID, the
+        number of chunks and whether the run is done
+    """
+    if time_budget is None:
+        time_budget = getattr(settings, 'QSTASH_TASK_TIME_BUDGET', DEFAULT_TIME_BUDGET)
+    deadline = time.monotonic() + time_budget
+
+    run_id = payload.get('run_id') or uuid.uuid4().hex
+    cursor = payload.get('cursor')
+    chunk = payload.get('chunk', 0)
+    totals = dict(payload.get('totals') or {})
+
+    while True:
+        cursor, counters, done = step(cursor)
+        chunk += 1
+        for key, value in counters.items():
+            totals[key] = totals.get(key, 0) + value
+
+        if done:
+            logger.info(f"Task '{task_name}' run {run_id} finished after {chunk} chunks: {totals}")
+            return {'run_id': run_id, 'chunks': chunk, 'done': True, **totals}
+        if time.monotonic() >= deadline:
+            break
+
+    # The deduplication ID is fixed by the run and chunk number, so a retried
+    # invocation that reaches the same point does not fork a second run
+    from afteryou.qstash_service import qstash
+    qstash.publish_task(
+        task_name,
+        {'run_id': run_id, 'cursor': cursor, 'chunk': chunk, 'totals': totals},
+        deduplication_id=f"{task_name}.{run_id}.{chunk}"
+    )
+    logger.info(f"Task '{task_name}' run {run_id} continues after chunk {chunk} from cursor {cursor!r}")
+    return {'run_id': run_id, 'chunks': chunk, 'done': False, 'cursor': cursor, **totals}
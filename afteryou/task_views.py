@@ -1,16 +1,47 @@
 """
 QStash Task Endpoints
-These views receive HTTP requests from QStash and execute background tasks.
-All endpoints must verify QStash signature for security.
+A single dispatcher receives HTTP requests from QStash at /api/tasks/<name>/
+and runs the registered task.
+All requests must carry a valid QStash signature.
 """
 import json
 import hashlib
 import hmac
 import base64
+import logging
+from functools import lru_cache
+import django_rq
+import redis
+from django.conf import settings
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from decouple import config
+
+logger = logging.getLogger(__name__)
+
+# How long a delivered Upstash-Message-Id is remembered to drop redeliveries
+DEDUPLICATION_TTL = 3600
+# How long a running message blocks its redeliveries, should its process die
+RUNNING_TTL = 300
+
+# Task name -> handler taking the JSON payload
+TASK_REGISTRY = {}
+
+
+def register_task(name):
+    """Register a handler for /api/tasks/<name>/"""
+    def decorator(func):
+        TASK_REGISTRY[name] = func
+        return func
+    return decorator
+
+
+@lru_cache(maxsize=1)
+def _signing_keys():
+    """Signing keys are read once per process instead of on every request."""
+    return tuple(
+        key.encode() for key in (settings.QSTASH_CURRENT_SIGNING_KEY, settings.QSTASH_NEXT_SIGNING_KEY) if key
+    )
 
 
 def verify_qstash_signature(request):
@@ -21,162 +52,147 @@ def verify_qstash_signature(request):
     signature = request.headers.get('Upstash-Signature')
     if not signature:
         return False
-    
-    current_signing_key = config('QSTASH_CURRENT_SIGNING_KEY')
-    next_signing_key = config('QSTASH_NEXT_SIGNING_KEY', default='')
-    
+
     body = request.body
-    
-    # Try current signing key
-    expected_sig = base64.b64encode(
-        hmac.new(
-            current_signing_key.encode(),
-            body,
-            hashlib.sha256
-        ).digest()
-    ).decode()
-    
-    if signature == expected_sig:
-        return True
-    
-    # Try next signing key (for key rotation)
-    if next_signing_key:
-        expected_sig_next = base64.b64encode(
-            hmac.new(
-                next_signing_key.encode(),
-                body,
-                hashlib.sha256
-            ).digest()
-        ).decode()
-        
-        if signature == expected_sig_next:
+
+    # Current key first, then the next one (for key rotation)
+    for signing_key in _signing_keys():
+        expected_sig = base64.b64encode(hmac.new(signing_key, body, hashlib.sha256).digest()).decode()
+        if hmac.compare_digest(signature, expected_sig):
             return True
-    
+
     return False
 
 
-@csrf_exempt
-@require_http_methods(["POST"])
-def send_check_in_reminders_task(request):
-    """Task: Send check-in reminder emails to users."""
-    if not verify_qstash_signature(request):
-        return JsonResponse({'error': 'Invalid signature'}, status=401)
-    
+def _delivery_key(message_id):
+    return f'qstash:delivered:{message_id}'
+
+
+def _mark_delivery(message_id, state, ttl, only_new=False):
+    """
+    Record the state of a QStash message in Redis
+
+    With only_new, the state is only set if the message has none yet
+    (SET NX) and the existing state is returned instead. Returns None when
+    the state was set, or when Redis is unavailable: tasks are idempotent,
+    so a redelivery then runs again rather than being lost.
+    """
     try:
-        # Import here to avoid circular imports
-        from accounts.tasks import send_check_in_reminders
-        
-        # Execute the task
-        result = send_check_in_reminders()
-        
-        return JsonResponse({
-            'status': 'success',
-            'message': 'Check-in reminders sent',
-            'result': result
-        })
-    except Exception as e:
-        return JsonResponse({
-            'status': 'error',
-            'message': str(e)
-        }, status=500)
+        conn = django_rq.get_connection('default')
+        if conn.set(_delivery_key(message_id), state, nx=only_new, ex=ttl):
+            return None
+        existing = conn.get(_delivery_key(message_id))
+    except redis.RedisError as e:
+        logger.warning(f"Could not record QStash message {message_id} as {state}: {e}")
+        return None
+    # The marker may have expired in between; treat it as still running so QStash retries
+    return existing.decode() if existing else 'running'
 
 
-@csrf_exempt
-@require_http_methods(["POST"])
-def process_scheduled_messages_task(request):
-    """Task: Process and send scheduled legacy messages."""
-    if not verify_qstash_signature(request):
-        return JsonResponse({'error': 'Invalid signature'}, status=401)
-    
+def _clear_delivery(message_id):
     try:
-        # Import here to avoid circular imports
-        from legacy.tasks import process_scheduled_messages
-        
-        # Execute the task
-        result = process_scheduled_messages()
-        
-        return JsonResponse({
-            'status': 'success',
-            'message': 'Scheduled messages processed',
-            'result': result
-        })
-    except Exception as e:
-        return JsonResponse({
-            'status': 'error',
-            'message': str(e)
-        }, status=500)
+        django_rq.get_connection('default').delete(_delivery_key(message_id))
+    except redis.RedisError as e:
+        logger.warning(f"Could not clear QStash message {message_id}: {e}")
 
 
 @csrf_exempt
 @require_http_methods(["POST"])
-def send_final_warnings_task(request):
-    """Task: Send final warning emails to inactive users."""
+def dispatch_task(request, task_name):
+    """
+    Run a registered task for a QStash request.
+
+    The task runs within the request and its outcome is the response: a
+    failure answers 500, so QStash retries the message with its backoff and
+    moves it to its dead-letter queue once retries run out. Long tasks stay
+    within QStash's request timeout by working in time-budgeted chunks
+    (afteryou/task_continuation.py).
+
+    A redelivery of a message that already completed (same
+    Upstash-Message-Id) is acknowledged without running the task again; one
+    arriving while the task still runs gets 409, so QStash tries it again
+    later instead of dropping it. The markers live in Redis, so they hold
+    across workers, instances and restarts.
+    """
     if not verify_qstash_signature(request):
         return JsonResponse({'error': 'Invalid signature'}, status=401)
-    
+
+    handler = TASK_REGISTRY.get(task_name)
+    if handler is None:
+        return JsonResponse({'error': f'Unknown task: {task_name}'}, status=404)
+
     try:
-        # Import here to avoid circular imports
-        from accounts.tasks import send_final_warnings
-        
-        # Execute the task
-        result = send_final_warnings()
-        
-        return JsonResponse({
-            'status': 'success',
-            'message': 'Final warnings sent',
-            'result': result
-        })
-    except Exception as e:
-        return JsonResponse({
-            'status': 'error',
-            'message': str(e)
-        }, status=500)
+        payload = json.loads(request.body) if request.body else {}
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON body'}, status=400)
 
+    message_id = request.headers.get('Upstash-Message-Id')
+    state = _mark_delivery(message_id, 'running', RUNNING_TTL, only_new=True) if message_id else None
+    if state == 'running':
+        return JsonResponse({'status': 'running', 'task': task_name, 'message_id': message_id}, status=409)
+    if state == 'done':
+        logger.info(f"Ignoring redelivery of {message_id} for task '{task_name}'")
+        return JsonResponse({'status': 'duplicate', 'task': task_name, 'message_id': message_id})
 
-@csrf_exempt
-@require_http_methods(["POST"])
-def process_inactive_users_task(request):
-    """Task: Process users who have been inactive beyond grace period."""
-    if not verify_qstash_signature(request):
-        return JsonResponse({'error': 'Invalid signature'}, status=401)
-    
     try:
-        # Import here to avoid circular imports
-        from accounts.tasks import process_inactive_users
-        
-        # Execute the task
-        result = process_inactive_users()
-        
-        return JsonResponse({
-            'status': 'success',
-            'message': 'Inactive users processed',
-            'result': result
-        })
+        result = handler(payload)
     except Exception as e:
-        return JsonResponse({
-            'status': 'error',
-            'message': str(e)
-        }, status=500)
+        logger.error(f"Task '{task_name}' ({message_id}) failed: {str(e)}")
+        if message_id:
+            _clear_delivery(message_id)
+        return JsonResponse({'status': 'error', 'task': task_name, 'message': str(e)}, status=500)
 
+    if message_id:
+        _mark_delivery(message_id, 'done', DEDUPLICATION_TTL)
+    logger.info(f"Task '{task_name}' ({message_id}) completed: {result}")
+    return JsonResponse({'status': 'success', 'task': task_name, 'result': result})
 
-@csrf_exempt
-@require_http_methods(["POST"])
-def test_task(request):
+
+# Registered tasks. Imports happen inside the handlers to avoid circular imports.
+
+@register_task('send_check_in_reminders')
+def send_check_in_reminders_task(payload):
+    """Task: Send check-in reminder emails to users, continuing in chunks."""
+    from accounts.inactivity import send_check_in_reminders
+    return send_check_in_reminders(payload)
+
+
+@register_task('process_scheduled_messages')
+def process_scheduled_messages_task(payload):
+    """Task: Process and send scheduled legacy messages, continuing in chunks."""
+    from legacy.tasks import process_scheduled_messages
+    return process_scheduled_messages(payload)
+
+
+@register_task('send_final_warnings')
+def send_final_warnings_task(payload):
+    """Task: Send final warning emails to inactive users, continuing in chunks."""
+    from accounts.inactivity import send_final_warnings
+    return send_final_warnings(payload)
+
+
+@register_task('process_inactive_users')
+def process_inactive_users_task(payload):
+    """Task: Process users who have been inactive beyond grace period, continuing in chunks."""
+    from accounts.inactivity import process_inactive_users
+    return process_inactive_users(payload)
+
+
+@register_task('deliver_message')
+def deliver_message_task(payload):
+    """Task: Deliver one legacy message at its exact delivery time."""
+    from legacy.email_service import LegacyEmailService
+
+    message_id = payload.get('message_id')
+    if not message_id:
+        raise ValueError('message_id is required')
+
+    # Only a scheduled message that is due gets sent, so stale or duplicate
+    # publishes (after edits or retries) are no-ops
+    return LegacyEmailService.send_legacy_message(message_id, due_only=True)
+
+
+@register_task('test')
+def test_task(payload):
     """Test endpoint to verify QStash integration."""
-    if not verify_qstash_signature(request):
-        return JsonResponse({'error': 'Invalid signature'}, status=401)
-    
-    try:
-        data = json.loads(request.body)
-        message = data.get('message', 'No message provided')
-        
-        return JsonResponse({
-            'status': 'success',
-            'message': f'Test task received: {message}',
-            'timestamp': str(request.META.get('HTTP_UPSTASH_MESSAGE_ID', 'unknown'))
-        })
-    except Exception as e:
-        return JsonResponse({
-            'status': 'error',
-            'message': str(e)
-        }, status=500)
+    return f"Test task received: {payload.get('message', 'No message provided')}"
@@ -0,0 +1,103 @@
+import os
+from smtplib import SMTPServerDisconnected
+from unittest import mock
+from django.test import RequestFactory, SimpleTestCase
+from qstash.message import PublishResponse
+from . import task_views
+from .smtp_pool import send_with_reconnect
+from .task_continuation import run_with_continuation
+
+# The QStash client is created at import; tests never reach Upstash
+os.environ.setdefault('QSTASH_TOKEN', 'test-token')
+from .qstash_service import qstash  # noqa: E402
+
+
+class ContinuationTests(SimpleTestCase):
+    def test_run_past_its_time_budget_publishes_a_continuation(self):
+        publish = mock.Mock(return_value=PublishResponse(message_id='msg_1', deduplicated=False))
+
+        with mock.patch.object(qstash.client.message, 'publish', publish):
+            result = run_with_continuation(
+                'process_inactive_users', {}, lambda cursor: ((cursor or 0) + 1, {'checked': 10}, False), time_budget=0
+            )
+
+        self.assertEqual(result['done'], False)
+        self.assertEqual((result['cursor'], result['chunks'], result['checked']), (1, 1, 10))
+        publish.assert_called_once()
+        params = publish.call_args.kwargs
+        self.assertTrue(params['url'].endswith('/api/tasks/process_inactive_users/'))
+        self.assertEqual(params['deduplication_id'], f"process_inactive_users.{result['run_id']}.1")
+
+    def test_finished_run_publishes_nothing(self):
+        with mock.patch.object(qstash.client.message, 'publish') as publish:
+            result = run_with_continuation('process_inactive_users', {}, lambda cursor: (None, {'checked': 3}, True))
+
+        self.assertEqual((result['done'], result['checked']), (True, 3))
+        publish.assert_not_called()
+
+
+class FakeRedis:
+    """The few Redis commands the delivery markers use, shared like a real server"""
+    def __init__(self):
+        self.values = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value.encode()
+        return True
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+class DispatchTaskTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.handler = mock.Mock(return_value={'checked': 1})
+        for patcher in (
+            mock.patch('django_rq.get_connection', return_value=self.redis),
+            mock.patch.object(task_views, 'verify_qstash_signature', return_value=True),
+            mock.patch.dict(task_views.TASK_REGISTRY, {'sweep': self.handler}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def deliver(self, message_id='msg_1'):
+        request = RequestFactory().post(
+            '/api/tasks/sweep/', data='{}', content_type='application/json', headers={'Upstash-Message-Id': message_id}
+        )
+        return task_views.dispatch_task(request, 'sweep')
+
+    def test_redelivery_of_a_completed_message_does_not_run_again(self):
+        self.assertEqual(self.deliver().status_code, 200)
+        self.assertEqual(self.deliver().status_code, 200)
+
+        self.handler.assert_called_once()
+
+    def test_redelivery_while_running_is_refused(self):
+        self.redis.set('qstash:delivered:msg_1', 'running')
+
+        self.assertEqual(self.deliver().status_code, 409)
+        self.handler.assert_not_called()
+
+    def test_failed_message_runs_again_on_redelivery(self):
+        self.handler.side_effect = [RuntimeError('boom'), {'checked': 1}]
+
+        self.assertEqual(self.deliver().status_code, 500)
+        self.assertEqual(self.deliver().status_code, 200)
+        self.assertEqual(self.handler.call_count, 2)
+
+
+class SendWithReconnectTests(SimpleTestCase):
+    def test_dropped_connection_is_reopened_and_the_email_sent_once_more(self):
+        connection = mock.Mock()
+        connection.send_messages.side_effect = [SMTPServerDisconnected('idle timeout'), 1]
+
+        self.assertEqual(send_with_reconnect(connection, 'email'), 1)
+        connection.close.assert_called_once()
+        connection.open.assert_called_once()
+        self.assertEqual(connection.send_messages.call_count, 2)
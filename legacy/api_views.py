@@ -53,12 +53,14 @@ import logging
 from .models import LegacyMessage
 from .serializers import LegacyMessageSerializer, LegacyMessageCreateSerializer, UserSerializer
 from .email_service import LegacyEmailService
+from .timing_wheel import publish_schedule_change
+from .qstash_delivery import qstash_deliveries, qstash_delivery_enabled
 # Try to import Redis-based tasks first, fallback to simple tasks
 try:
-    from .tasks import schedule_message_delivery, enqueue_immediate_delivery, get_redis_status
+    from .tasks import schedule_message_delivery, enqueue_immediate_delivery, cancel_message_delivery, get_redis_status
     REDIS_AVAILABLE = True
 except ImportError:
-    from .simple_tasks import schedule_message_delivery, enqueue_immediate_delivery
+    from .simple_tasks import schedule_message_delivery, enqueue_immediate_delivery, cancel_message_delivery
     REDIS_AVAILABLE = False
     
     def get_redis_status():
@@ -106,6 +108,7 @@ class LegacyMessageListCreateView(generics.ListCreateAPIView):
                 job_id = schedule_message_delivery(str(message.id), message.delivery_date)
                 if job_id:
                     message.job_id = job_id
+                    message.save()
                     logger.info(f"Scheduled message {message.id} for delivery at {message.delivery_date}")
                 else:
                     logger.warning(f"Failed to schedule background task for message {message.id}")
@@ -113,6 +116,11 @@ class LegacyMessageListCreateView(generics.ListCreateAPIView):
                 logger.error(f"Error scheduling message {message.id}: {str(e)}")
                 message.status = 'created'
                 message.save()
+            
+            # Let a running exact-time scheduler pick it up without a rescan
+            publish_schedule_change(message)
+            if message.status == 'scheduled' and qstash_delivery_enabled():
+                qstash_deliveries.publish(message)
         else:
             # Queue for immediate delivery
             message.status = 'created'
@@ -146,6 +154,30 @@ class LegacyMessageDetailView(generics.RetrieveUpdateDestroyAPIView):
         except LegacyMessage.DoesNotExist:
             from rest_framework.exceptions import NotFound
             raise NotFound('Message not found')
+    
+    def perform_update(self, serializer):
+        previous_delivery_date = serializer.instance.delivery_date
+        message = serializer.save()
+        if message.status == 'scheduled':
+            if message.delivery_date != previous_delivery_date:
+                # Move the delivery job instead of leaving the old one to fire
+                if message.job_id:
+                    cancel_message_delivery(message.job_id)
+                job_id = schedule_message_delivery(str(message.id), message.delivery_date)
+                if job_id:
+                    message.job_id = job_id
+                    message.save()
+                if qstash_delivery_enabled():
+                    qstash_deliveries.publish(message)
+            publish_schedule_change(message)
+    
+    def perform_destroy(self, instance):
+        if instance.status == 'scheduled' and instance.job_id:
+            cancel_message_delivery(instance.job_id)
+        if instance.status == 'scheduled' and qstash_delivery_enabled():
+            qstash_deliveries.cancel(instance)
+        instance.delete()
+        publish_schedule_change(instance, cancelled=True)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -196,11 +228,8 @@ def job_status(request, job_id):
             job_info = get_job_status(job_id)
             return Response(job_info)
         else:
-            return Response({
-                'job_id': job_id,
-                'status': 'unknown',
-                'message': 'Redis not available - using fallback system'
-            })
+            from .simple_tasks import get_job_status
+            return Response(get_job_status(job_id))
     except Exception as e:
         return Response({
             'error': str(e),
@@ -0,0 +1,149 @@
+"""
+Concurrent delivery engine for legacy messages
+Sends due messages on a bounded thread pool with per-domain rate limits.
+Rate limits are shared by every DeliveryPool of a worker process, not
+coordinated between processes: N workers may together send up to N times
+a domain's limit.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from django.conf import settings
+from .email_service import LegacyEmailService
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_CHUNK_SIZE = 25
+DEFAULT_DOMAIN_RATE = 20  # messages per second for domains without an explicit limit
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at a fixed rate
+
+    The bucket holds at least one token, so rates below one per second
+    (e.g. 0.5 for one message every two seconds) still let messages through.
+    """
+
+    def __init__(self, rate, capacity=None):
+        if not rate or rate <= 0:
+            raise ValueError(f"Rate must be a positive number of messages per second, got {rate!r}")
+        self.rate = float(rate)
+        self.capacity = max(float(capacity or rate), 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class DomainRateLimiter:
+    """One token bucket per recipient domain (gmail.com, outlook.com, ...)"""
+
+    def __init__(self, limits=None, default_rate=None):
+        legacy_settings = getattr(settings, 'LEGACY_MESSAGE_SETTINGS', {})
+        self.limits = limits if limits is not None else legacy_settings.get('DOMAIN_RATE_LIMITS', {})
+        self.default_rate = default_rate or legacy_settings.get('DEFAULT_DOMAIN_RATE', DEFAULT_DOMAIN_RATE)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, recipient_email):
+        """Wait for the recipient's domain to allow one more message"""
+        domain = recipient_email.rsplit('@', 1)[-1].lower()
+
+        with self._lock:
+            bucket = self._buckets.get(domain)
+            if bucket is None:
+                bucket = TokenBucket(self.limits.get(domain, self.default_rate))
+                self._buckets[domain] = bucket
+
+        bucket.acquire()
+
+
+@lru_cache(maxsize=1)
+def shared_rate_limiter():
+    """The process-wide limiter, so concurrent deliveries in one worker share each domain's budget"""
+    return DomainRateLimiter()
+
+
+class DeliveryPool:
+    """
+    Bounded concurrent sender for legacy messages
+
+    Messages are split into chunks; each chunk is sent by a pool thread over
+    its own SMTP connection via LegacyEmailService.send_batch. At most
+    ``concurrency`` chunks are in flight, so memory stays bounded even when
+    the input is a large queryset.
+    """
+
+    def __init__(self, concurrency=None, chunk_size=None, rate_limiter=None):
+        legacy_settings = getattr(settings, 'LEGACY_MESSAGE_SETTINGS', {})
+        self.concurrency = concurrency or legacy_settings.get('DELIVERY_CONCURRENCY', DEFAULT_CONCURRENCY)
+        self.chunk_size = chunk_size or legacy_settings.get('DELIVERY_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+        self.rate_limiter = rate_limiter or shared_rate_limiter()
+
+    def deliver(self, messages):
+        """
+        Send all messages and return a summary
+
+        Args:
+            messages (iterable): LegacyMessage documents to deliver
+
+        Returns:
+            dict: Results summary with counts
+        """
+        results = {
+            'total_processed': 0,
+            'successful': 0,
+            'failed': 0
+        }
+        results_lock = threading.Lock()
+        in_flight = threading.BoundedSemaphore(self.concurrency)
+
+        def run_chunk(chunk):
+            try:
+                chunk_results = LegacyEmailService.send_batch(
+                    chunk,
+                    chunk_size=self.chunk_size,
+                    rate_limiter=self.rate_limiter
+                )
+            except Exception as e:
+                logger.error(f"Error delivering chunk of {len(chunk)} messages: {str(e)}")
+                chunk_results = {'total_processed': len(chunk), 'successful': 0, 'failed': len(chunk)}
+            finally:
+                in_flight.release()
+
+            with results_lock:
+                for key in results:
+                    results[key] += chunk_results[key]
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='legacy-delivery') as executor:
+            chunk = []
+            for message in messages:
+                chunk.append(message)
+                if len(chunk) >= self.chunk_size:
+                    in_flight.acquire()
+                    executor.submit(run_chunk, chunk)
+                    chunk = []
+
+            if chunk:
+                in_flight.acquire()
+                executor.submit(run_chunk, chunk)
+
+        return results
@@ -1,7 +1,6 @@
 from django.core.mail import send_mail
-from django.template.loader import render_to_string
 from django.conf import settings
-from django.utils.html import strip_tags
+from afteryou.email_templates import renderer
 import logging
 
 logger = logging.getLogger(__name__)
@@ -28,9 +27,10 @@ class DigitalLockerEmailService:
         }
         
         try:
-            # Render HTML email
-            html_message = render_to_string('emails/digital_locker_inheritance.html', context)
-            plain_message = strip_tags(html_message)
+            # Render HTML and plain-text parts from cached templates
+            html_message, plain_message = renderer.render_email(
+                'emails/digital_locker_inheritance.html', 'emails/digital_locker_inheritance.txt', context
+            )
             
             send_mail(
                 subject=subject,
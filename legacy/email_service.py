@@ -8,152 +8,27 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
 from django.conf import settings
-from django.template.loader import render_to_string
 from django.utils import timezone
 from django.core.mail import send_mail, EmailMultiAlternatives
+from pymongo import UpdateOne
+from afteryou.email_templates import renderer as email_renderer
+from afteryou.smtp_pool import send_with_reconnect, smtp_pool
 from .models import LegacyMessage
+from .leases import LEASE_FIELDS, claim_message, claim_due_messages, default_lease_owner
+from .retries import failure_update, record_dead_letters
+from .outbox import begin_deliveries, complete_delivery, delivery_key, fail_deliveries, message_id_header
 
 logger = logging.getLogger(__name__)
 
-class LegacyEmailService:
-    """
-    Service class for handling legacy message email delivery
-    """
-    
-    @staticmethod
-    def send_legacy_message(message_id, template_name=None):
-        """
-        Send a single legacy message via email
-        
-        Args:
-            message_id (str): MongoDB ObjectId of the message to send
-            template_name (str): Optional custom template name
-            
-        Returns:
-            bool: True if successful, False otherwise
-        """
-        try:
-            # Get the message from database
-            message = LegacyMessage.objects.get(id=message_id)
-            
-            # Determine email subject based on message type
-            if message.parent_message:
-                subject = f"Legacy Chain Message: {message.title}"
-            else:
-                subject = f"Legacy Message: {message.title}"
-            
-            # Create HTML email content with appropriate template
-            if template_name:
-                html_content = LegacyEmailService._render_email_template(message, template_name)
-            else:
-                # Choose template based on message type
-                if message.parent_message:
-                    html_content = LegacyEmailService._render_chain_email_template(message)
-                else:
-                    html_content = LegacyEmailService._render_email_template(message)
-            
-            # Create plain text fallback
-            if message.parent_message:
-                text_content = f"""
-{message.title}
-
-{message.content}
-
----
-This is part of a legacy chain (Generation {message.generation}).
-Added by: {message.sender_name or 'Anonymous'}
-
-View the full chain and add your own message:
-{settings.FRONTEND_URL}/legacy/message/{message.recipient_access_token}
-
-Sent via AfterYou Legacy Messages.
-                """.strip()
-            else:
-                text_content = f"""
-{message.title}
-
-{message.content}
-
----
-This message was scheduled to be delivered on {message.delivery_date.strftime('%B %d, %Y at %I:%M %p')}.
-View and extend this legacy:
-{settings.FRONTEND_URL}/legacy/message/{message.recipient_access_token}
-
-Sent via AfterYou Legacy Messages.
-                """.strip()
-            
-            # Send email using Django's email system
-            email = EmailMultiAlternatives(
-                subject=subject,
-                body=text_content,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[message.recipient_email]
-            )
-            email.attach_alternative(html_content, "text/html")
-            
-            # Send the email
-            sent = email.send()
-            
-            if sent:
-                # Update message status
-                message.status = 'sent'
-                message.sent_at = timezone.now()
-                message.save()
-                
-                logger.info(f"Successfully sent legacy message {message_id} to {message.recipient_email}")
-                return True
-            else:
-                # Mark as failed
-                message.status = 'failed'
-                message.save()
-                
-                logger.error(f"Failed to send legacy message {message_id}")
-                return False
-                
-        except LegacyMessage.DoesNotExist:
-            logger.error(f"Message {message_id} not found")
-            return False
-        except Exception as e:
-            logger.error(f"Error sending message {message_id}: {str(e)}")
-            
-            # Try to update message status to failed
-            try:
-                message = LegacyMessage.objects.get(id=message_id)
-                message.status = 'failed'
-                message.save()
-            except:
-                pass
-                
-            return False
-    
-    @staticmethod
-    def _render_email_template(message):
-        """
-        Render HTML email template for legacy message
-        
-        Args:
-            message (LegacyMessage): The message object
-            
-        Returns:
-            str: Rendered HTML content
-        """
-        try:
-            # Try to use a template if it exists
-            return render_to_string('legacy/email_template.html', {
-                'message': message,
-                'delivery_date': message.delivery_date,
-                'sent_date': timezone.now(),
-            })
-        except:
-            # Fallback to simple HTML if template doesn't exist
-            return f"""
-<!DOCTYPE html>
+# Built-in skeletons used when the email template file is missing. They are
+# compiled once per process by the shared email template renderer.
+LEGACY_EMAIL_FALLBACK = """<!DOCTYPE html>
 <html>
 <head>
     <meta charset="utf-8">
-    <title>Legacy Message: {message.title}</title>
+    <title>Legacy Message: {{ message.title }}</title>
     <style>
-        body {{
+        body {
             font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
             line-height: 1.6;
             color: #333;
@@ -161,108 +36,85 @@ Sent via AfterYou Legacy Messages.
             margin: 0 auto;
             padding: 20px;
             background-color: #f8f9fa;
-        }}
-        .container {{
+        }
+        .container {
             background: white;
             padding: 30px;
             border-radius: 12px;
             box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-        }}
-        .header {{
+        }
+        .header {
             text-align: center;
             border-bottom: 3px solid #6B73FF;
             padding-bottom: 20px;
             margin-bottom: 30px;
-        }}
-        .title {{
+        }
+        .title {
             color: #6B73FF;
             font-size: 28px;
             margin: 0;
             font-weight: 600;
-        }}
-        .subtitle {{
+        }
+        .subtitle {
             color: #666;
             margin: 10px 0 0 0;
             font-size: 14px;
-        }}
-        .content {{
+        }
+        .content {
             font-size: 16px;
             line-height: 1.8;
             margin-bottom: 30px;
             white-space: pre-wrap;
-        }}
-        .footer {{
+        }
+        .footer {
             border-top: 1px solid #eee;
             padding-top: 20px;
             font-size: 12px;
             color: #999;
             text-align: center;
-        }}
-        .date-info {{
+        }
+        .date-info {
             background: #f0f2ff;
             padding: 15px;
             border-radius: 8px;
             margin: 20px 0;
             border-left: 4px solid #6B73FF;
-        }}
+        }
     </style>
 </head>
 <body>
     <div class="container">
         <div class="header">
-            <h1 class="title">{message.title}</h1>
+            <h1 class="title">{{ message.title }}</h1>
             <p class="subtitle">A Legacy Message from AfterYou</p>
         </div>
         
         <div class="content">
-{message.content}
+{{ message.content }}
         </div>
         
         <div class="date-info">
-            <strong>Scheduled for delivery:</strong> {message.delivery_date.strftime('%B %d, %Y at %I:%M %p')}<br>
-            <strong>Delivered on:</strong> {timezone.now().strftime('%B %d, %Y at %I:%M %p')}
+            <strong>Scheduled for delivery:</strong> {{ delivery_date|date:"F d, Y \\a\\t h:i A" }}<br>
+            <strong>Delivered on:</strong> {{ sent_date|date:"F d, Y \\a\\t h:i A" }}
         </div>
         
         <div class="footer">
             <p>This message was created and scheduled through AfterYou Legacy Messages.<br>
             A service for connecting present moments with future hearts.</p>
-            <p><a href="{settings.FRONTEND_URL}/legacy/message/{message.recipient_access_token}" style="color: #6B73FF;">View & Extend This Legacy</a></p>
+            <p><a href="{{ frontend_url }}/legacy/message/{{ message.recipient_access_token }}" style="color: #6B73FF;">View & Extend This Legacy</a></p>
         </div>
     </div>
 </body>
 </html>
-            """
-    
-    @staticmethod
-    def _render_chain_email_template(message):
-        """
-        Render HTML email template for chain legacy message
-        
-        Args:
-            message (LegacyMessage): The chain message object
-            
-        Returns:
-            str: Rendered HTML content
-        """
-        try:
-            # Try to use a template if it exists
-            return render_to_string('legacy/chain_email_template.html', {
-                'message': message,
-                'parent_message': message.parent_message,
-                'delivery_date': message.delivery_date,
-                'sent_date': timezone.now(),
-                'frontend_url': settings.FRONTEND_URL,
-            })
-        except:
-            # Fallback to simple HTML if template doesn't exist
-            return f"""
-<!DOCTYPE html>
+"""
+
+CHAIN_EMAIL_FALLBACK = """<!DOCTYPE html>
 <html>
 <head>
     <meta charset="utf-8">
-    <title>Legacy Chain Message: {message.title}</title>
+    <title>Legacy Chain Message: {{ message.title }}</title>
     <style>
-        body {{
+        body {
             font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
             line-height: 1.6;
             color: #333;
@@ -270,102 +122,494 @@ Sent via AfterYou Legacy Messages.
             margin: 0 auto;
             padding: 20px;
             background-color: #f8f9fa;
-        }}
-        .container {{
+        }
+        .container {
             background: white;
             padding: 30px;
             border-radius: 12px;
             box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-        }}
-        .header {{
+        }
+        .header {
             text-align: center;
             border-bottom: 3px solid #9C27B0;
             padding-bottom: 20px;
             margin-bottom: 30px;
-        }}
-        .title {{
+        }
+        .title {
             color: #9C27B0;
             font-size: 28px;
             margin: 0;
             font-weight: 600;
-        }}
-        .subtitle {{
+        }
+        .subtitle {
             color: #666;
             margin: 10px 0 0 0;
             font-size: 14px;
-        }}
-        .chain-info {{
+        }
+        .chain-info {
             background: #f3e5f5;
             padding: 15px;
             border-radius: 8px;
             margin: 20px 0;
             border-left: 4px solid #9C27B0;
-        }}
-        .content {{
+        }
+        .content {
             font-size: 16px;
             line-height: 1.8;
             margin-bottom: 30px;
             white-space: pre-wrap;
-        }}
-        .footer {{
+        }
+        .footer {
             border-top: 1px solid #eee;
             padding-top: 20px;
             font-size: 12px;
             color: #999;
             text-align: center;
-        }}
-        .action-buttons {{
+        }
+        .action-buttons {
             text-align: center;
             margin: 30px 0;
-        }}
-        .btn {{
+        }
+        .btn {
             display: inline-block;
             padding: 12px 24px;
             margin: 10px;
             text-decoration: none;
             border-radius: 6px;
             font-weight: 600;
-        }}
-        .btn-primary {{
+        }
+        .btn-primary {
             background-color: #9C27B0;
             color: white;
-        }}
-        .btn-secondary {{
+        }
+        .btn-secondary {
             background-color: #6B73FF;
             color: white;
-        }}
+        }
     </style>
 </head>
 <body>
     <div class="container">
         <div class="header">
-            <h1 class="title">{message.title}</h1>
+            <h1 class="title">{{ message.title }}</h1>
             <p class="subtitle">A Legacy Chain Message from AfterYou</p>
         </div>
         
         <div class="chain-info">
-            <strong>🔗 This is Generation {message.generation} of a Legacy Chain</strong><br>
-            <small>Added by: {message.sender_name or 'Anonymous'}</small>
+            <strong>🔗 This is Generation {{ message.generation }} of a Legacy Chain</strong><br>
+            <small>Added by: {{ message.sender_name|default:"Anonymous" }}</small>
         </div>
         
         <div class="content">
-{message.content}
+{{ message.content }}
         </div>
         
         <div class="action-buttons">
-            <a href="{settings.FRONTEND_URL}/legacy/message/{message.recipient_access_token}" class="btn btn-primary">View Message</a>
-            <a href="{settings.FRONTEND_URL}/legacy/message/{message.recipient_access_token}/extend" class="btn btn-secondary">Add Your Message & Pass It Forward</a>
+            <a href="{{ frontend_url }}/legacy/message/{{ message.recipient_access_token }}" class="btn btn-primary">View Message</a>
+            <a href="{{ frontend_url }}/legacy/message/{{ message.recipient_access_token }}/extend" class="btn btn-secondary">Add Your Message & Pass It Forward</a>
         </div>
         
         <div class="footer">
             <p>This legacy chain continues the memories across generations.<br>
-            <a href="{settings.FRONTEND_URL}/legacy/message/{message.recipient_access_token}/chain" style="color: #9C27B0;">View Full Chain History</a></p>
+            <a href="{{ frontend_url }}/legacy/message/{{ message.recipient_access_token }}/chain" style="color: #9C27B0;">View Full Chain History</a></p>
             <p>Sent via AfterYou Legacy Messages.</p>
         </div>
     </div>
 </body>
 </html>
-            """
+"""
+
+
+def _legacy_setting(name, default):
+    """Read a value from settings.LEGACY_MESSAGE_SETTINGS with a default"""
+    return getattr(settings, 'LEGACY_MESSAGE_SETTINGS', {}).get(name, default)
+
+
+# Fields the delivery emails actually read; everything else stays in MongoDB
+DELIVERY_FIELDS = (
+    'id', 'title', 'content', 'recipient_email', 'delivery_date', 'parent_message',
+    'generation', 'sender_name', 'recipient_access_token', 'claim_token',
+    'user_id', 'attempts',
+)
+
+
+def _is_chain_message(message):
+    """Check for a parent message without dereferencing it (saves a MongoDB round trip)"""
+    return message._data.get('parent_message') is not None
+
+
+class LegacyEmailService:
+    """
+    Service class for handling legacy message email delivery
+    """
+    
+    @staticmethod
+    def send_legacy_message(message_id, template_name=None, due_only=False):
+        """
+        Send a single legacy message via email
+        
+        Args:
+            message_id (str): MongoDB ObjectId of the message to send
+            template_name (str): Optional custom template name
+            due_only (bool): Only send if the message is scheduled and due
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        message = None
+        try:
+            # Claim the message so no other worker can send it concurrently;
+            # the claim also loads the fields the email needs
+            message = claim_message(message_id, fields=DELIVERY_FIELDS, due_only=due_only)
+            if message is None:
+                if not LegacyMessage.objects(id=message_id).count():
+                    raise LegacyMessage.DoesNotExist
+                logger.info(f"Message {message_id} is not due, already sent or being sent by another worker")
+                return False
+            
+            # Record the send intent; skip deliveries that already completed
+            key = delivery_key(message)
+            if begin_deliveries({key: message.id}, default_lease_owner()):
+                logger.info(f"Message {message_id} was already delivered, skipping")
+                LegacyEmailService._record_delivery_results([message], [])
+                return True
+            
+            # Send the email over a warm pooled connection
+            with smtp_pool.connection() as connection:
+                email = LegacyEmailService._build_email(message, template_name, connection=connection)
+                sent = send_with_reconnect(connection, email)
+            
+            if sent:
+                # Record the result, then update message status and release the lease
+                complete_delivery(key)
+                LegacyEmailService._record_delivery_results([message], [])
+                
+                logger.info(f"Successfully sent legacy message {message_id} to {message.recipient_email}")
+                return True
+            else:
+                # Mark as failed and schedule a retry
+                error = 'Email backend reported nothing sent'
+                fail_deliveries({key: error})
+                LegacyEmailService._record_delivery_results([], [message], {message.id: error})
+                
+                logger.error(f"Failed to send legacy message {message_id}")
+                return False
+                
+        except LegacyMessage.DoesNotExist:
+            logger.error(f"Message {message_id} not found")
+            return False
+        except Exception as e:
+            logger.error(f"Error sending message {message_id}: {str(e)}")
+            
+            # Try to update message status to failed
+            if message is not None:
+                fail_deliveries({delivery_key(message): str(e)})
+                LegacyEmailService._record_delivery_results([], [message], {message.id: str(e)})
+                
+            return False
+    
+    @staticmethod
+    def _build_email(message, template_name=None, connection=None):
+        """
+        Compose the email for a legacy message without sending it
+        
+        Args:
+            message (LegacyMessage): The message object
+            template_name (str): Optional custom template name
+            connection: Optional open email backend to bind the email to
+            
+        Returns:
+            EmailMultiAlternatives: Email ready to be sent
+        """
+        is_chain = _is_chain_message(message)
+        
+        # Determine email subject based on message type
+        if is_chain:
+            subject = f"Legacy Chain Message: {message.title}"
+        else:
+            subject = f"Legacy Message: {message.title}"
+        
+        # Create HTML email content with appropriate template
+        if template_name:
+            html_content = LegacyEmailService._render_email_template(message, template_name)
+        else:
+            # Choose template based on message type
+            if is_chain:
+                html_content = LegacyEmailService._render_chain_email_template(message)
+            else:
+                html_content = LegacyEmailService._render_email_template(message)
+        
+        # Create plain text fallback
+        if is_chain:
+            text_content = f"""
+{message.title}
+
+{message.content}
+
+---
+This is part of a legacy chain (Generation {message.generation}).
+Added by: {message.sender_name or 'Anonymous'}
+
+View the full chain and add your own message:
+{settings.FRONTEND_URL}/legacy/message/{message.recipient_access_token}
+
+Sent via AfterYou Legacy Messages.
+            """.strip()
+        else:
+            text_content = f"""
+{message.title}
+
+{message.content}
+
+---
+This message was scheduled to be delivered on {message.delivery_date.strftime('%B %d, %Y at %I:%M %p')}.
+View and extend this legacy:
+{settings.FRONTEND_URL}/legacy/message/{message.recipient_access_token}
+
+Sent via AfterYou Legacy Messages.
+            """.strip()
+        
+        email = EmailMultiAlternatives(
+            subject=subject,
+            body=text_content,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[message.recipient_email],
+            headers={'Message-ID': message_id_header(delivery_key(message))},
+            connection=connection
+        )
+        email.attach_alternative(html_content, "text/html")
+        return email
+    
+    @staticmethod
+    def delivery_cursor(queryset):
+        """
+        Stream messages for delivery with only the fields the email needs
+        
+        Documents are fetched in fixed-size batches and not cached by the
+        queryset, so worker memory stays flat however large the backlog is.
+        Parent messages are never dereferenced.
+        
+        Args:
+            queryset: LegacyMessage queryset selecting the messages to deliver
+            
+        Returns:
+            QuerySet: Projected, non-caching cursor over the messages
+        """
+        return (
+            queryset.only(*DELIVERY_FIELDS)
+            .no_dereference()
+            .no_cache()
+            .batch_size(_legacy_setting('DELIVERY_FETCH_BATCH_SIZE', 100))
+        )
+    
+    @staticmethod
+    def send_batch(messages, chunk_size=None, rate_limiter=None):
+        """
+        Send many legacy messages over a single SMTP connection
+        
+        The connection is checked out of the process-wide SMTP pool and reused
+        for every message, so the TLS handshake and AUTH are paid at most once
+        per batch, and usually not at all. Results are written back to MongoDB with one bulk operation
+        per chunk.
+        
+        Args:
+            messages (iterable): LegacyMessage documents to deliver
+            chunk_size (int): Messages per send/bulk-update round
+            rate_limiter: Optional DomainRateLimiter consulted before each send
+            
+        Returns:
+            dict: Results summary with counts
+        """
+        chunk_size = chunk_size or _legacy_setting('DELIVERY_BATCH_SIZE', 100)
+        
+        total_processed = 0
+        successful = 0
+        failed = 0
+        
+        with smtp_pool.connection() as connection:
+            chunk = []
+            for message in messages:
+                chunk.append(message)
+                if len(chunk) >= chunk_size:
+                    sent_messages, failed_messages = LegacyEmailService._send_chunk(connection, chunk, rate_limiter)
+                    total_processed += len(chunk)
+                    successful += len(sent_messages)
+                    failed += len(failed_messages)
+                    chunk = []
+            
+            if chunk:
+                sent_messages, failed_messages = LegacyEmailService._send_chunk(connection, chunk, rate_limiter)
+                total_processed += len(chunk)
+                successful += len(sent_messages)
+                failed += len(failed_messages)
+        
+        return {
+            'total_processed': total_processed,
+            'successful': successful,
+            'failed': failed
+        }
+    
+    @staticmethod
+    def _send_chunk(connection, chunk, rate_limiter=None):
+        """
+        Send one chunk of messages on an open connection and record the results
+        
+        Each email goes through ``send_messages`` on the shared connection so
+        a single bad recipient does not hide which messages of the chunk were
+        actually delivered. If the server drops the connection, it is
+        reopened and the message retried once.
+        
+        Send intents are recorded in the delivery outbox before anything is
+        sent, and each delivery is marked complete there as soon as the
+        server accepts it. Messages whose delivery already completed (the
+        previous worker died before updating the message) are marked sent
+        without emailing the recipient again.
+        
+        Args:
+            connection: Open email backend
+            chunk (list): LegacyMessage documents
+            rate_limiter: Optional DomainRateLimiter consulted before each send
+            
+        Returns:
+            tuple: (sent messages, failed messages)
+        """
+        sent = []
+        failed = []
+        errors = {}
+        
+        keys = {delivery_key(message): message for message in chunk}
+        already_delivered = begin_deliveries(
+            {key: message.id for key, message in keys.items()},
+            default_lease_owner()
+        )
+        
+        for key, message in keys.items():
+            if key in already_delivered:
+                sent.append(message)
+                logger.info(f"Message {message.id} was already delivered, skipping")
+                continue
+            
+            try:
+                email = LegacyEmailService._build_email(message, connection=connection)
+                if rate_limiter:
+                    rate_limiter.acquire(message.recipient_email)
+                delivered = send_with_reconnect(connection, email)
+                
+                if delivered:
+                    complete_delivery(key)
+                    sent.append(message)
+                    logger.info(f"Successfully sent legacy message {message.id} to {message.recipient_email}")
+                else:
+                    failed.append(message)
+                    errors[message.id] = 'Email backend reported nothing sent'
+                    logger.error(f"Failed to send legacy message {message.id}")
+            except Exception as e:
+                failed.append(message)
+                errors[message.id] = str(e)
+                logger.error(f"Error sending message {message.id}: {str(e)}")
+        
+        fail_deliveries({delivery_key(message): errors[message.id] for message in failed})
+        LegacyEmailService._record_delivery_results(sent, failed, errors)
+        return sent, failed
+    
+    @staticmethod
+    def _record_delivery_results(sent_messages, failed_messages, errors=None):
+        """
+        Write sent/failed statuses back to MongoDB in a single bulk operation
+        
+        The delivery lease is released at the same time. Claimed messages are
+        only updated while they still carry the claim token they were sent
+        under, so a worker whose lease was taken over cannot overwrite the
+        new owner's result. Failed messages get their next retry scheduled
+        with exponential backoff, or are dead-lettered once they run out of
+        attempts.
+        
+        Args:
+            sent_messages (list): Delivered LegacyMessage documents
+            failed_messages (list): LegacyMessage documents that could not be sent
+            errors (dict): Optional failure reason per message id
+        """
+        errors = errors or {}
+        
+        def lease_filter(message):
+            query = {'_id': message.id}
+            if message.claim_token:
+                query['claim_token'] = message.claim_token
+            return query
+        
+        now = timezone.now()
+        operations = [
+            UpdateOne(lease_filter(message), {
+                '$set': {'status': 'sent', 'sent_at': now},
+                '$unset': {**LEASE_FIELDS, 'next_attempt_at': ''}
+            })
+            for message in sent_messages
+        ]
+        
+        dead_letters = []
+        for message in failed_messages:
+            update, dead_letter = failure_update(message, errors.get(message.id, 'Unknown error'), now)
+            operations.append(UpdateOne(lease_filter(message), update))
+            if dead_letter:
+                dead_letters.append(dead_letter)
+        
+        if not operations:
+            return
+        
+        try:
+            LegacyMessage._get_collection().bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error(f"Error recording delivery results: {str(e)}")
+            return
+        
+        record_dead_letters(dead_letters)
+    
+    @staticmethod
+    def _render_email_template(message, template_name=None):
+        """
+        Render HTML email template for legacy message
+        
+        Args:
+            message (LegacyMessage): The message object
+            template_name (str): Optional custom template name
+            
+        Returns:
+            str: Rendered HTML content
+        """
+        # Falls back to the built-in skeleton if the template doesn't exist
+        return email_renderer.render(
+            template_name or 'legacy/email_template.html',
+            {
+                'message': message,
+                'delivery_date': message.delivery_date,
+                'sent_date': timezone.now(),
+                'frontend_url': settings.FRONTEND_URL,
+            },
+            fallback_source=LEGACY_EMAIL_FALLBACK
+        )
+    
+    @staticmethod
+    def _render_chain_email_template(message):
+        """
+        Render HTML email template for chain legacy message
+        
+        Args:
+            message (LegacyMessage): The chain message object
+            
+        Returns:
+            str: Rendered HTML content
+        """
+        # Falls back to the built-in skeleton if the template doesn't exist
+        return email_renderer.render(
+            'legacy/chain_email_template.html',
+            {
+                'message': message,
+                'delivery_date': message.delivery_date,
+                'sent_date': timezone.now(),
+                'frontend_url': settings.FRONTEND_URL,
+            },
+            fallback_source=CHAIN_EMAIL_FALLBACK
+        )
     
     @staticmethod
     def process_pending_deliveries():
@@ -378,33 +622,34 @@ Sent via AfterYou Legacy Messages.
         logger.info("Processing pending message deliveries...")
         
         try:
-            # Get all scheduled messages that are due for delivery
             current_time = timezone.now()
-            due_messages = LegacyMessage.objects.filter(
-                status='scheduled',
-                delivery_date__lte=current_time
-            )
+            owner = default_lease_owner()
             
-            total_processed = 0
-            successful = 0
-            failed = 0
-            
-            for message in due_messages:
-                total_processed += 1
-                
-                if LegacyEmailService.send_legacy_message(str(message.id)):
-                    successful += 1
-                else:
-                    failed += 1
+            from .delivery_pool import DeliveryPool
+            pool = DeliveryPool()
             
             results = {
-                'total_processed': total_processed,
-                'successful': successful,
-                'failed': failed,
-                'timestamp': current_time
+                'total_processed': 0,
+                'successful': 0,
+                'failed': 0
             }
             
-            logger.info(f"Delivery batch completed: {successful} successful, {failed} failed")
+            # Claim due messages batch by batch so concurrent workers never
+            # pick up the same message
+            while True:
+                claim_token, claimed = claim_due_messages(owner=owner)
+                if not claimed:
+                    break
+                
+                batch_results = pool.deliver(
+                    LegacyEmailService.delivery_cursor(LegacyMessage.objects(claim_token=claim_token))
+                )
+                for key in results:
+                    results[key] += batch_results[key]
+            
+            results['timestamp'] = current_time
+            
+            logger.info(f"Delivery batch completed: {results['successful']} successful, {results['failed']} failed")
             return results
             
         except Exception as e:
@@ -494,7 +739,8 @@ TEST sent via AfterYou Legacy Messages.
             )
             email.attach_alternative(html_content, "text/html")
             
-            sent = email.send()
+            with smtp_pool.connection() as connection:
+                sent = connection.send_messages([email])
             
             if sent:
                 logger.info(f"Successfully sent test message {message_id} to {message.recipient_email}")
@@ -524,6 +770,7 @@ TEST sent via AfterYou Legacy Messages.
             sent_messages = LegacyMessage.objects.filter(status='sent').count()
             failed_messages = LegacyMessage.objects.filter(status='failed').count()
             created_messages = LegacyMessage.objects.filter(status='created').count()
+            dead_messages = LegacyMessage.objects.filter(status='dead').count()
             
             return {
                 'total': total_messages,
@@ -531,6 +778,7 @@ TEST sent via AfterYou Legacy Messages.
                 'sent': sent_messages,
                 'failed': failed_messages,
                 'created': created_messages,
+                'dead': dead_messages,
                 'delivery_rate': (sent_messages / total_messages * 100) if total_messages > 0 else 0
             }
             
@@ -543,5 +791,6 @@ TEST sent via AfterYou Legacy Messages.
                 'sent': 0,
                 'failed': 0,
                 'created': 0,
+                'dead': 0,
                 'delivery_rate': 0
             }
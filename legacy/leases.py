@@ -0,0 +1,154 @@
+"""
+Lease-based claiming of legacy messages for delivery
+Lets several workers (RQ jobs, the QStash endpoint, the scheduler daemon)
+deliver messages at the same time without sending any message twice
+"""
+import logging
+import os
+import socket
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from mongoengine.queryset.visitor import Q
+from .models import LegacyMessage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_SECONDS = 600
+DEFAULT_CLAIM_BATCH_SIZE = 500
+
+# Fields removed from a message once its lease is released
+LEASE_FIELDS = {'lease_owner': '', 'lease_expires_at': '', 'claim_token': ''}
+
+
+def _lease_seconds(lease_seconds=None):
+    return lease_seconds or getattr(settings, 'LEGACY_MESSAGE_SETTINGS', {}).get(
+        'DELIVERY_LEASE_SECONDS', DEFAULT_LEASE_SECONDS
+    )
+
+
+def default_lease_owner():
+    """Identify this worker process as host:pid"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_due_messages(owner=None, limit=None, lease_seconds=None):
+    """
+    Atomically claim a batch of messages that are due for delivery
+
+    Claimable messages are scheduled ones whose delivery date has passed and
+    messages stuck in 'sending' whose lease has expired (their worker died).
+    Each claimed message is moved to 'sending' and stamped with this worker's
+    owner, lease expiry and a fresh claim token. The update re-checks the
+    claimable filter per document, so when two workers race for the same
+    message only one of them gets it.
+
+    Args:
+        owner (str): Lease owner, defaults to host:pid
+        limit (int): Maximum number of messages to claim
+        lease_seconds (int): How long the claim stays valid
+
+    Returns:
+        tuple: (claim_token, number of messages claimed)
+    """
+    now = timezone.now()
+    claimable = {
+        '$or': [
+            {'status': 'scheduled', 'delivery_date': {'$lte': now}},
+            {'status': 'sending', 'lease_expires_at': {'$lte': now}},
+        ]
+    }
+    return _claim_batch(claimable, now, owner, limit, lease_seconds)
+
+
+def claim_retryable_messages(owner=None, limit=None, lease_seconds=None):
+    """
+    Atomically claim a batch of failed messages whose next retry is due
+
+    Failed messages recorded before retry scheduling existed have no
+    next_attempt_at and are retried straight away.
+
+    Args:
+        owner (str): Lease owner, defaults to host:pid
+        limit (int): Maximum number of messages to claim
+        lease_seconds (int): How long the claim stays valid
+
+    Returns:
+        tuple: (claim_token, number of messages claimed)
+    """
+    now = timezone.now()
+    claimable = {
+        '$or': [
+            {'status': 'failed', 'next_attempt_at': {'$lte': now}},
+            {'status': 'failed', 'next_attempt_at': None},
+        ]
+    }
+    return _claim_batch(claimable, now, owner, limit, lease_seconds)
+
+
+def _claim_batch(claimable, now, owner, limit, lease_seconds):
+    owner = owner or default_lease_owner()
+    limit = limit or getattr(settings, 'LEGACY_MESSAGE_SETTINGS', {}).get(
+        'DELIVERY_CLAIM_BATCH_SIZE', DEFAULT_CLAIM_BATCH_SIZE
+    )
+    claim_token = uuid.uuid4().hex
+
+    collection = LegacyMessage._get_collection()
+    candidate_ids = [doc['_id'] for doc in collection.find(claimable, {'_id': 1}).limit(limit)]
+    if not candidate_ids:
+        return claim_token, 0
+
+    result = collection.update_many(
+        {'_id': {'$in': candidate_ids}, **claimable},
+        {'$set': {
+            'status': 'sending',
+            'lease_owner': owner,
+            'lease_expires_at': now + timedelta(seconds=_lease_seconds(lease_seconds)),
+            'claim_token': claim_token,
+        }}
+    )
+
+    if result.modified_count:
+        logger.info(f"{owner} claimed {result.modified_count} messages (claim {claim_token})")
+    return claim_token, result.modified_count
+
+
+def claim_message(message_id, owner=None, lease_seconds=None, fields=None, due_only=False):
+    """
+    Atomically claim a single message for delivery
+
+    Any message that is not already sent, not dead-lettered and not leased
+    by another worker can be claimed.
+
+    Args:
+        message_id (str): MongoDB ObjectId of the message
+        owner (str): Lease owner, defaults to host:pid
+        lease_seconds (int): How long the claim stays valid
+        fields (iterable): Only load these fields of the claimed message
+        due_only (bool): Only claim a scheduled message whose delivery date has passed
+
+    Returns:
+        LegacyMessage: The claimed message, or None if it could not be claimed
+    """
+    owner = owner or default_lease_owner()
+    now = timezone.now()
+
+    queryset = LegacyMessage.objects(
+        Q(id=message_id) & (
+            Q(status__nin=['sent', 'sending', 'dead']) |
+            Q(status='sending', lease_expires_at__lte=now)
+        )
+    )
+    if due_only:
+        queryset = queryset.filter(status='scheduled', delivery_date__lte=now)
+    if fields:
+        queryset = queryset.only(*fields)
+
+    return queryset.modify(
+        new=True,
+        set__status='sending',
+        set__lease_owner=owner,
+        set__lease_expires_at=now + timedelta(seconds=_lease_seconds(lease_seconds)),
+        set__claim_token=uuid.uuid4().hex
+    )
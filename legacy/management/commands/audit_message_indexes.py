@@ -0,0 +1,84 @@
+"""
+Management command to check that every production LegacyMessage query uses an index
+Runs explain() on each query shape and reports any collection scan (COLLSCAN)
+
+Usage:
+    python manage.py audit_message_indexes
+    python manage.py audit_message_indexes --ensure  # Create missing indexes first
+"""
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from legacy.models import LegacyMessage
+
+
+def _plan_stages(plan):
+    """Yield every stage name in an explain() plan tree"""
+    if not plan:
+        return
+    yield plan.get('stage')
+    if 'inputStage' in plan:
+        yield from _plan_stages(plan['inputStage'])
+    for child in plan.get('inputStages', []):
+        yield from _plan_stages(child)
+    # Slot-based engine (MongoDB 5+) wraps the classic plan
+    if 'queryPlan' in plan:
+        yield from _plan_stages(plan['queryPlan'])
+
+
+class Command(BaseCommand):
+    help = 'Explain every production LegacyMessage query and report collection scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ensure',
+            action='store_true',
+            help='Create the indexes declared on LegacyMessage before auditing',
+        )
+
+    def get_queries(self):
+        """The query shapes used by the delivery pipeline and the API views"""
+        now = timezone.now()
+        user_id = '0'
+        token = uuid.uuid4()
+
+        return [
+            ('process_pending_deliveries', LegacyMessage.objects(status='scheduled', delivery_date__lte=now)),
+            ('expired delivery leases', LegacyMessage.objects(status='sending', lease_expires_at__lte=now)),
+            ('claimed batch', LegacyMessage.objects(claim_token='audit')),
+            ('retry_failed_messages', LegacyMessage.objects(status='failed', next_attempt_at__lte=now)),
+            ('cleanup_old_messages', LegacyMessage.objects(status='sent', sent_at__lt=now)),
+            ('message list', LegacyMessage.objects(user_id=user_id).order_by('-created_at')),
+            ('dashboard_stats', LegacyMessage.objects(user_id=user_id, status='scheduled')),
+            ('user_chains', LegacyMessage.objects(user_id=user_id, generation=1).order_by('-created_at')),
+            ('view_full_chain', LegacyMessage.objects(chain_id=token).order_by('generation')),
+            ('view_message_by_token', LegacyMessage.objects(recipient_access_token=token)),
+        ]
+
+    def handle(self, *args, **options):
+        if options['ensure']:
+            LegacyMessage.ensure_indexes()
+            self.stdout.write('Ensured LegacyMessage indexes')
+
+        collection_scans = []
+        for name, queryset in self.get_queries():
+            try:
+                plan = queryset.explain()
+            except Exception as e:
+                raise CommandError(f'Could not explain query "{name}": {str(e)}')
+
+            winning_plan = plan.get('queryPlanner', {}).get('winningPlan', {})
+            stages = [stage for stage in _plan_stages(winning_plan) if stage]
+
+            if 'COLLSCAN' in stages:
+                collection_scans.append(name)
+                self.stdout.write(self.style.ERROR(f'✗ {name}: COLLSCAN ({" <- ".join(stages)})'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'✓ {name}: {" <- ".join(stages)}'))
+
+        if collection_scans:
+            raise CommandError(
+                f'{len(collection_scans)} queries scan the whole collection: {", ".join(collection_scans)}'
+            )
+
+        self.stdout.write(self.style.SUCCESS('\n✓ All LegacyMessage queries are indexed'))
@@ -0,0 +1,118 @@
+"""
+Management command to benchmark per-message email rendering cost
+Compares the old render_to_string/strip_tags path with the cached template renderer
+
+Usage:
+    python manage.py benchmark_email_rendering
+    python manage.py benchmark_email_rendering --iterations 5000
+"""
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template import TemplateDoesNotExist, engines
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+from accounts.models import User
+from afteryou.email_templates import renderer
+from legacy.email_service import CHAIN_EMAIL_FALLBACK
+from legacy.models import LegacyMessage
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-message email rendering before and after template caching'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=1000,
+            help='Messages rendered per case (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        # Unsaved documents: rendering never touches the databases
+        message = LegacyMessage(
+            user_id='0',
+            title='Benchmark message',
+            content='Words for the future.\n' * 20,
+            recipient_email='recipient@example.com',
+            delivery_date=timezone.now() - timedelta(days=1),
+        )
+        chain_message = LegacyMessage(
+            user_id='0',
+            title='Re: Benchmark message',
+            content='Passing it forward.\n' * 20,
+            recipient_email='next@example.com',
+            delivery_date=timezone.now(),
+            generation=2,
+            sender_name='Benchmark',
+        )
+        user = User(username='benchmark', first_name='Ada', check_in_interval_months=6, grace_period_days=10)
+
+        def message_context(msg):
+            return {
+                'message': msg,
+                'delivery_date': msg.delivery_date,
+                'sent_date': timezone.now(),
+                'frontend_url': settings.FRONTEND_URL,
+            }
+
+        reminder_context = {
+            'user': user,
+            'check_in_url': f"{settings.FRONTEND_URL}/dashboard",
+            'grace_period_days': user.grace_period_days,
+        }
+
+        def old_legacy():
+            render_to_string('legacy/email_template.html', message_context(message))
+
+        def new_legacy():
+            renderer.render('legacy/email_template.html', message_context(message))
+
+        def old_chain():
+            # Old path: look the missing template up, then fall back inline
+            try:
+                render_to_string('legacy/chain_email_template.html', message_context(chain_message))
+            except TemplateDoesNotExist:
+                engines['django'].from_string(CHAIN_EMAIL_FALLBACK).render(message_context(chain_message))
+
+        def new_chain():
+            renderer.render(
+                'legacy/chain_email_template.html',
+                message_context(chain_message),
+                fallback_source=CHAIN_EMAIL_FALLBACK
+            )
+
+        def old_reminder():
+            strip_tags(render_to_string('emails/check_in_reminder.html', reminder_context))
+
+        def new_reminder():
+            renderer.render_email('emails/check_in_reminder.html', 'emails/check_in_reminder.txt', reminder_context)
+
+        cases = [
+            ('Legacy message HTML', old_legacy, new_legacy),
+            ('Chain message HTML', old_chain, new_chain),
+            ('Check-in reminder HTML + text', old_reminder, new_reminder),
+        ]
+
+        self.stdout.write(f'Rendering {iterations} messages per case...\n')
+        for name, before, after in cases:
+            before_us = self._time(before, iterations)
+            after_us = self._time(after, iterations)
+            self.stdout.write(
+                f'{name}:\n'
+                f'  before: {before_us:8.1f} µs/message\n'
+                f'  after:  {after_us:8.1f} µs/message ({before_us / after_us:.1f}x)'
+            )
+
+    def _time(self, func, iterations):
+        """Average wall time per call in microseconds (after one warm-up call)"""
+        func()
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        return (time.perf_counter() - start) / iterations * 1_000_000
@@ -0,0 +1,105 @@
+"""
+Management command to benchmark the in-memory fallback task queue
+Compares the old list + sort scheduling with the heap-based SimpleTaskQueue
+
+Usage:
+    python manage.py benchmark_task_queue
+    python manage.py benchmark_task_queue --tasks 100000 --workers 8
+"""
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.core.management.base import BaseCommand
+from legacy.simple_tasks import SimpleTaskQueue
+
+
+class Command(BaseCommand):
+    help = 'Benchmark scheduling and dispatching tasks on the fallback SimpleTaskQueue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tasks',
+            type=int,
+            default=100000,
+            help='Tasks scheduled per case (default: 100000)'
+        )
+        parser.add_argument(
+            '--legacy-tasks',
+            type=int,
+            default=10000,
+            help='Tasks scheduled with the old list + sort approach, which is quadratic (default: 10000)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Worker threads (default: LEGACY_MESSAGE_SETTINGS SIMPLE_QUEUE_WORKERS)'
+        )
+
+    def handle(self, *args, **options):
+        tasks = options['tasks']
+        legacy_tasks = min(options['legacy_tasks'], tasks)
+
+        # Per-task INFO logging would dominate the measurement
+        logging.getLogger('legacy.simple_tasks').setLevel(logging.WARNING)
+
+        now = datetime.now(dt_timezone.utc)
+        run_times = [now + timedelta(seconds=random.uniform(3600, 7200)) for _ in range(tasks)]
+
+        # Old approach: append and re-sort the whole list on every insert
+        scheduled = []
+        start = time.perf_counter()
+        for run_at in run_times[:legacy_tasks]:
+            scheduled.append({'run_at': run_at})
+            scheduled.sort(key=lambda x: x['run_at'])
+        legacy_us = (time.perf_counter() - start) / legacy_tasks * 1_000_000
+
+        # New approach: heap push under the scheduler condition
+        queue = SimpleTaskQueue(workers=options['workers'])
+        queue.start()
+        try:
+            start = time.perf_counter()
+            for run_at in run_times:
+                queue.schedule_task(_noop, run_at)
+            heap_us = (time.perf_counter() - start) / tasks * 1_000_000
+        finally:
+            queue.stop()
+
+        self.stdout.write(
+            f'Scheduling (future tasks):\n'
+            f'  list + sort: {legacy_us:8.2f} µs/task ({legacy_tasks} tasks)\n'
+            f'  heap:        {heap_us:8.2f} µs/task ({tasks} tasks)'
+        )
+
+        # Dispatch: schedule everything due now and time until all have run
+        done = threading.Event()
+        remaining = [tasks]
+        lock = threading.Lock()
+
+        def count_down():
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    done.set()
+
+        queue = SimpleTaskQueue(workers=options['workers'])
+        queue.start()
+        try:
+            start = time.perf_counter()
+            for _ in range(tasks):
+                queue.schedule_task(count_down, now)
+            done.wait()
+            elapsed = time.perf_counter() - start
+        finally:
+            queue.stop()
+
+        self.stdout.write(
+            f'Dispatch ({queue.workers} workers):\n'
+            f'  {tasks} due tasks run in {elapsed:.2f}s ({tasks / elapsed:,.0f} tasks/s)'
+        )
+
+
+def _noop():
+    pass
@@ -33,6 +33,7 @@ class Command(BaseCommand):
             self.stdout.write(f"  Sent: {stats['sent']}")
             self.stdout.write(f"  Failed: {stats['failed']}")
             self.stdout.write(f"  Created: {stats['created']}")
+            self.stdout.write(f"  Dead-lettered: {stats['dead']}")
             self.stdout.write(f"  Delivery rate: {stats['delivery_rate']:.1f}%")
             return
 
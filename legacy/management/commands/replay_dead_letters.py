@@ -0,0 +1,46 @@
+"""
+Management command to inspect and replay dead-lettered legacy messages
+
+Usage:
+    python manage.py replay_dead_letters                  # List dead letters
+    python manage.py replay_dead_letters --message-id ID  # Replay one message
+    python manage.py replay_dead_letters --all            # Replay every dead letter
+"""
+from django.core.management.base import BaseCommand
+from bson import ObjectId
+from legacy.models import DeadLetterMessage
+from legacy.retries import replay_dead_letters
+
+
+class Command(BaseCommand):
+    help = 'List or replay legacy messages that exhausted their delivery retries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--message-id',
+            type=str,
+            action='append',
+            help='Replay a specific message by ID (can be repeated)',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Replay every dead-lettered message',
+        )
+
+    def handle(self, *args, **options):
+        message_ids = options.get('message_id')
+
+        if not message_ids and not options['all']:
+            dead_letters = DeadLetterMessage.objects
+            self.stdout.write(f"Dead-lettered messages: {dead_letters.count()}")
+            for doc in dead_letters.limit(50):
+                self.stdout.write(
+                    f"  {doc.message_id}  {doc.recipient_email}  attempts={doc.attempts}  "
+                    f"failed_at={doc.failed_at}  error={doc.last_error}"
+                )
+            return
+
+        ids = [ObjectId(message_id) for message_id in message_ids] if message_ids else None
+        replayed = replay_dead_letters(ids)
+        self.stdout.write(self.style.SUCCESS(f'Rescheduled {replayed} dead-lettered messages for delivery'))
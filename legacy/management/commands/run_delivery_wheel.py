@@ -0,0 +1,57 @@
+"""
+Management command to run the exact-time delivery scheduler
+Delivers each scheduled message within a second of its delivery date
+
+Usage:
+    python manage.py run_delivery_wheel
+    python manage.py run_delivery_wheel --horizon 7200 --refresh 120
+"""
+import signal
+from django.core.management.base import BaseCommand
+from legacy.timing_wheel import DeliveryWheelScheduler
+
+
+class Command(BaseCommand):
+    help = 'Run the timing-wheel scheduler that delivers legacy messages at their exact delivery time'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horizon',
+            type=int,
+            default=3600,
+            help='Seconds of upcoming deliveries kept in memory (default: 3600)'
+        )
+        parser.add_argument(
+            '--refresh',
+            type=int,
+            default=60,
+            help='Seconds between incremental horizon loads (default: 60)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=None,
+            help='Parallel senders (default: LEGACY_MESSAGE_SETTINGS["DELIVERY_CONCURRENCY"])'
+        )
+
+    def handle(self, *args, **options):
+        scheduler = DeliveryWheelScheduler(
+            horizon=options['horizon'],
+            refresh_interval=options['refresh'],
+            concurrency=options['concurrency'],
+        )
+
+        def shutdown(signum, frame):
+            self.stdout.write(self.style.WARNING('\nReceived shutdown signal, stopping scheduler...'))
+            scheduler.stop()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Starting delivery wheel (horizon {options["horizon"]}s, refresh every {options["refresh"]}s)'
+            )
+        )
+        scheduler.run()
+        self.stdout.write(self.style.SUCCESS('Delivery wheel stopped'))
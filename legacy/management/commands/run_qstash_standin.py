@@ -0,0 +1,62 @@
+"""
+Management command to run a local QStash stand-in for offline development
+Accepts publishes, batches, cancellations and cron schedules on the QStash v2
+API and calls the /api/tasks/ endpoints itself with valid signatures
+
+Usage:
+    python manage.py run_qstash_standin
+    python manage.py run_qstash_standin --port 8080
+
+Then point the app at it:
+    QSTASH_URL=http://localhost:8080 QSTASH_PER_MESSAGE_DELIVERY=True python manage.py runserver
+"""
+import logging
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from afteryou.qstash_standin import make_server
+
+
+class Command(BaseCommand):
+    help = 'Run a local stand-in for Upstash QStash'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--host',
+            type=str,
+            default='127.0.0.1',
+            help='Address to listen on (default: 127.0.0.1)'
+        )
+        parser.add_argument(
+            '--port',
+            type=int,
+            default=8080,
+            help='Port to listen on (default: 8080)'
+        )
+        parser.add_argument(
+            '--signing-key',
+            type=str,
+            default=None,
+            help='Key used to sign task requests (default: QSTASH_CURRENT_SIGNING_KEY)'
+        )
+
+    def handle(self, *args, **options):
+        signing_key = options['signing_key'] or settings.QSTASH_CURRENT_SIGNING_KEY
+        if not signing_key:
+            raise CommandError('Set QSTASH_CURRENT_SIGNING_KEY or pass --signing-key')
+
+        logging.getLogger('afteryou.qstash_standin').setLevel(logging.INFO)
+        server = make_server(options['host'], options['port'], signing_key)
+        server.qstash.start()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"QStash stand-in listening on http://{options['host']}:{options['port']}"
+        ))
+        self.stdout.write(f"Set QSTASH_URL=http://{options['host']}:{options['port']} to use it")
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('\nShutting down QStash stand-in...'))
+        finally:
+            server.qstash.stop()
+            server.server_close()
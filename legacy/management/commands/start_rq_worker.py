@@ -2,10 +2,10 @@
 Management command to start RQ workers for processing background tasks
 """
 import logging
-import sys
 from django.core.management.base import BaseCommand
-import django_rq
-from rq import Worker
+from rq import SimpleWorker
+from afteryou.smtp_pool import smtp_pool
+from legacy.worker_supervisor import WorkerSupervisor, build_worker
 
 logger = logging.getLogger(__name__)
 
@@ -24,12 +24,24 @@ class Command(BaseCommand):
             '--workers',
             type=int,
             default=1,
-            help='Number of worker processes to start (default: 1)'
+            help='Number of worker processes to start (default: 1); the minimum when autoscaling'
+        )
+        parser.add_argument(
+            '--max-workers',
+            type=int,
+            default=None,
+            help='Autoscale up to this many worker processes based on queue depth and job latency'
+        )
+        parser.add_argument(
+            '--fork',
+            action='store_true',
+            help='Run each job in a forked work horse (loses pooled SMTP connections between jobs)'
         )
 
     def handle(self, *args, **options):
         queue_name = options['queue']
         num_workers = options['workers']
+        max_workers = max(num_workers, options['max_workers'] or num_workers)
         
         if queue_name == 'all':
             queues = ['default', 'email']
@@ -43,35 +55,29 @@ class Command(BaseCommand):
         )
         
         try:
-            if num_workers == 1:
-                # Single worker - use SimpleWorker for Windows compatibility
-                if len(queues) == 1:
-                    queue = django_rq.get_queue(queues[0])
-                    connection = queue.connection
-                else:
-                    # Multiple queues, single worker
-                    queue_objects = [django_rq.get_queue(q) for q in queues]
-                    connection = queue_objects[0].connection
-                    queue = queue_objects  # Pass list for multiple queues
-                
-                # Use SimpleWorker for Windows compatibility
-                if sys.platform.startswith('win'):
-                    from rq import SimpleWorker
-                    worker = SimpleWorker(queue if isinstance(queue, list) else [queue], connection=connection)
-                    self.stdout.write(f'Starting SimpleWorker (Windows mode) for queues: {queues}')
-                else:
-                    worker = Worker(queue if isinstance(queue, list) else [queue], connection=connection)
-                    self.stdout.write(f'Starting Worker for queues: {queues}')
+            if max_workers == 1:
+                # Single worker in this process
+                worker = build_worker(queues, fork_jobs=options['fork'])
+                self.stdout.write(f'Starting {type(worker).__name__} for queues: {queues}')
+                if isinstance(worker, SimpleWorker) and 'email' in queues and smtp_pool.warm():
+                    self.stdout.write('Opened a pooled SMTP connection')
                 
-                worker.work()
+                try:
+                    worker.work()
+                finally:
+                    smtp_pool.close_all()
             else:
-                # Multiple workers - this would require multiprocessing
-                self.stdout.write(
-                    self.style.WARNING(
-                        'Multiple workers not implemented in this command. '
-                        'Run multiple instances of this command instead.'
-                    )
-                )
+                # Supervisor forks the worker processes, replaces crashed ones and
+                # drains them on SIGTERM/Ctrl-C
+                if max_workers > num_workers:
+                    self.stdout.write(f'Autoscaling between {num_workers} and {max_workers} workers')
+                WorkerSupervisor(
+                    queues,
+                    min_workers=num_workers,
+                    max_workers=max_workers,
+                    fork_jobs=options['fork']
+                ).run()
+                self.stdout.write(self.style.SUCCESS('All workers drained'))
                 
         except KeyboardInterrupt:
             self.stdout.write(
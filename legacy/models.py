@@ -1,4 +1,4 @@
-from mongoengine import Document, StringField, DateTimeField, EmailField, ReferenceField, IntField, UUIDField
+from mongoengine import Document, StringField, DateTimeField, EmailField, ReferenceField, IntField, UUIDField, ObjectIdField
 from datetime import datetime
 from accounts.models import User
 import uuid
@@ -27,8 +27,10 @@ class LegacyMessage(Document):
         ('created', 'Created'),
         ('scheduled', 'Scheduled'),
         ('pending', 'Pending'),
+        ('sending', 'Sending'),
         ('sent', 'Sent'),
         ('failed', 'Failed'),
+        ('dead', 'Dead-lettered'),
     )
     status = StringField(max_length=10, choices=STATUS_CHOICES, default='created')
     created_at = DateTimeField(default=datetime.utcnow)
@@ -36,13 +38,79 @@ class LegacyMessage(Document):
     
     # Background job tracking
     job_id = StringField()  # RQ job ID for tracking background tasks
+    qstash_message_id = StringField()  # Pending QStash delivery (see legacy/qstash_delivery.py)
+    
+    # Delivery lease - set while a worker owns the message (see legacy/leases.py)
+    lease_owner = StringField()  # host:pid of the claiming worker
+    lease_expires_at = DateTimeField()  # Claim can be taken over after this time
+    claim_token = StringField()  # Identifies the batch the message was claimed in
+    
+    # Retry tracking (see legacy/retries.py)
+    attempts = IntField(default=0)  # Failed delivery attempts so far
+    next_attempt_at = DateTimeField()  # When a failed message may be retried
+    last_error = StringField()
     
     # Meta configuration
     meta = {
         'collection': 'legacy_messages',
         'ordering': ['-created_at'],
-        'indexes': ['chain_id', 'parent_message', 'recipient_access_token', 'generation']
+        'indexes': [
+            'parent_message', 'recipient_access_token', 'generation',
+            ('chain_id', 'generation'),  # view_full_chain, user_chains
+            ('status', 'delivery_date'),  # due-message claims, retries, cleanup
+            ('status', 'lease_expires_at'),  # reclaiming expired leases
+            ('status', 'next_attempt_at'),  # retry_failed_messages
+            ('user_id', '-created_at'),  # message list, user_chains
+            ('user_id', 'status'),  # dashboard_stats, system_status
+            {'fields': ['claim_token'], 'sparse': True},
+        ]
+    }
+    
+    def __str__(self):
+        return f"{self.title} - {self.recipient_email} (Gen {self.generation})"
+
+
+class DeadLetterMessage(Document):
+    """Messages that exhausted their delivery attempts; replay with `manage.py replay_dead_letters`"""
+    message_id = ObjectIdField(required=True, unique=True)
+    user_id = StringField()
+    title = StringField()
+    recipient_email = StringField()
+    attempts = IntField()
+    last_error = StringField()
+    failed_at = DateTimeField(default=datetime.utcnow)
+    
+    meta = {
+        'collection': 'legacy_dead_letters',
+        'ordering': ['-failed_at'],
+        'indexes': ['-failed_at']
+    }
+    
+    def __str__(self):
+        return f"{self.title} - {self.recipient_email} ({self.attempts} attempts)"
+
+
+class DeliveryOutbox(Document):
+    """One record per delivery idempotency key (see legacy/outbox.py)"""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),  # Send intent recorded, result unknown
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+    key = StringField(primary_key=True)
+    message_id = ObjectIdField(required=True)
+    status = StringField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    owner = StringField()  # Worker that made the last attempt
+    attempts = IntField(default=0)
+    last_error = StringField()
+    created_at = DateTimeField(default=datetime.utcnow)
+    started_at = DateTimeField()
+    sent_at = DateTimeField()
+    
+    meta = {
+        'collection': 'legacy_delivery_outbox',
+        'indexes': ['message_id', ('status', 'started_at')]
     }
     
     def __str__(self):
-        return f"{self.title} - {self.recipient_email} (Gen {self.generation})"
\ No newline at end of file
+        return f"{self.key} ({self.status})"
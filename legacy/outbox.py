@@ -0,0 +1,115 @@
+"""
+Transactional delivery outbox for legacy messages
+Every delivery gets an idempotency key. The outbox records the intent to
+send it and the result, so any batch or job can be re-run without emailing
+a recipient twice.
+"""
+import logging
+from email.utils import parseaddr
+from django.conf import settings
+from django.utils import timezone
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from .models import DeliveryOutbox
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+def delivery_key(message):
+    """
+    Idempotency key for delivering a message on its scheduled date
+
+    Re-running a delivery yields the same key; rescheduling a message to a
+    new date yields a new one.
+    """
+    return f"legacy.{message.id}.{message.delivery_date.strftime('%Y%m%d%H%M%S')}"
+
+
+def message_id_header(key):
+    """
+    Deterministic Message-ID for a delivery, so the rare resend after a
+    crash can still be de-duplicated by the recipient's mail system
+    """
+    domain = parseaddr(settings.DEFAULT_FROM_EMAIL)[1].rpartition('@')[2] or 'afteryou.com'
+    return f"<{key}@{domain}>"
+
+
+def begin_deliveries(keys, owner):
+    """
+    Record the intent to send each delivery
+
+    The intent is only written while the key has not completed; for keys
+    that already have a 'sent' record the upsert collides with it on the
+    unique _id, which is how completed deliveries are detected in the same
+    round trip.
+
+    Args:
+        keys (dict): Idempotency key -> message id
+        owner (str): Worker recording the intent
+
+    Returns:
+        set: Keys that were already delivered and must not be sent again
+    """
+    if not keys:
+        return set()
+
+    now = timezone.now()
+    ordered_keys = list(keys)
+    operations = [
+        UpdateOne(
+            {'_id': key, 'status': {'$ne': 'sent'}},
+            {
+                '$set': {'status': 'pending', 'message_id': keys[key], 'owner': owner, 'started_at': now},
+                '$inc': {'attempts': 1},
+                '$setOnInsert': {'created_at': now},
+            },
+            upsert=True
+        )
+        for key in ordered_keys
+    ]
+
+    try:
+        DeliveryOutbox._get_collection().bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        completed = set()
+        for error in e.details.get('writeErrors', []):
+            if error.get('code') != DUPLICATE_KEY_ERROR:
+                raise
+            completed.add(ordered_keys[error['index']])
+        return completed
+
+    return set()
+
+
+def complete_delivery(key):
+    """Mark a delivery as sent; called as soon as the SMTP server accepts the email"""
+    try:
+        DeliveryOutbox._get_collection().update_one(
+            {'_id': key},
+            {'$set': {'status': 'sent', 'sent_at': timezone.now()}, '$unset': {'last_error': ''}}
+        )
+    except Exception as e:
+        # The email is out; the message status update still records it
+        logger.error(f"Error completing delivery {key} in the outbox: {str(e)}")
+
+
+def fail_deliveries(errors):
+    """
+    Record failed delivery attempts in one bulk operation
+
+    Args:
+        errors (dict): Idempotency key -> error message
+    """
+    if not errors:
+        return
+
+    operations = [
+        UpdateOne({'_id': key, 'status': {'$ne': 'sent'}}, {'$set': {'status': 'failed', 'last_error': error}})
+        for key, error in errors.items()
+    ]
+    try:
+        DeliveryOutbox._get_collection().bulk_write(operations, ordered=False)
+    except Exception as e:
+        logger.error(f"Error recording failed deliveries in the outbox: {str(e)}")
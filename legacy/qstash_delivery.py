@@ -0,0 +1,130 @@
+"""
+Exact-time delivery of legacy messages through QStash
+Publishes one QStash message per scheduled delivery with notBefore set to
+the delivery date, instead of waiting for the 15-minute
+process_scheduled_messages schedule
+"""
+import atexit
+import logging
+import threading
+import time
+from bson import ObjectId
+from django.conf import settings
+from pymongo import UpdateOne
+from .models import LegacyMessage
+from .outbox import delivery_key
+from .timing_wheel import to_timestamp
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_TASK = 'deliver_message'
+FLUSH_INTERVAL = 0.2  # Seconds publishes are buffered so they share a batch request
+
+
+def qstash_delivery_enabled():
+    return getattr(settings, 'QSTASH_PER_MESSAGE_DELIVERY', False)
+
+
+def publish_deduplication_id(message):
+    """
+    Deduplication ID for publishing a message's current delivery
+
+    Including the QStash message being replaced versions the ID: reusing
+    a plain delivery key after A -> B -> A would make QStash hand back the
+    message cancelled when moving to B, leaving no live delivery.
+    """
+    return f"{delivery_key(message)}.{message.qstash_message_id or 'initial'}"
+
+
+class QStashDeliveryPublisher:
+    """
+    Buffers delivery publishes and sends them through the QStash batch API
+
+    Each publish carries a deduplication ID derived from the message, its
+    delivery date and the QStash message it replaces, so retrying a publish
+    is a no-op while every edit gets a fresh ID, even one that moves the
+    delivery back to an earlier date (A -> B -> A). The previous QStash
+    message is then cancelled. A stale publish that still fires is harmless
+    anyway: the delivery endpoint only sends messages that are scheduled
+    and due.
+    """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._pending = {}  # message id -> publish request; later edits replace earlier ones
+        self._condition = threading.Condition()
+        self._flusher = None
+        self._publish_lock = threading.Lock()
+
+    def publish(self, message):
+        """Queue a scheduled message for publishing; returns immediately"""
+        with self._condition:
+            self._pending[str(message.id)] = {
+                'task_name': DELIVERY_TASK,
+                'payload': {'message_id': str(message.id)},
+                'not_before': to_timestamp(message.delivery_date),
+                'deduplication_id': publish_deduplication_id(message),
+                'previous_message_id': message.qstash_message_id,
+            }
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._flush_loop, name='qstash-delivery', daemon=True)
+                self._flusher.start()
+            self._condition.notify()
+
+    def cancel(self, message):
+        """Cancel the QStash delivery of a deleted or unscheduled message"""
+        with self._condition:
+            self._pending.pop(str(message.id), None)
+        if message.qstash_message_id:
+            from afteryou.qstash_service import qstash
+            qstash.cancel_message(message.qstash_message_id)
+
+    def flush(self):
+        """Publish everything buffered so far, synchronously"""
+        with self._condition:
+            pending, self._pending = self._pending, {}
+        if pending:
+            with self._publish_lock:
+                self._publish(pending)
+
+    def _flush_loop(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    if not self._condition.wait(timeout=60):
+                        # Idle for a minute: let the thread go, publish() restarts it
+                        if not self._pending:
+                            self._flusher = None
+                            return
+            # Give concurrent requests a moment to join the batch
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error publishing deliveries to QStash: {str(e)}")
+
+    def _publish(self, pending):
+        from afteryou.qstash_service import qstash
+
+        message_ids = list(pending)
+        requests = [pending[message_id] for message_id in message_ids]
+        qstash_ids = qstash.publish_batch(requests)
+
+        operations = [
+            UpdateOne({'_id': ObjectId(message_id)}, {'$set': {'qstash_message_id': qstash_id}})
+            for message_id, qstash_id in zip(message_ids, qstash_ids) if qstash_id
+        ]
+        if operations:
+            LegacyMessage._get_collection().bulk_write(operations, ordered=False)
+
+        for request, qstash_id in zip(requests, qstash_ids):
+            previous = request['previous_message_id']
+            if previous and previous != qstash_id:
+                qstash.cancel_message(previous)
+
+        logger.info(f"Published {len(requests)} exact-time deliveries to QStash")
+
+
+# Singleton instance
+qstash_deliveries = QStashDeliveryPublisher()
+atexit.register(qstash_deliveries.flush)
@@ -0,0 +1,146 @@
+"""
+Cached snapshot of the RQ queues for status endpoints
+Collects every queue metric in one pipelined Redis round trip and serves
+the snapshot, stale while it refreshes in the background, to all callers
+"""
+import logging
+import threading
+import time
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 5  # Seconds a snapshot is served before it is refreshed
+DEFAULT_CLEANUP_INTERVAL = 60  # Seconds between prunes of dead workers and expired failed jobs
+QUEUE_NAMES = ('default', 'email')
+
+
+def _disconnected(error=None):
+    status = {
+        'connected': False,
+        'mode': 'fallback',
+        'queue_info': {'queued_jobs': 0, 'failed_jobs': 0, 'workers': 0}
+    }
+    if error is not None:
+        status['error'] = error
+    return status
+
+
+class QueueStatusCollector:
+    """
+    Stale-while-revalidate cache of the queue status
+
+    The first call collects synchronously. Afterwards a snapshot older than
+    ``ttl`` is still returned immediately while a single background thread
+    refreshes it, so concurrent dashboard polling costs at most one Redis
+    round trip per TTL window per process.
+
+    The counts are raw set and registry sizes, which keep dead workers and
+    expired failed jobs until RQ prunes them. Refreshes therefore prune both
+    every ``cleanup_interval`` seconds, as Worker.all() and the registry
+    counts would on every call.
+    """
+
+    def __init__(self, ttl=None, cleanup_interval=None):
+        legacy_settings = getattr(settings, 'LEGACY_MESSAGE_SETTINGS', {})
+        self.ttl = ttl if ttl is not None else legacy_settings.get('QUEUE_STATUS_TTL', DEFAULT_TTL)
+        self.cleanup_interval = cleanup_interval if cleanup_interval is not None else legacy_settings.get(
+            'QUEUE_STATUS_CLEANUP_INTERVAL', DEFAULT_CLEANUP_INTERVAL
+        )
+        self._snapshot = None
+        self._collected_at = 0.0
+        self._cleaned_at = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return the current status snapshot"""
+        with self._lock:
+            snapshot = self._snapshot
+            stale = time.monotonic() - self._collected_at >= self.ttl
+            refresh = stale and not self._refreshing
+            if refresh:
+                self._refreshing = True
+
+        if snapshot is None:
+            if refresh:
+                return self._refresh()
+            # Another thread is collecting the very first snapshot
+            return self.collect()
+
+        if refresh:
+            threading.Thread(target=self._refresh, name='queue-status-refresh', daemon=True).start()
+        return snapshot
+
+    def _refresh(self):
+        try:
+            if self._cleaned_at is None or time.monotonic() - self._cleaned_at >= self.cleanup_interval:
+                self.cleanup()
+            snapshot = self.collect()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+        with self._lock:
+            self._snapshot = snapshot
+            self._collected_at = time.monotonic()
+        return snapshot
+
+    def cleanup(self):
+        """Drop dead workers and expired failed jobs, so the counts collected next are exact"""
+        self._cleaned_at = time.monotonic()
+        try:
+            import django_rq
+            from rq import Queue
+            from rq.worker_registration import clean_worker_registry
+
+            conn = django_rq.get_connection('default')
+            for name in QUEUE_NAMES:
+                queue = Queue(name, connection=conn)
+                clean_worker_registry(queue)
+                queue.failed_job_registry.cleanup()
+        except Exception as e:
+            logger.warning(f"Redis status cleanup failed: {e}")
+
+    def collect(self):
+        """Gather connection and queue metrics in a single pipelined round trip"""
+        try:
+            import django_rq
+            from rq import Queue, Worker
+
+            conn = django_rq.get_connection('default')
+            queues = [Queue(name, connection=conn) for name in QUEUE_NAMES]
+
+            pipeline = conn.pipeline(transaction=False)
+            pipeline.ping()
+            for queue in queues:
+                pipeline.llen(queue.key)
+            for queue in queues:
+                pipeline.zcard(queue.failed_job_registry.key)
+            pipeline.scard(Worker.redis_workers_keys)
+            results = pipeline.execute()
+
+            queue_sizes = dict(zip(QUEUE_NAMES, results[1:1 + len(queues)]))
+            failed_counts = results[1 + len(queues):1 + 2 * len(queues)]
+
+            return {
+                'connected': True,
+                'mode': 'redis',
+                'queue_info': {
+                    'queued_jobs': sum(queue_sizes.values()),
+                    'failed_jobs': sum(failed_counts),
+                    'workers': results[-1],
+                    'default_queue_size': queue_sizes['default'],
+                    'email_queue_size': queue_sizes['email']
+                },
+                'checked_at': timezone.now().isoformat()
+            }
+
+        except Exception as e:
+            logger.error(f"Redis status check failed: {e}")
+            return _disconnected(str(e))
+
+
+# Singleton instance
+queue_status = QueueStatusCollector()
@@ -0,0 +1,126 @@
+"""
+Retry scheduling for failed legacy message deliveries
+Exponential backoff with jitter driven by LEGACY_MESSAGE_SETTINGS, and a
+dead-letter collection for messages that run out of attempts
+"""
+import logging
+import random
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from pymongo import UpdateOne
+from .leases import LEASE_FIELDS
+from .models import DeadLetterMessage, LegacyMessage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETRY_MAX_DELAY = 86400
+
+
+def _legacy_settings():
+    return getattr(settings, 'LEGACY_MESSAGE_SETTINGS', {})
+
+
+def retry_delay(attempt):
+    """
+    Seconds to wait before retrying after the given failed attempt
+
+    The delay doubles with every attempt (RETRY_DELAY, 2x, 4x, ...) up to
+    RETRY_MAX_DELAY, and a random jitter of up to half the delay spreads
+    retries of messages that failed together (e.g. during an SMTP outage).
+    """
+    base = _legacy_settings().get('RETRY_DELAY', 3600)
+    cap = _legacy_settings().get('RETRY_MAX_DELAY', DEFAULT_RETRY_MAX_DELAY)
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return random.uniform(delay / 2, delay)
+
+
+def failure_update(message, error, now):
+    """
+    Build the MongoDB update recording a failed delivery attempt
+
+    Args:
+        message (LegacyMessage): The message that failed (needs `attempts` loaded)
+        error (str): Why the attempt failed
+        now (datetime): Time of the failure
+
+    Returns:
+        tuple: (update document, dead-letter document or None)
+    """
+    attempts = (message.attempts or 0) + 1
+    max_retries = _legacy_settings().get('MAX_RETRY_ATTEMPTS', 3)
+
+    if attempts > max_retries:
+        update = {
+            '$set': {'status': 'dead', 'attempts': attempts, 'last_error': error},
+            '$unset': {**LEASE_FIELDS, 'next_attempt_at': ''}
+        }
+        dead_letter = {
+            'message_id': message.id,
+            'user_id': message.user_id,
+            'title': message.title,
+            'recipient_email': message.recipient_email,
+            'attempts': attempts,
+            'last_error': error,
+            'failed_at': now,
+        }
+        return update, dead_letter
+
+    update = {
+        '$set': {
+            'status': 'failed',
+            'attempts': attempts,
+            'next_attempt_at': now + timedelta(seconds=retry_delay(attempts)),
+            'last_error': error,
+        },
+        '$unset': LEASE_FIELDS
+    }
+    return update, None
+
+
+def record_dead_letters(dead_letters):
+    """Write exhausted messages to the dead-letter collection in one bulk operation"""
+    if not dead_letters:
+        return
+
+    operations = [
+        UpdateOne({'message_id': doc['message_id']}, {'$set': doc}, upsert=True)
+        for doc in dead_letters
+    ]
+    try:
+        DeadLetterMessage._get_collection().bulk_write(operations, ordered=False)
+        logger.warning(f"Moved {len(dead_letters)} messages to the dead-letter collection")
+    except Exception as e:
+        logger.error(f"Error recording dead letters: {str(e)}")
+
+
+def replay_dead_letters(message_ids=None):
+    """
+    Put dead-lettered messages back into the delivery queue
+
+    The messages are rescheduled for immediate delivery with a fresh attempt
+    count and their dead-letter records are removed.
+
+    Args:
+        message_ids (list): Only replay these message ids; all dead letters if None
+
+    Returns:
+        int: Number of messages rescheduled
+    """
+    dead_letters = DeadLetterMessage.objects
+    if message_ids is not None:
+        dead_letters = dead_letters.filter(message_id__in=message_ids)
+    ids = [doc.message_id for doc in dead_letters.only('message_id')]
+    if not ids:
+        return 0
+
+    result = LegacyMessage._get_collection().update_many(
+        {'_id': {'$in': ids}, 'status': 'dead'},
+        {
+            '$set': {'status': 'scheduled', 'attempts': 0, 'delivery_date': timezone.now()},
+            '$unset': {'next_attempt_at': '', 'last_error': ''}
+        }
+    )
+    DeadLetterMessage.objects(message_id__in=ids).delete()
+    logger.info(f"Replayed {result.modified_count} dead-lettered messages")
+    return result.modified_count
@@ -2,125 +2,332 @@
 Simple in-memory task queue for development when Redis is not available.
 This provides a fallback mechanism for background task processing.
 """
+import heapq
+import itertools
 import logging
 import threading
 import time
-from datetime import datetime, timedelta
-from queue import Queue, Empty
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone as dt_timezone
+from queue import Queue
+from django.conf import settings
 from django.utils import timezone
+from .task_journal import JournalWriteError, TaskJournal, resolve_task, task_reference
+from .timing_wheel import to_timestamp
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_WORKERS = 4
+FINISHED_TASKS_KEPT = 10000  # Finished/cancelled tasks kept for status lookups
+TOMBSTONE_COMPACT_MIN = 1024  # Don't bother rebuilding heaps smaller than this
+
 class SimpleTaskQueue:
-    """Simple in-memory task queue for development"""
+    """
+    Simple in-memory task queue for development and Redis outages
+    
+    Scheduled tasks live in a heap ordered by run time. The scheduler thread
+    sleeps on a condition until the earliest deadline, or until a task with
+    an earlier deadline is scheduled, then hands due tasks to a pool of
+    worker threads that also run immediate tasks.
+    
+    With a journal, every task of a module-level function with JSON
+    arguments is written to disk before it is accepted and replayed on the
+    next start, so pending deliveries survive restarts.
+    
+    Every task is registered by ID, so status lookups and cancellation are
+    O(1): a cancelled task stays in the heap as a tombstone and is dropped
+    when it reaches the top. The heap is rebuilt once tombstones make up
+    half of it, which keeps cancellation amortized O(1).
+    """
     
-    def __init__(self):
+    def __init__(self, workers=None, journal=None):
+        self.workers = workers or getattr(settings, 'LEGACY_MESSAGE_SETTINGS', {}).get(
+            'SIMPLE_QUEUE_WORKERS', DEFAULT_WORKERS
+        )
         self.immediate_queue = Queue()
-        self.scheduled_tasks = []
+        self.scheduled_tasks = []  # Heap of (run_at timestamp, sequence, task)
+        self.journal = journal
         self.running = False
-        self.worker_thread = None
+        self.worker_threads = []
         self.scheduler_thread = None
-        self._lock = threading.Lock()
+        self.tasks = {}  # Task ID -> task, for pending and recently finished tasks
+        self._finished = deque()  # IDs of finished tasks, oldest first
+        self._tombstones = 0  # Cancelled tasks still in the heap
+        self._condition = threading.Condition()
+        self._sequence = itertools.count()  # Tie-breaker for equal run times
+        # Task IDs: a per-instance prefix keeps them unique across restarts
+        # (journaled tasks keep their IDs), the counter within this process
+        self._id_prefix = uuid.uuid4().hex[:8]
+        self._ids = itertools.count(1)
     
     def start(self):
         """Start the task queue workers"""
-        if self.running:
-            return
-            
-        self.running = True
+        with self._condition:
+            if self.running:
+                return
+            self.running = True
+        
+        if self.journal:
+            self.journal.open()
+            self._replay_journal()
         
-        # Start immediate task worker
-        self.worker_thread = threading.Thread(target=self._worker_loop, daemon=True)
-        self.worker_thread.start()
+        # Start the worker pool
+        self.worker_threads = [
+            threading.Thread(target=self._worker_loop, name=f'simple-task-worker-{i}', daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self.worker_threads:
+            thread.start()
         
-        # Start scheduler worker
-        self.scheduler_thread = threading.Thread(target=self._scheduler_loop, daemon=True)
+        # Start scheduler
+        self.scheduler_thread = threading.Thread(target=self._scheduler_loop, name='simple-task-scheduler', daemon=True)
         self.scheduler_thread.start()
         
-        logger.info("Simple task queue started")
+        logger.info(f"Simple task queue started with {self.workers} workers")
     
     def stop(self):
         """Stop the task queue workers"""
-        self.running = False
-        if self.worker_thread:
-            self.worker_thread.join(timeout=5)
+        with self._condition:
+            self.running = False
+            self._condition.notify_all()
+        
+        # One sentinel per worker wakes it up to exit
+        for _ in self.worker_threads:
+            self.immediate_queue.put(None)
+        for thread in self.worker_threads:
+            thread.join(timeout=5)
         if self.scheduler_thread:
             self.scheduler_thread.join(timeout=5)
+        if self.journal:
+            self.journal.close()
         logger.info("Simple task queue stopped")
     
     def enqueue_immediate(self, func, *args, **kwargs):
         """Enqueue a task for immediate execution"""
-        task_id = f"task_{int(time.time())}_{id(func)}"
+        task_id = f"task_{self._id_prefix}_{next(self._ids)}"
         task = {
             'id': task_id,
             'func': func,
             'args': args,
             'kwargs': kwargs,
-            'created_at': timezone.now()
+            'created_at': timezone.now(),
+            'status': 'queued'
         }
-        self.immediate_queue.put(task)
+        self._journal_task(task)
+        self._push_immediate(task)
         logger.info(f"Enqueued immediate task {task_id}")
         return task_id
     
     def schedule_task(self, func, run_at, *args, **kwargs):
         """Schedule a task for future execution"""
-        task_id = f"scheduled_{int(time.time())}_{id(func)}"
+        task_id = f"scheduled_{self._id_prefix}_{next(self._ids)}"
         task = {
             'id': task_id,
             'func': func,
             'args': args,
             'kwargs': kwargs,
             'run_at': run_at,
-            'created_at': timezone.now()
+            'created_at': timezone.now(),
+            'status': 'scheduled'
         }
-        
-        with self._lock:
-            self.scheduled_tasks.append(task)
-            # Keep scheduled tasks sorted by run_at
-            self.scheduled_tasks.sort(key=lambda x: x['run_at'])
+        self._journal_task(task)
+        self._push_scheduled(task)
         
         logger.info(f"Scheduled task {task_id} for {run_at}")
         return task_id
     
+    def _push_immediate(self, task):
+        with self._condition:
+            self.tasks[task['id']] = task
+        self.immediate_queue.put(task)
+    
+    def _push_scheduled(self, task):
+        entry = (to_timestamp(task['run_at']), next(self._sequence), task)
+        
+        with self._condition:
+            self.tasks[task['id']] = task
+            heapq.heappush(self.scheduled_tasks, entry)
+            # Only a new earliest deadline changes how long the scheduler sleeps
+            if self.scheduled_tasks[0] is entry:
+                self._condition.notify()
+    
     def cancel_task(self, task_id):
-        """Cancel a scheduled task"""
-        with self._lock:
-            self.scheduled_tasks = [t for t in self.scheduled_tasks if t['id'] != task_id]
+        """
+        Cancel a scheduled or queued task
+        
+        Returns:
+            bool: True if the task was pending and is now cancelled
+        """
+        with self._condition:
+            task = self.tasks.get(task_id)
+            if task is None or task['status'] not in ('scheduled', 'queued'):
+                return False
+            
+            if task['status'] == 'scheduled':
+                self._tombstones += 1
+                if self._tombstones * 2 > len(self.scheduled_tasks) >= TOMBSTONE_COMPACT_MIN:
+                    self.scheduled_tasks = [
+                        entry for entry in self.scheduled_tasks if entry[2]['status'] != 'canceled'
+                        and entry[2] is not task
+                    ]
+                    heapq.heapify(self.scheduled_tasks)
+                    self._tombstones = 0
+            
+            task['status'] = 'canceled'
+            task['ended_at'] = timezone.now()
+            self._retire(task)
+        
+        if task.get('journaled'):
+            self.journal.record_cancel(task_id)
         logger.info(f"Cancelled task {task_id}")
+        return True
+    
+    def reschedule_task(self, task_id, run_at):
+        """
+        Move a pending task to a new run time
+        
+        Returns:
+            str: ID of the rescheduled task, or None if the task is no longer pending
+        """
+        with self._condition:
+            task = self.tasks.get(task_id)
+        if task is None or not self.cancel_task(task_id):
+            return None
+        return self.schedule_task(task['func'], run_at, *task['args'], **task['kwargs'])
+    
+    def get_task_status(self, task_id):
+        """
+        Status of a task by ID, in the same shape as legacy.tasks.get_job_status
+        
+        Returns:
+            dict: Task status, or None if the task is unknown (or finished long ago)
+        """
+        with self._condition:
+            task = self.tasks.get(task_id)
+            if task is None:
+                return None
+            
+            return {
+                'job_id': task_id,
+                'status': task['status'],
+                'created_at': task['created_at'].isoformat(),
+                'run_at': task['run_at'].isoformat() if task.get('run_at') else None,
+                'started_at': task['started_at'].isoformat() if task.get('started_at') else None,
+                'ended_at': task['ended_at'].isoformat() if task.get('ended_at') else None,
+                'result': str(task['result']) if task.get('result') else None,
+                'exc_info': task.get('exc_info')
+            }
+    
+    def _retire(self, task):
+        """Keep a finished task for status lookups, forgetting the oldest ones. Caller holds the lock."""
+        self._finished.append(task['id'])
+        while len(self._finished) > FINISHED_TASKS_KEPT:
+            self.tasks.pop(self._finished.popleft(), None)
     
     def _worker_loop(self):
-        """Worker loop for immediate tasks"""
-        while self.running:
-            try:
-                task = self.immediate_queue.get(timeout=1)
-                self._execute_task(task)
+        """Worker loop: runs immediate tasks and scheduled tasks once due"""
+        while True:
+            task = self.immediate_queue.get()
+            if task is None:
                 self.immediate_queue.task_done()
-            except Empty:
-                continue
+                return
+            
+            with self._condition:
+                if task['status'] == 'canceled':
+                    self.immediate_queue.task_done()
+                    continue
+                task['status'] = 'started'
+                task['started_at'] = timezone.now()
+            
+            try:
+                task['result'] = self._execute_task(task)
+                task['status'] = 'finished'
             except Exception as e:
-                logger.error(f"Error in worker loop: {str(e)}")
+                task['status'] = 'failed'
+                task['exc_info'] = str(e)
+            finally:
+                with self._condition:
+                    task['ended_at'] = timezone.now()
+                    self._retire(task)
+                if task.get('journaled'):
+                    self.journal.record_done(task['id'])
+                self.immediate_queue.task_done()
     
     def _scheduler_loop(self):
-        """Scheduler loop for delayed tasks"""
-        while self.running:
+        """Scheduler loop: sleeps until the next deadline and hands due tasks to the workers"""
+        with self._condition:
+            while self.running:
+                try:
+                    now = time.time()
+                    while self.scheduled_tasks and (
+                        self.scheduled_tasks[0][0] <= now or self.scheduled_tasks[0][2]['status'] == 'canceled'
+                    ):
+                        task = heapq.heappop(self.scheduled_tasks)[2]
+                        if task['status'] == 'canceled':
+                            self._tombstones -= 1
+                            continue
+                        task['status'] = 'queued'
+                        self.immediate_queue.put(task)
+                    
+                    timeout = self.scheduled_tasks[0][0] - now if self.scheduled_tasks else None
+                    self._condition.wait(timeout)
+                except Exception as e:
+                    logger.error(f"Error in scheduler loop: {str(e)}")
+    
+    def _journal_task(self, task):
+        """Durably record a task before accepting it; returns once the record is committed"""
+        if not self.journal:
+            return
+        
+        reference = task_reference(task['func'])
+        if reference is None:
+            logger.debug(f"Task {task['id']} runs {task['func']!r}, which cannot be journaled")
+            return
+        
+        payload = {
+            'func': reference,
+            'args': task['args'],
+            'kwargs': task['kwargs'],
+            'run_at': to_timestamp(task['run_at']) if task.get('run_at') else None,
+        }
+        try:
+            self.journal.record_add(task['id'], payload)
+        except (TypeError, ValueError):
+            logger.debug(f"Task {task['id']} has arguments that cannot be journaled")
+            return
+        task['journaled'] = True
+    
+    def _replay_journal(self):
+        """Re-enqueue the tasks still pending in the journal; overdue ones run right away"""
+        replayed = 0
+        for task_id, payload in self.journal.load():
             try:
-                now = timezone.now()
-                due_tasks = []
-                
-                with self._lock:
-                    # Find tasks that are due
-                    while self.scheduled_tasks and self.scheduled_tasks[0]['run_at'] <= now:
-                        due_tasks.append(self.scheduled_tasks.pop(0))
-                
-                # Execute due tasks
-                for task in due_tasks:
-                    self._execute_task(task)
-                
-                # Sleep for a short interval
-                time.sleep(5)  # Check every 5 seconds
-                
-            except Exception as e:
-                logger.error(f"Error in scheduler loop: {str(e)}")
+                func = resolve_task(payload['func'])
+            except (ImportError, AttributeError) as e:
+                logger.error(f"Dropping journaled task {task_id}: {str(e)}")
+                self.journal.record_cancel(task_id)
+                continue
+            
+            task = {
+                'id': task_id,
+                'func': func,
+                'args': tuple(payload['args']),
+                'kwargs': payload['kwargs'],
+                'created_at': timezone.now(),
+                'journaled': True
+            }
+            if payload['run_at'] is None:
+                task['status'] = 'queued'
+                self._push_immediate(task)
+            else:
+                task['status'] = 'scheduled'
+                task['run_at'] = datetime.fromtimestamp(payload['run_at'], tz=dt_timezone.utc)
+                self._push_scheduled(task)
+            replayed += 1
+        
+        if replayed:
+            logger.info(f"Replayed {replayed} pending tasks from the task journal")
     
     def _execute_task(self, task):
         """Execute a single task"""
@@ -140,7 +347,7 @@ def get_task_queue():
     """Get the global task queue instance"""
     global _task_queue
     if _task_queue is None:
-        _task_queue = SimpleTaskQueue()
+        _task_queue = SimpleTaskQueue(journal=TaskJournal.from_settings())
         _task_queue.start()
     return _task_queue
 
@@ -168,7 +375,11 @@ def schedule_message_delivery(message_id, delivery_datetime):
         logger.warning(f"Redis not available, using simple queue: {str(e)}")
         # Fallback to simple queue
         queue = get_task_queue()
-        job_id = queue.schedule_task(send_single_message, delivery_datetime, message_id)
+        try:
+            job_id = queue.schedule_task(send_single_message, delivery_datetime, message_id)
+        except JournalWriteError as e:
+            logger.error(f"Could not queue delivery of message {message_id}: {str(e)}")
+            return None
         return job_id
 
 def enqueue_immediate_delivery(message_id):
@@ -184,9 +395,70 @@ def enqueue_immediate_delivery(message_id):
         logger.warning(f"Redis not available, using simple queue: {str(e)}")
         # Fallback to simple queue
         queue = get_task_queue()
-        job_id = queue.enqueue_immediate(send_single_message, message_id)
+        try:
+            job_id = queue.enqueue_immediate(send_single_message, message_id)
+        except JournalWriteError as e:
+            logger.error(f"Could not queue delivery of message {message_id}: {str(e)}")
+            return None
         return job_id
 
+def schedule_message_deliveries(deliveries):
+    """
+    Schedule many messages at once: one Redis pipeline, or the simple queue as fallback
+    
+    Returns:
+        dict: message_id -> job_id for the messages that were actually queued
+    """
+    deliveries = list(deliveries)
+    try:
+        # Try Redis first
+        import django_rq
+        from .tasks import schedule_message_deliveries as schedule_with_redis
+        django_rq.get_connection('email').ping()
+        job_ids = schedule_with_redis(deliveries)
+        if job_ids or not deliveries:
+            return job_ids
+        logger.warning("Scheduling with Redis failed, using simple queue")
+    except Exception as e:
+        logger.warning(f"Redis not available, using simple queue: {str(e)}")
+    
+    # Fallback to simple queue
+    queue = get_task_queue()
+    now = timezone.now()
+    job_ids = {}
+    for message_id, delivery_datetime in deliveries:
+        try:
+            if delivery_datetime is None or delivery_datetime <= now:
+                job_ids[message_id] = queue.enqueue_immediate(send_single_message, message_id)
+            else:
+                job_ids[message_id] = queue.schedule_task(send_single_message, delivery_datetime, message_id)
+        except Exception as e:
+            logger.error(f"Could not queue delivery of message {message_id}: {str(e)}")
+    return job_ids
+
+def cancel_message_delivery(job_id):
+    """Cancel a delivery scheduled with schedule_message_delivery"""
+    # Fallback queue IDs are checked in O(1) before going to Redis
+    if _task_queue is not None and _task_queue.cancel_task(job_id):
+        return True
+    try:
+        import django_rq
+        django_rq.get_scheduler('email').cancel(job_id)
+        logger.info(f"Cancelled Redis job {job_id}")
+        return True
+    except Exception as e:
+        logger.warning(f"Could not cancel job {job_id}: {str(e)}")
+        return False
+
+def get_job_status(job_id):
+    """Status of a task queued on the fallback queue"""
+    status = _task_queue.get_task_status(job_id) if _task_queue is not None else None
+    return status or {
+        'job_id': job_id,
+        'status': 'not_found',
+        'message': 'Task not found in the fallback queue'
+    }
+
 def process_delivery_queue():
     """Process all pending deliveries"""
     from .email_service import LegacyEmailService
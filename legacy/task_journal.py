@@ -0,0 +1,301 @@
+"""
+Durable journal for the in-memory fallback task queue
+Appends every enqueue, cancellation and completion to a SQLite log so
+scheduled deliveries survive process restarts and deploys
+"""
+import importlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COMPACT_THRESHOLD = 10000
+HEARTBEAT_INTERVAL = 10  # Seconds between heartbeats of a process using the journal
+OWNER_TIMEOUT = 60  # Seconds without a heartbeat before a process counts as dead
+
+
+class JournalWriteError(Exception):
+    """A journal record could not be committed, so the task it describes is not durable"""
+
+
+class _Batch:
+    """Records committed in one transaction, and how that commit went"""
+
+    def __init__(self):
+        self.records = []
+        self.done = False
+        self.error = None
+
+
+def task_reference(func):
+    """Dotted import path of a module-level function, or None if it cannot be journaled"""
+    qualname = getattr(func, '__qualname__', '')
+    module = getattr(func, '__module__', None)
+    if not module or not qualname or '<' in qualname:
+        return None
+    return f"{module}:{qualname}"
+
+
+def _owner_alive(owner, heartbeat, now):
+    """Whether the process behind an owner ID may still be running its tasks"""
+    if now - heartbeat > OWNER_TIMEOUT:
+        return False
+    host, _, pid = owner.rpartition(':')[0].rpartition(':')
+    if host == socket.gethostname():
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except (PermissionError, ValueError):
+            pass
+    return True
+
+
+def resolve_task(reference):
+    """Import the function behind a task_reference()"""
+    module_name, _, qualname = reference.partition(':')
+    target = importlib.import_module(module_name)
+    for attribute in qualname.split('.'):
+        target = getattr(target, attribute)
+    return target
+
+
+class TaskJournal:
+    """
+    Append-only SQLite journal with group commit
+
+    Callers hand records to a single writer thread and wait for the batch
+    holding their record to commit. Records that arrive while a commit is in
+    progress are written together in the next transaction, so under load
+    many appends share one commit. If the commit fails, every caller waiting
+    on that batch gets a JournalWriteError. The database runs in WAL mode with
+    synchronous=NORMAL: a commit survives a process crash without an fsync
+    per transaction.
+
+    Every ``compact_threshold`` records the log is rewritten to contain only
+    the tasks that are still pending.
+
+    Several processes may share one journal file. Each task belongs to the
+    process that recorded it, and every process heartbeats while it has the
+    journal open. On start, load() claims the pending tasks of processes that
+    stopped, crashed or stopped heartbeating in one transaction, so each
+    orphaned task is replayed by exactly one process.
+    """
+
+    def __init__(self, path, compact_threshold=None):
+        self.path = str(path)
+        self.compact_threshold = compact_threshold or DEFAULT_COMPACT_THRESHOLD
+        self._condition = threading.Condition()
+        self._filling = _Batch()
+        self._since_compaction = 0
+        self._heartbeat_at = 0
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._running = False
+        self._writer = None
+        self._connection = None
+
+    @classmethod
+    def from_settings(cls):
+        """Journal configured in LEGACY_MESSAGE_SETTINGS, or None if journaling is disabled"""
+        legacy_settings = getattr(settings, 'LEGACY_MESSAGE_SETTINGS', {})
+        path = legacy_settings.get('SIMPLE_QUEUE_JOURNAL')
+        if not path:
+            return None
+        return cls(path, legacy_settings.get('SIMPLE_QUEUE_JOURNAL_COMPACT_THRESHOLD'))
+
+    def open(self):
+        """Open the database and start the writer thread"""
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS task_journal ('
+            'seq INTEGER PRIMARY KEY AUTOINCREMENT, op TEXT NOT NULL, task_id TEXT NOT NULL, payload TEXT, owner TEXT)'
+        )
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS journal_owners (owner TEXT PRIMARY KEY, heartbeat REAL NOT NULL)'
+        )
+        columns = {row[1] for row in self._connection.execute('PRAGMA table_info(task_journal)')}
+        if 'owner' not in columns:
+            # Journals written before tasks had owners; their tasks are claimed by the next load()
+            try:
+                self._connection.execute('ALTER TABLE task_journal ADD COLUMN owner TEXT')
+            except sqlite3.OperationalError:
+                pass  # Another process added it first
+        self._heartbeat()
+
+        with self._condition:
+            self._running = True
+        self._writer = threading.Thread(target=self._writer_loop, name='task-journal-writer', daemon=True)
+        self._writer.start()
+
+    def close(self):
+        """Flush pending records, stop the writer and close the database"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._writer:
+            self._writer.join(timeout=10)
+        if self._connection:
+            # Hand the pending tasks over to whichever process starts next
+            try:
+                self._connection.execute('DELETE FROM journal_owners WHERE owner = ?', (self.owner,))
+            except sqlite3.Error as e:
+                logger.error(f"Error releasing task journal owner {self.owner}: {str(e)}")
+            self._connection.close()
+            self._connection = None
+
+    def load(self):
+        """
+        Claim and replay the pending tasks of processes that no longer run
+
+        Returns:
+            list: (task_id, payload dict) of every task claimed, in enqueue order
+        """
+        # A connection of its own, so the claim never interleaves with the writer's transactions
+        with closing(sqlite3.connect(self.path, isolation_level=None, timeout=30)) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                now = time.time()
+                owners = connection.execute('SELECT owner, heartbeat FROM journal_owners').fetchall()
+                connection.executemany('DELETE FROM journal_owners WHERE owner = ?', [
+                    (owner,) for owner, heartbeat in owners
+                    if owner != self.owner and not _owner_alive(owner, heartbeat, now)
+                ])
+                rows = connection.execute(
+                    'SELECT op, task_id, payload, owner FROM task_journal ORDER BY seq'
+                ).fetchall()
+                live_owners = {row[0] for row in connection.execute('SELECT owner FROM journal_owners')}
+                claimed = [
+                    (task_id, json.loads(payload))
+                    for task_id, (payload, owner) in self._live_tasks(rows).items()
+                    if owner not in live_owners
+                ]
+                connection.execute(
+                    "UPDATE task_journal SET owner = ? WHERE op = 'add' "
+                    "AND (owner IS NULL OR owner NOT IN (SELECT owner FROM journal_owners))",
+                    (self.owner,)
+                )
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+        return claimed
+
+    def record_add(self, task_id, payload):
+        """Record a new task; raises JournalWriteError if it could not be committed"""
+        self._append('add', task_id, json.dumps(payload), owner=self.owner)
+
+    def record_cancel(self, task_id):
+        self._append('cancel', task_id)
+
+    def record_done(self, task_id):
+        # Losing a completion only means the task may run once more after a
+        # crash, so workers do not wait for it to commit
+        self._append('done', task_id, wait=False)
+
+    def _append(self, op, task_id, payload=None, wait=True, owner=None):
+        with self._condition:
+            if not self._running:
+                return
+            batch = self._filling
+            batch.records.append((op, task_id, payload, owner))
+            self._condition.notify_all()
+
+            if not wait:
+                return
+            while not batch.done and self._running:
+                self._condition.wait()
+            if batch.error is not None:
+                raise JournalWriteError(f"Task journal record for {task_id} was not written: {batch.error}")
+
+    def _writer_loop(self):
+        while True:
+            with self._condition:
+                while not self._filling.records and self._running and not self._heartbeat_due():
+                    self._condition.wait(HEARTBEAT_INTERVAL)
+                if not self._filling.records and not self._running:
+                    return
+                batch, self._filling = self._filling, _Batch()
+
+            if batch.records:
+                self._commit(batch)
+            if self._heartbeat_due():
+                self._heartbeat()
+            if self._since_compaction >= self.compact_threshold:
+                self._compact()
+
+    def _commit(self, batch):
+        try:
+            self._connection.execute('BEGIN')
+            self._connection.executemany(
+                'INSERT INTO task_journal (op, task_id, payload, owner) VALUES (?, ?, ?, ?)', batch.records
+            )
+            self._connection.execute('COMMIT')
+            self._since_compaction += len(batch.records)
+        except Exception as e:
+            logger.error(f"Error writing {len(batch.records)} task journal records: {str(e)}")
+            self._rollback()
+            batch.error = e
+
+        with self._condition:
+            batch.done = True
+            self._condition.notify_all()
+
+    def _heartbeat_due(self):
+        return time.monotonic() - self._heartbeat_at >= HEARTBEAT_INTERVAL
+
+    def _heartbeat(self):
+        """Tell other processes this one still runs its tasks"""
+        self._heartbeat_at = time.monotonic()
+        try:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO journal_owners (owner, heartbeat) VALUES (?, ?)', (self.owner, time.time())
+            )
+        except sqlite3.Error as e:
+            logger.error(f"Error writing task journal heartbeat: {str(e)}")
+
+    def _compact(self):
+        """Rewrite the log so it holds one 'add' record per pending task"""
+        try:
+            self._connection.execute('BEGIN IMMEDIATE')
+            rows = self._connection.execute(
+                'SELECT op, task_id, payload, owner FROM task_journal ORDER BY seq'
+            ).fetchall()
+            live = self._live_tasks(rows)
+            self._connection.execute('DELETE FROM task_journal')
+            self._connection.executemany(
+                'INSERT INTO task_journal (op, task_id, payload, owner) VALUES (?, ?, ?, ?)',
+                [('add', task_id, payload, owner) for task_id, (payload, owner) in live.items()]
+            )
+            self._connection.execute('COMMIT')
+            self._since_compaction = 0
+            logger.info(f"Compacted task journal from {len(rows)} to {len(live)} records")
+        except Exception as e:
+            logger.error(f"Error compacting task journal: {str(e)}")
+            self._rollback()
+
+    def _rollback(self):
+        try:
+            self._connection.execute('ROLLBACK')
+        except sqlite3.Error:
+            pass
+
+    @staticmethod
+    def _live_tasks(rows):
+        """task_id -> (JSON payload, owner) of the tasks added and not yet cancelled or done"""
+        live = {}
+        for op, task_id, payload, owner in rows:
+            if op == 'add':
+                live[task_id] = (payload, owner)
+            else:
+                live.pop(task_id, None)
+        return live
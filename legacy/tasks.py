@@ -9,7 +9,10 @@ import django_rq
 import redis
 from rq import Queue, Worker
 from .email_service import LegacyEmailService
+from .delivery_pool import DeliveryPool
+from .leases import claim_due_messages, claim_retryable_messages, default_lease_owner
 from .models import LegacyMessage
+from .queue_status import queue_status
 
 logger = logging.getLogger(__name__)
 
@@ -22,47 +25,13 @@ def get_redis_connection():
         return None
 
 def get_redis_status():
-    """Get Redis connection status and queue information"""
-    try:
-        conn = get_redis_connection()
-        if not conn:
-            return {
-                'connected': False,
-                'mode': 'fallback',
-                'queue_info': {'queued_jobs': 0, 'failed_jobs': 0, 'workers': 0}
-            }
-        
-        # Test connection
-        conn.ping()
-        
-        # Get queue information
-        default_queue = Queue('default', connection=conn)
-        email_queue = Queue('email', connection=conn)
-        
-        workers = Worker.all(connection=conn)
-        
-        queue_info = {
-            'queued_jobs': len(default_queue) + len(email_queue),
-            'failed_jobs': len(default_queue.failed_job_registry) + len(email_queue.failed_job_registry),
-            'workers': len(workers),
-            'default_queue_size': len(default_queue),
-            'email_queue_size': len(email_queue)
-        }
-        
-        return {
-            'connected': True,
-            'mode': 'redis',
-            'queue_info': queue_info
-        }
-        
-    except Exception as e:
-        logger.error(f"Redis status check failed: {e}")
-        return {
-            'connected': False,
-            'mode': 'fallback',
-            'queue_info': {'queued_jobs': 0, 'failed_jobs': 0, 'workers': 0},
-            'error': str(e)
-        }
+    """
+    Get Redis connection status and queue information
+    
+    Served from a snapshot refreshed at most every
+    LEGACY_MESSAGE_SETTINGS['QUEUE_STATUS_TTL'] seconds (see legacy/queue_status.py).
+    """
+    return queue_status.get()
 
 def get_job_status(job_id):
     """Get status of a specific RQ job"""
@@ -182,33 +151,31 @@ def schedule_message(message_id):
 @job('email')
 def retry_failed_messages():
     """
-    Task to retry sending failed messages
+    Task to retry sending failed messages whose backoff has elapsed
+    
+    Failed messages are retried with exponential backoff (see legacy/retries.py)
+    and dead-lettered after LEGACY_MESSAGE_SETTINGS['MAX_RETRY_ATTEMPTS'] retries.
     """
     logger.info("Starting retry of failed messages...")
     
     try:
-        # Get messages that failed and are eligible for retry
-        failed_messages = LegacyMessage.objects.filter(status='failed')
+        owner = default_lease_owner()
+        pool = DeliveryPool()
         
         retry_count = 0
         success_count = 0
         
-        for message in failed_messages:
-            # Check if message is still within delivery window (allow some flexibility)
-            current_time = timezone.now()
+        # Claim messages whose next attempt is due, batch by batch
+        while True:
+            claim_token, claimed = claim_retryable_messages(owner=owner)
+            if not claimed:
+                break
             
-            # Allow delivery up to 24 hours after scheduled time
-            delivery_window = message.delivery_date + timedelta(hours=24)
-            
-            if current_time <= delivery_window:
-                retry_count += 1
-                
-                # Reset status to scheduled and retry
-                message.status = 'scheduled'
-                message.save()
-                
-                if LegacyEmailService.send_legacy_message(str(message.id)):
-                    success_count += 1
+            results = pool.deliver(
+                LegacyEmailService.delivery_cursor(LegacyMessage.objects(claim_token=claim_token))
+            )
+            retry_count += results['total_processed']
+            success_count += results['successful']
         
         logger.info(f"Retry completed: {success_count} successful out of {retry_count} retried")
         
@@ -222,6 +189,36 @@ def retry_failed_messages():
         logger.error(f"Error in retry failed messages: {str(e)}")
         return {'error': str(e)}
 
+def process_scheduled_messages(payload=None):
+    """
+    QStash entry point: deliver due messages in self-continuing chunks
+
+    Each chunk claims one lease batch of due messages and sends it. The
+    claims themselves are the cursor: a claimed message leaves 'scheduled',
+    so the next chunk picks up where the last one stopped, and a retried
+    chunk only finds messages nobody has claimed yet (the delivery outbox
+    catches anything that was sent but not recorded).
+
+    Args:
+        payload (dict): Continuation payload from afteryou.task_continuation
+    """
+    from afteryou.task_continuation import run_with_continuation
+
+    owner = default_lease_owner()
+    pool = DeliveryPool()
+
+    def deliver_chunk(cursor):
+        claim_token, claimed = claim_due_messages(owner=owner)
+        if not claimed:
+            return cursor, {}, True
+
+        results = pool.deliver(
+            LegacyEmailService.delivery_cursor(LegacyMessage.objects(claim_token=claim_token))
+        )
+        return cursor, results, False
+
+    return run_with_continuation('process_scheduled_messages', payload or {}, deliver_chunk)
+
 @job('default')
 def cleanup_old_messages():
     """
@@ -266,7 +263,9 @@ def schedule_message_delivery(message_id, delivery_datetime):
         # Get the scheduler
         scheduler = django_rq.get_scheduler('email')
         
-        # Schedule the message for the specific delivery time
+        # Schedule the message for the specific delivery time. The fixed job
+        # id avoids piling up duplicate jobs; if one slips through anyway,
+        # the delivery outbox keeps the message from being sent twice
         job = scheduler.enqueue_at(
             delivery_datetime,
             send_single_message,
@@ -281,6 +280,21 @@ def schedule_message_delivery(message_id, delivery_datetime):
         logger.error(f"Error scheduling message delivery: {str(e)}")
         return None
 
+def cancel_message_delivery(job_id):
+    """
+    Cancel a delivery scheduled with schedule_message_delivery
+    
+    Args:
+        job_id (str): ID returned by schedule_message_delivery
+    """
+    try:
+        django_rq.get_scheduler('email').cancel(job_id)
+        logger.info(f"Cancelled scheduled delivery job {job_id}")
+        return True
+    except Exception as e:
+        logger.error(f"Error cancelling delivery job {job_id}: {str(e)}")
+        return False
+
 def enqueue_immediate_delivery(message_id):
     """
     Queue a message for immediate delivery
@@ -298,3 +312,132 @@ def enqueue_immediate_delivery(message_id):
     except Exception as e:
         logger.error(f"Error queuing immediate delivery: {str(e)}")
         return None
+
+def schedule_message_deliveries(deliveries):
+    """
+    Schedule many messages in a single pipelined Redis round trip
+    
+    Messages whose delivery time is None or already past go straight onto
+    the email queue; the rest are registered with the scheduler under the
+    same job IDs schedule_message_delivery uses.
+    
+    Args:
+        deliveries (iterable): (message_id, delivery_datetime or None) pairs
+        
+    Returns:
+        dict: message_id -> job_id for every message that was queued
+    """
+    from rq_scheduler.utils import to_unix
+    
+    now = timezone.now()
+    try:
+        queue = django_rq.get_queue('email')
+        scheduler = django_rq.get_scheduler('email')
+        pipeline = queue.connection.pipeline()
+        
+        job_ids = {}
+        immediate = []
+        for message_id, delivery_datetime in deliveries:
+            job_id = f'deliver_message_{message_id}'
+            if delivery_datetime is None or delivery_datetime <= now:
+                immediate.append(Queue.prepare_data(send_single_message, args=(message_id,), job_id=job_id))
+                # Delivering now supersedes any future delivery scheduled earlier
+                pipeline.zrem(scheduler.scheduled_jobs_key, job_id)
+            else:
+                job = scheduler._create_job(send_single_message, args=(message_id,), id=job_id, commit=False)
+                job.save(pipeline=pipeline)
+                pipeline.zadd(scheduler.scheduled_jobs_key, {job.id: to_unix(delivery_datetime)})
+            job_ids[message_id] = job_id
+        
+        if immediate:
+            queue.enqueue_many(immediate, pipeline=pipeline)
+        pipeline.execute()
+        
+        logger.info(
+            f"Queued {len(immediate)} immediate and {len(job_ids) - len(immediate)} scheduled deliveries"
+        )
+        return job_ids
+        
+    except Exception as e:
+        logger.error(f"Error bulk scheduling message deliveries: {str(e)}")
+        return {}
+
+def record_delivery_jobs(job_ids):
+    """
+    Write job IDs back to their messages with one MongoDB bulk update
+    
+    Args:
+        job_ids (dict): message_id -> job_id, as returned by schedule_message_deliveries
+    """
+    from bson import ObjectId
+    from pymongo import UpdateOne
+    
+    if not job_ids:
+        return 0
+    
+    result = LegacyMessage._get_collection().bulk_write([
+        UpdateOne({'_id': ObjectId(message_id)}, {'$set': {'job_id': job_id}})
+        for message_id, job_id in job_ids.items()
+    ], ordered=False)
+    return result.modified_count
+
+def trigger_scheduled_messages(user_ids):
+    """
+    Queue delivery of every scheduled message of many users at once
+    
+    Costs one find, one update_many, one scheduling round trip (a Redis
+    pipeline, or the simple queue while Redis is down) and one bulk write,
+    however many users and messages there are.
+    
+    Messages are moved to 'pending' before they are queued, so a fast
+    worker cannot send one before its status changes; the ones that could
+    not be queued go back to 'scheduled'. Pending messages are queued
+    again too: for users whose cycle has not been reset they are leftovers
+    of an attempt that died halfway, and a message queued twice is still
+    sent once (claims and the delivery outbox).
+    
+    Args:
+        user_ids (iterable): Postgres user IDs
+        
+    Returns:
+        tuple: (IDs of the users whose messages were all queued, including
+            users without any, number of deliveries queued)
+    """
+    from bson import ObjectId
+    from .simple_tasks import schedule_message_deliveries as schedule_with_fallback
+    
+    user_ids = list(user_ids)
+    if not user_ids:
+        return set(), 0
+    
+    collection = LegacyMessage._get_collection()
+    owners = {
+        str(document['_id']): document['user_id']
+        for document in collection.find(
+            {'user_id': {'$in': [str(user_id) for user_id in user_ids]}, 'status': {'$in': ['scheduled', 'pending']}},
+            {'_id': 1, 'user_id': 1}
+        )
+    }
+    
+    job_ids = {}
+    held_back = set()
+    if owners:
+        collection.update_many(
+            {'_id': {'$in': [ObjectId(message_id) for message_id in owners]}, 'status': 'scheduled'},
+            {'$set': {'status': 'pending'}}
+        )
+        job_ids = schedule_with_fallback((message_id, None) for message_id in owners)
+        
+        unqueued = [message_id for message_id in owners if message_id not in job_ids]
+        if unqueued:
+            collection.update_many(
+                {'_id': {'$in': [ObjectId(message_id) for message_id in unqueued]}, 'status': 'pending'},
+                {'$set': {'status': 'scheduled'}}
+            )
+            held_back = {owners[message_id] for message_id in unqueued}
+            logger.error(f"Could not queue {len(unqueued)} messages of {len(held_back)} users")
+        record_delivery_jobs(job_ids)
+    
+    triggered = {user_id for user_id in user_ids if str(user_id) not in held_back}
+    logger.info(f"Queued {len(job_ids)} deliveries for {len(triggered)} users")
+    return triggered, len(job_ids)
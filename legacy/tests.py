@@ -1,3 +1,335 @@
-from django.test import TestCase
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import unittest
+from datetime import timedelta
+from unittest import mock
+from bson import ObjectId
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+from mongoengine import connect, disconnect
+from mongoengine.connection import get_db
+from .leases import claim_due_messages, claim_message
+from .models import DeadLetterMessage, DeliveryOutbox, LegacyMessage
+from .outbox import begin_deliveries, complete_delivery
+from .qstash_delivery import publish_deduplication_id
+from .retries import failure_update, replay_dead_letters
+from .simple_tasks import enqueue_immediate_delivery, schedule_message_delivery
+from .task_journal import JournalWriteError, TaskJournal
 
-# Create your tests here.
+
+def mongodb_test_uri():
+    """The configured MongoDB URI pointing at MONGODB_DB_NAME + '_test' instead"""
+    return re.sub(
+        r'^(mongodb(?:\+srv)?://[^/?]+)(/[^?]*)?',
+        lambda match: f"{match.group(1)}/{settings.MONGODB_DB_NAME}_test",
+        settings.MONGODB_URI
+    )
+
+
+class MongoDatabaseMixin:
+    """
+    Points MongoEngine at a throwaway database for a test class
+
+    The database sits next to the configured one (MONGODB_DB_NAME + '_test'),
+    is emptied before every test and dropped after the class. The class is
+    skipped when no MongoDB server is reachable.
+    """
+    collections = (LegacyMessage, DeadLetterMessage, DeliveryOutbox)
+
+    @classmethod
+    def setUpClass(cls):
+        # Connect before the test case sets anything up, so skipping leaves nothing open
+        disconnect()
+        connect(db=f"{settings.MONGODB_DB_NAME}_test", host=mongodb_test_uri(), serverSelectionTimeoutMS=2000)
+        try:
+            get_db().client.admin.command('ping')
+        except Exception as e:
+            cls._reconnect()
+            raise unittest.SkipTest(f"MongoDB is not available: {e}")
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        db = get_db()
+        db.client.drop_database(db.name)
+        cls._reconnect()
+
+    @classmethod
+    def _reconnect(cls):
+        disconnect()
+        connect(db=settings.MONGODB_DB_NAME, host=settings.MONGODB_URI)
+
+    def setUp(self):
+        super().setUp()
+        for document in self.collections:
+            document.objects.delete()
+
+    def create_message(self, **fields):
+        defaults = {
+            'user_id': '1',
+            'title': 'Hello',
+            'content': 'See you',
+            'recipient_email': 'friend@example.com',
+            'delivery_date': timezone.now() - timedelta(minutes=1),
+            'status': 'scheduled',
+        }
+        defaults.update(fields)
+        return LegacyMessage(**defaults).save()
+
+
+class MongoTestCase(MongoDatabaseMixin, SimpleTestCase):
+    """Test case for code that only talks to MongoDB"""
+
+
+class ClaimTests(MongoTestCase):
+    def test_due_messages_are_claimed_by_one_worker_only(self):
+        for _ in range(3):
+            self.create_message()
+
+        _, first = claim_due_messages(owner='worker-1')
+        _, second = claim_due_messages(owner='worker-2')
+
+        self.assertEqual(first, 3)
+        self.assertEqual(second, 0)
+        self.assertEqual(LegacyMessage.objects(status='sending', lease_owner='worker-1').count(), 3)
+
+    def test_messages_not_yet_due_are_not_claimed(self):
+        self.create_message(delivery_date=timezone.now() + timedelta(days=1))
+
+        _, claimed = claim_due_messages(owner='worker-1')
+
+        self.assertEqual(claimed, 0)
+
+    def test_concurrent_single_claims_have_one_winner(self):
+        message = self.create_message()
+        barrier = threading.Barrier(4)
+        winners = []
+
+        def claim(owner):
+            barrier.wait()
+            if claim_message(message.id, owner=owner) is not None:
+                winners.append(owner)
+
+        threads = [threading.Thread(target=claim, args=(f'worker-{i}',)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(winners), 1)
+        self.assertEqual(LegacyMessage.objects.get(id=message.id).lease_owner, winners[0])
+
+    def test_expired_lease_is_reclaimed(self):
+        message = self.create_message(
+            status='sending',
+            lease_owner='dead-worker',
+            lease_expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        _, claimed = claim_due_messages(owner='worker-2')
+
+        self.assertEqual(claimed, 1)
+        self.assertEqual(LegacyMessage.objects.get(id=message.id).lease_owner, 'worker-2')
+
+    def test_live_lease_is_not_reclaimed(self):
+        message = self.create_message(
+            status='sending',
+            lease_owner='worker-1',
+            lease_expires_at=timezone.now() + timedelta(minutes=5)
+        )
+
+        _, claimed = claim_due_messages(owner='worker-2')
+
+        self.assertEqual(claimed, 0)
+        self.assertIsNone(claim_message(message.id, owner='worker-2'))
+        self.assertEqual(LegacyMessage.objects.get(id=message.id).lease_owner, 'worker-1')
+
+
+class OutboxTests(MongoTestCase):
+    def test_completed_delivery_is_reported_instead_of_sent_again(self):
+        sent_key, new_key = 'legacy.a.20260101000000', 'legacy.b.20260101000000'
+        self.assertEqual(begin_deliveries({sent_key: ObjectId()}, 'worker-1'), set())
+        complete_delivery(sent_key)
+
+        completed = begin_deliveries({sent_key: ObjectId(), new_key: ObjectId()}, 'worker-2')
+
+        self.assertEqual(completed, {sent_key})
+        self.assertEqual(DeliveryOutbox.objects.get(key=sent_key).status, 'sent')
+        self.assertEqual(DeliveryOutbox.objects.get(key=new_key).status, 'pending')
+
+    def test_failed_delivery_can_be_attempted_again(self):
+        key = 'legacy.a.20260101000000'
+        begin_deliveries({key: ObjectId()}, 'worker-1')
+
+        self.assertEqual(begin_deliveries({key: ObjectId()}, 'worker-2'), set())
+        self.assertEqual(DeliveryOutbox.objects.get(key=key).attempts, 2)
+
+
+@override_settings(LEGACY_MESSAGE_SETTINGS={'MAX_RETRY_ATTEMPTS': 3, 'RETRY_DELAY': 60})
+class FailureUpdateTests(SimpleTestCase):
+    def message(self, attempts):
+        return LegacyMessage(
+            id=ObjectId(), user_id='1', title='Hello', recipient_email='friend@example.com', attempts=attempts
+        )
+
+    def test_failure_within_retry_budget_schedules_a_retry(self):
+        now = timezone.now()
+
+        update, dead_letter = failure_update(self.message(attempts=2), 'timeout', now)
+
+        self.assertIsNone(dead_letter)
+        self.assertEqual(update['$set']['status'], 'failed')
+        self.assertEqual(update['$set']['attempts'], 3)
+        # Third attempt: RETRY_DELAY * 4, with up to half of it as jitter
+        self.assertGreaterEqual(update['$set']['next_attempt_at'], now + timedelta(seconds=120))
+        self.assertLessEqual(update['$set']['next_attempt_at'], now + timedelta(seconds=240))
+
+    def test_failure_past_max_attempts_dead_letters_the_message(self):
+        message = self.message(attempts=3)
+
+        update, dead_letter = failure_update(message, 'mailbox unavailable', timezone.now())
+
+        self.assertEqual(update['$set']['status'], 'dead')
+        self.assertEqual(update['$set']['attempts'], 4)
+        self.assertIn('next_attempt_at', update['$unset'])
+        self.assertEqual(dead_letter['message_id'], message.id)
+        self.assertEqual(dead_letter['last_error'], 'mailbox unavailable')
+
+
+class ReplayDeadLettersTests(MongoTestCase):
+    def dead_message(self):
+        message = self.create_message(status='dead', attempts=4, last_error='mailbox unavailable')
+        DeadLetterMessage(
+            message_id=message.id, user_id=message.user_id, title=message.title,
+            recipient_email=message.recipient_email, attempts=4, last_error='mailbox unavailable'
+        ).save()
+        return message
+
+    def test_replay_reschedules_and_clears_dead_letters(self):
+        first, second = self.dead_message(), self.dead_message()
+
+        self.assertEqual(replay_dead_letters(), 2)
+
+        for message in (first, second):
+            message.reload()
+            self.assertEqual(message.status, 'scheduled')
+            self.assertEqual(message.attempts, 0)
+            self.assertIsNone(message.last_error)
+        self.assertEqual(DeadLetterMessage.objects.count(), 0)
+
+    def test_replay_only_selected_messages(self):
+        first, second = self.dead_message(), self.dead_message()
+
+        self.assertEqual(replay_dead_letters([first.id]), 1)
+
+        self.assertEqual(LegacyMessage.objects.get(id=second.id).status, 'dead')
+        self.assertEqual(DeadLetterMessage.objects.get().message_id, second.id)
+
+    def test_replayed_message_is_claimable_again(self):
+        message = self.dead_message()
+        replay_dead_letters()
+
+        _, claimed = claim_due_messages(owner='worker-1')
+
+        self.assertEqual(claimed, 1)
+        self.assertEqual(LegacyMessage.objects.get(id=message.id).status, 'sending')
+
+
+class PublishDeduplicationTests(SimpleTestCase):
+    def test_moving_a_delivery_back_gets_a_fresh_id(self):
+        first_date = timezone.now() + timedelta(days=1)
+        message = LegacyMessage(id=ObjectId(), delivery_date=first_date)
+        first = publish_deduplication_id(message)
+
+        message.qstash_message_id = 'msg_1'
+        message.delivery_date = first_date + timedelta(days=1)
+        second = publish_deduplication_id(message)
+
+        message.qstash_message_id = 'msg_2'
+        message.delivery_date = first_date
+        third = publish_deduplication_id(message)
+
+        self.assertEqual(len({first, second, third}), 3)
+
+    def test_retried_publish_keeps_its_id(self):
+        message = LegacyMessage(id=ObjectId(), delivery_date=timezone.now(), qstash_message_id='msg_1')
+
+        self.assertEqual(publish_deduplication_id(message), publish_deduplication_id(message))
+
+
+class TaskJournalTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'journal.sqlite3')
+        self.journal = TaskJournal(self.path)
+        self.journal.open()
+        self.addCleanup(self.journal.close)
+
+    def start_process(self):
+        journal = TaskJournal(self.path)
+        journal.open()
+        self.addCleanup(journal.close)
+        return journal
+
+    def test_pending_tasks_are_replayed(self):
+        self.journal.record_add('task_1', {'func': 'legacy.tasks:send_single_message', 'args': ['a']})
+        self.journal.record_add('task_2', {'func': 'legacy.tasks:send_single_message', 'args': ['b']})
+        self.journal.record_cancel('task_1')
+        self.journal.close()
+
+        self.assertEqual([task_id for task_id, _ in self.start_process().load()], ['task_2'])
+
+    def test_tasks_of_a_running_process_are_not_replayed(self):
+        self.journal.record_add('task_1', {'func': 'legacy.tasks:send_single_message', 'args': ['a']})
+
+        self.assertEqual(self.start_process().load(), [])
+
+    def test_stopped_process_tasks_are_replayed_by_one_process(self):
+        self.journal.record_add('task_1', {'func': 'legacy.tasks:send_single_message', 'args': ['a']})
+        self.journal.close()
+        first, second = self.start_process(), self.start_process()
+
+        self.assertEqual([task_id for task_id, _ in first.load()], ['task_1'])
+        self.assertEqual(second.load(), [])
+
+    def test_crashed_process_tasks_are_replayed(self):
+        self.journal.record_add('task_1', {'func': 'legacy.tasks:send_single_message', 'args': ['a']})
+        # A process that died without closing the journal leaves a stale heartbeat
+        connection = sqlite3.connect(self.path)
+        with connection:
+            connection.execute('UPDATE journal_owners SET heartbeat = 0 WHERE owner = ?', (self.journal.owner,))
+        connection.close()
+
+        self.assertEqual([task_id for task_id, _ in self.start_process().load()], ['task_1'])
+
+    def test_failed_commit_is_raised_to_the_caller(self):
+        # Another process breaking the log makes the next commit fail
+        connection = sqlite3.connect(self.path)
+        connection.execute('DROP TABLE task_journal')
+        connection.close()
+
+        with self.assertRaises(JournalWriteError):
+            self.journal.record_add('task_1', {'func': 'legacy.tasks:send_single_message', 'args': ['a']})
+
+
+class FallbackQueueTests(SimpleTestCase):
+    def setUp(self):
+        queue = mock.Mock()
+        queue.schedule_task.side_effect = queue.enqueue_immediate.side_effect = JournalWriteError('disk full')
+        for patcher in (
+            mock.patch('django_rq.get_scheduler', side_effect=ConnectionError('Redis is down')),
+            mock.patch('django_rq.get_queue', side_effect=ConnectionError('Redis is down')),
+            mock.patch('legacy.simple_tasks.get_task_queue', return_value=queue),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_unjournaled_delivery_is_reported_as_not_queued(self):
+        self.assertIsNone(schedule_message_delivery('a', timezone.now() + timedelta(days=1)))
+        self.assertIsNone(enqueue_immediate_delivery('a'))
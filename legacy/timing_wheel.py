@@ -0,0 +1,258 @@
+"""
+Hierarchical timing wheel and the exact-time delivery scheduler built on it
+Fires each legacy message within a second of its delivery date instead of
+waiting for the next 15-minute polling tick
+"""
+import json
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from .models import LegacyMessage
+
+logger = logging.getLogger(__name__)
+
+# Redis channel used to push new/edited/deleted messages into a running scheduler
+WHEEL_CHANNEL = 'legacy:delivery-wheel'
+
+
+def to_timestamp(value):
+    """Convert a datetime (naive values are UTC, as stored by MongoDB) to a Unix timestamp"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=dt_timezone.utc)
+    return value.timestamp()
+
+
+class TimingWheel:
+    """
+    Hierarchical timing wheel
+
+    Level 0 has ``wheel_size`` slots of ``tick`` seconds each; every level
+    above covers ``wheel_size`` slots of the level below. An entry is placed
+    on the lowest level whose span covers its deadline and cascades down one
+    level each time the wheel reaches its slot, so scheduling, cancelling and
+    advancing by one tick are all O(1) regardless of how many entries are
+    pending.
+    """
+
+    def __init__(self, tick=1.0, wheel_size=60, levels=4, start=None):
+        self.tick = tick
+        self.wheel_size = wheel_size
+        self.levels = [[set() for _ in range(wheel_size)] for _ in range(levels)]
+        self.current_tick = int((start if start is not None else time.time()) // tick)
+        self._entries = {}  # key -> (deadline_tick, level, slot)
+        self._due = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def schedule(self, key, when):
+        """
+        Add a key to fire at Unix timestamp ``when``, replacing any earlier entry for it
+        """
+        self.cancel(key)
+        self._place(key, int(math.ceil(when / self.tick)))
+
+    def cancel(self, key):
+        """Remove a key from the wheel; returns True if it was pending"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+
+        _, level, slot = entry
+        if level is None:
+            self._due.remove(key)
+        else:
+            self.levels[level][slot].discard(key)
+        return True
+
+    def advance(self, now):
+        """
+        Move the wheel forward to Unix timestamp ``now``
+
+        Returns:
+            list: Keys whose deadline has been reached
+        """
+        target_tick = int(now // self.tick)
+
+        while self.current_tick < target_tick:
+            self.current_tick += 1
+
+            # Cascade higher levels whose slot starts at this tick, top down
+            for level in range(len(self.levels) - 1, 0, -1):
+                span = self.wheel_size ** level
+                if self.current_tick % span == 0:
+                    slot = (self.current_tick // span) % self.wheel_size
+                    cascading = self.levels[level][slot]
+                    self.levels[level][slot] = set()
+                    for key in cascading:
+                        deadline_tick = self._entries.pop(key)[0]
+                        self._place(key, deadline_tick)
+
+            slot = self.current_tick % self.wheel_size
+            for key in self.levels[0][slot]:
+                self._entries[key] = (self._entries[key][0], None, None)
+                self._due.append(key)
+            self.levels[0][slot] = set()
+
+        due, self._due = self._due, []
+        for key in due:
+            del self._entries[key]
+        return due
+
+    def _place(self, key, deadline_tick):
+        delta = deadline_tick - self.current_tick
+        if delta <= 0:
+            self._entries[key] = (deadline_tick, None, None)
+            self._due.append(key)
+            return
+
+        top = len(self.levels) - 1
+        level = 0
+        while level < top and delta >= self.wheel_size ** (level + 1):
+            level += 1
+
+        # Deadlines beyond the top level's span park in its furthest slot and
+        # are re-placed each time that slot cascades
+        if delta >= self.wheel_size ** (top + 1):
+            deadline_slot_tick = self.current_tick + self.wheel_size ** (top + 1) - 1
+        else:
+            deadline_slot_tick = deadline_tick
+
+        slot = (deadline_slot_tick // self.wheel_size ** level) % self.wheel_size
+        self.levels[level][slot].add(key)
+        self._entries[key] = (deadline_tick, level, slot)
+
+
+def publish_schedule_change(message, cancelled=False):
+    """
+    Tell running delivery schedulers that a message was created, edited or deleted
+
+    Best effort: if Redis is unavailable the scheduler still picks the message
+    up on its next horizon load.
+    """
+    try:
+        import django_rq
+        payload = {'id': str(message.id), 'cancelled': cancelled}
+        if not cancelled:
+            payload['delivery_ts'] = to_timestamp(message.delivery_date)
+        django_rq.get_connection('default').publish(WHEEL_CHANNEL, json.dumps(payload))
+    except Exception as e:
+        logger.warning(f"Could not notify delivery scheduler about message {message.id}: {str(e)}")
+
+
+class DeliveryWheelScheduler:
+    """
+    Exact-time delivery scheduler
+
+    Loads upcoming delivery dates from MongoDB incrementally: each refresh
+    only reads the slice between the end of the last loaded window and
+    ``now + horizon``. Messages created or edited in between arrive through
+    the Redis channel and are inserted straight into the wheel. Due messages
+    are sent on a thread pool through send_legacy_message, whose claim step
+    keeps this scheduler and the polling workers from sending the same
+    message twice.
+    """
+
+    def __init__(self, horizon=3600, refresh_interval=60, concurrency=None):
+        self.horizon = horizon
+        self.refresh_interval = refresh_interval
+        self.concurrency = concurrency or getattr(settings, 'LEGACY_MESSAGE_SETTINGS', {}).get(
+            'DELIVERY_CONCURRENCY', 8
+        )
+        self.wheel = TimingWheel()
+        self.loaded_until = None
+        self.running = False
+        self._pubsub = None
+
+    def load_horizon(self, now):
+        """Insert scheduled messages due before now + horizon that are not loaded yet"""
+        window_end = datetime.fromtimestamp(now + self.horizon, tz=dt_timezone.utc)
+        queryset = LegacyMessage.objects(status='scheduled', delivery_date__lte=window_end)
+        if self.loaded_until is not None:
+            queryset = queryset.filter(delivery_date__gt=self.loaded_until)
+
+        loaded = 0
+        for message in queryset.only('id', 'delivery_date').no_cache().batch_size(1000):
+            self.wheel.schedule(str(message.id), to_timestamp(message.delivery_date))
+            loaded += 1
+
+        self.loaded_until = window_end
+        if loaded:
+            logger.info(f"Loaded {loaded} upcoming deliveries (horizon until {window_end})")
+        return loaded
+
+    def handle_change(self, payload, now):
+        """Apply a create/edit/delete notification from the Redis channel"""
+        message_id = payload['id']
+        if payload.get('cancelled'):
+            self.wheel.cancel(message_id)
+        elif payload['delivery_ts'] <= now + self.horizon:
+            self.wheel.schedule(message_id, payload['delivery_ts'])
+        else:
+            # Moved beyond the horizon: the horizon load picks it up later
+            self.wheel.cancel(message_id)
+
+    def run(self):
+        """Run until stop() is called"""
+        from .email_service import LegacyEmailService
+
+        self.running = True
+        self._subscribe()
+
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='delivery-wheel')
+        next_refresh = 0
+        try:
+            while self.running:
+                now = time.time()
+
+                if now >= next_refresh:
+                    try:
+                        self.load_horizon(now)
+                    except Exception as e:
+                        logger.error(f"Error loading upcoming deliveries: {str(e)}")
+                    next_refresh = now + self.refresh_interval
+
+                self._drain_changes(now)
+
+                for message_id in self.wheel.advance(now):
+                    # The claim re-checks status and delivery date, so stale
+                    # entries (edited without a notification) are skipped
+                    executor.submit(LegacyEmailService.send_legacy_message, message_id, due_only=True)
+
+                # Sleep until the next tick boundary
+                time.sleep(max(0.0, self.wheel.tick - (time.time() % self.wheel.tick)))
+        finally:
+            executor.shutdown(wait=True)
+            if self._pubsub is not None:
+                self._pubsub.close()
+
+    def stop(self):
+        self.running = False
+
+    def _subscribe(self):
+        try:
+            import django_rq
+            self._pubsub = django_rq.get_connection('default').pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(WHEEL_CHANNEL)
+        except Exception as e:
+            logger.warning(f"Delivery scheduler running without change notifications: {str(e)}")
+            self._pubsub = None
+
+    def _drain_changes(self, now):
+        if self._pubsub is None:
+            return
+        try:
+            while True:
+                notification = self._pubsub.get_message(timeout=0)
+                if notification is None:
+                    return
+                self.handle_change(json.loads(notification['data']), now)
+        except Exception as e:
+            logger.warning(f"Lost delivery scheduler notifications, resubscribing: {str(e)}")
+            self._subscribe()
@@ -0,0 +1,249 @@
+"""
+Autoscaling supervisor for RQ worker processes
+Forks between a minimum and maximum number of workers, sized from sampled
+queue depth and job latency, replaces children that crash, and drains
+workers gracefully on shutdown so in-flight sends finish
+"""
+import logging
+import math
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from collections import deque
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+import django_rq
+from rq import SimpleWorker, Worker
+from rq.job import Job
+from afteryou.smtp_pool import smtp_pool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_INTERVAL = 5  # Seconds between queue samples
+DEFAULT_JOBS_PER_WORKER = 50  # Queued jobs one worker is expected to absorb
+DEFAULT_TARGET_LATENCY = 30  # Seconds the oldest queued job may wait before adding a worker
+DEFAULT_SCALE_DOWN_SAMPLES = 6  # Consecutive low samples before removing a worker
+DEFAULT_DRAIN_TIMEOUT = 600  # Seconds workers get to finish their current job on shutdown
+CRASH_WINDOW = 60  # Seconds over which rapid crashes are counted
+MAX_CRASHES_PER_WINDOW = 5  # More crashes than this in the window delays restarts
+
+
+def _setting(name, default):
+    return getattr(settings, 'LEGACY_MESSAGE_SETTINGS', {}).get(name, default)
+
+
+def build_worker(queue_names, fork_jobs=False):
+    """
+    Create an RQ worker for the given queues
+
+    SimpleWorker runs jobs in this process, so the SMTP connection pool stays
+    warm across jobs; it is also required on Windows. ``fork_jobs`` runs each
+    job in a forked work horse instead.
+    """
+    queues = [django_rq.get_queue(name) for name in queue_names]
+    worker_class = Worker if fork_jobs and not sys.platform.startswith('win') else SimpleWorker
+    return worker_class(queues, connection=queues[0].connection)
+
+
+def run_worker(queue_names, fork_jobs=False):
+    """Run one worker until it is told to stop; the target of supervised child processes"""
+    # Drop the supervisor's handlers; RQ installs its own (SIGTERM/SIGINT = warm shutdown)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    if hasattr(os, 'setpgrp'):
+        # Keep a terminal Ctrl-C away from workers: only the supervisor's
+        # SIGTERM should stop them, and a second signal would make RQ abort
+        # the job in progress
+        os.setpgrp()
+
+    worker = build_worker(queue_names, fork_jobs)
+    if isinstance(worker, SimpleWorker) and 'email' in queue_names:
+        smtp_pool.warm()
+    try:
+        worker.work()
+    finally:
+        smtp_pool.close_all()
+
+
+def sample_queues(queue_names):
+    """
+    Measure the backlog of the given queues
+
+    Returns:
+        tuple: (number of queued jobs, seconds the oldest queued job has waited)
+    """
+    depth = 0
+    latency = 0.0
+    now = datetime.now(dt_timezone.utc)
+
+    for name in queue_names:
+        queue = django_rq.get_queue(name)
+        pipeline = queue.connection.pipeline()
+        pipeline.llen(queue.key)
+        pipeline.lindex(queue.key, 0)
+        length, head = pipeline.execute()
+        depth += length
+
+        if head:
+            try:
+                job = Job.fetch(head.decode() if isinstance(head, bytes) else head, connection=queue.connection)
+            except Exception:
+                continue
+            if job.enqueued_at:
+                enqueued_at = job.enqueued_at
+                if enqueued_at.tzinfo is None:
+                    enqueued_at = enqueued_at.replace(tzinfo=dt_timezone.utc)
+                latency = max(latency, (now - enqueued_at).total_seconds())
+
+    return depth, latency
+
+
+class WorkerSupervisor:
+    """
+    Keeps between ``min_workers`` and ``max_workers`` RQ worker processes running
+
+    Every sample interval the queues are measured. The desired worker count
+    is one per ``jobs_per_worker`` queued jobs, plus one more while the
+    oldest job has waited longer than ``target_latency``. Scaling up happens
+    at once; scaling down only after ``scale_down_samples`` consecutive
+    samples ask for fewer workers, one worker at a time. Workers are stopped
+    with SIGTERM, which RQ treats as a warm shutdown: the current job
+    finishes before the process exits.
+    """
+
+    def __init__(self, queue_names, min_workers=1, max_workers=None, fork_jobs=False,
+                 sample_interval=None, jobs_per_worker=None, target_latency=None,
+                 scale_down_samples=None, drain_timeout=None):
+        self.queue_names = list(queue_names)
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers or self.min_workers)
+        self.fork_jobs = fork_jobs
+        self.sample_interval = sample_interval or _setting('WORKER_SAMPLE_INTERVAL', DEFAULT_SAMPLE_INTERVAL)
+        self.jobs_per_worker = jobs_per_worker or _setting('WORKER_JOBS_PER_WORKER', DEFAULT_JOBS_PER_WORKER)
+        self.target_latency = target_latency or _setting('WORKER_TARGET_LATENCY', DEFAULT_TARGET_LATENCY)
+        self.scale_down_samples = scale_down_samples or _setting('WORKER_SCALE_DOWN_SAMPLES', DEFAULT_SCALE_DOWN_SAMPLES)
+        self.drain_timeout = drain_timeout or _setting('WORKER_DRAIN_TIMEOUT', DEFAULT_DRAIN_TIMEOUT)
+
+        self._context = multiprocessing.get_context('fork' if sys.platform != 'win32' else 'spawn')
+        self.target = self.min_workers  # Worker count the autoscaler last settled on
+        self.workers = []  # Running children, oldest first
+        self.draining = []  # Children told to stop that have not exited yet
+        self._crashes = deque()
+        self._restart_not_before = 0.0
+        self._low_samples = 0
+        self._stopping = False
+
+    def desired_workers(self, depth, latency):
+        """Worker count the sampled backlog asks for, within the configured bounds"""
+        desired = math.ceil(depth / self.jobs_per_worker) if depth else 0
+        if latency > self.target_latency:
+            desired = max(desired, self.target + 1)
+        return min(self.max_workers, max(self.min_workers, desired))
+
+    def run(self):
+        """Supervise until SIGTERM/SIGINT, then drain"""
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        # Children must not share the supervisor's database sockets
+        from django.db import connections
+        connections.close_all()
+
+        logger.info(
+            f"Supervising {self.min_workers}-{self.max_workers} workers for queues: {', '.join(self.queue_names)}"
+        )
+        next_sample = time.monotonic()
+        while not self._stopping:
+            self._reap()
+            if time.monotonic() >= next_sample:
+                next_sample = time.monotonic() + self.sample_interval
+                self._autoscale()
+            if time.monotonic() >= self._restart_not_before:
+                # Starts the initial workers and replaces crashed ones
+                self._scale_to(self.target)
+            time.sleep(1)
+
+        self.drain()
+
+    def drain(self):
+        """Warm-stop every worker and wait for in-flight jobs, killing stragglers after drain_timeout"""
+        logger.info(f"Draining {len(self.workers) + len(self.draining)} workers...")
+        for process in self.workers:
+            self._stop(process)
+        self.workers = []
+
+        deadline = time.monotonic() + self.drain_timeout
+        for process in self.draining:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Worker {process.pid} did not finish within {self.drain_timeout}s; killing it")
+                process.kill()
+                process.join()
+        self.draining = []
+
+    def _request_stop(self, signum, frame):
+        self._stopping = True
+
+    def _autoscale(self):
+        try:
+            depth, latency = sample_queues(self.queue_names)
+        except Exception as e:
+            logger.warning(f"Could not sample queues: {str(e)}")
+            return
+
+        desired = self.desired_workers(depth, latency)
+        if desired > self.target:
+            self._low_samples = 0
+            logger.info(f"Scaling up to {desired} workers (depth {depth}, latency {latency:.0f}s)")
+            self.target = desired
+        elif desired < self.target:
+            self._low_samples += 1
+            if self._low_samples >= self.scale_down_samples:
+                self._low_samples = 0
+                self.target -= 1
+                logger.info(f"Scaling down to {self.target} workers (depth {depth}, latency {latency:.0f}s)")
+                if len(self.workers) > self.target:
+                    self._stop(self.workers.pop())
+        else:
+            self._low_samples = 0
+
+    def _scale_to(self, count):
+        while len(self.workers) < count:
+            self.workers.append(self._spawn())
+
+    def _spawn(self):
+        process = self._context.Process(
+            target=run_worker, args=(self.queue_names, self.fork_jobs), name='rq-worker', daemon=False
+        )
+        process.start()
+        logger.info(f"Started worker {process.pid}")
+        return process
+
+    def _stop(self, process):
+        if process.is_alive():
+            process.terminate()
+        self.draining.append(process)
+
+    def _reap(self):
+        self.draining = [process for process in self.draining if process.is_alive()]
+
+        crashed = [process for process in self.workers if not process.is_alive()]
+        if not crashed:
+            return
+
+        now = time.monotonic()
+        for process in crashed:
+            self.workers.remove(process)
+            process.join()
+            logger.error(f"Worker {process.pid} exited unexpectedly with code {process.exitcode}")
+            self._crashes.append(now)
+        while self._crashes and now - self._crashes[0] > CRASH_WINDOW:
+            self._crashes.popleft()
+
+        if len(self._crashes) > MAX_CRASHES_PER_WINDOW:
+            # A crash loop (Redis down, bad deploy): back off instead of forking continuously
+            self._restart_not_before = now + CRASH_WINDOW
+            logger.error(f"{len(self._crashes)} worker crashes in {CRASH_WINDOW}s; delaying restarts")
+            self._crashes.clear()